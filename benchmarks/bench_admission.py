@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+# Throughput benchmark of the admission controller of the transcription Lambda
+# function, against a local fake Transcribe with a start rate quota and a
+# concurrent job quota. A bulk upload of jobs is drained from an in-memory queue
+# by concurrent workers standing for the function invocations, in two modes:
+# - direct: one start per event, errors drop the job (the function without admission)
+# - admission: starts go through admission.AdmissionController, jobs not admitted
+#   are made visible again after a jittered delay
+# Started and dropped jobs, errors returned by the fake service, peak running jobs
+# and the drain time compared to the quota bound are reported in a JSON file.
+#
+#   $ python benchmarks/bench_admission.py --jobs 200 --tps 25 --max-concurrent 20 --output bench.json
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda'))
+
+import admission
+import aws_clients
+
+from bench_redaction import git_revision
+from fake_transcribe import FakeTranscribe
+
+
+class FakeQueue:
+    # SQS-like queue: received messages are invisible until deleted or their visibility expires
+
+    def __init__(self, bodies, visibility_timeout):
+        self.visibility_timeout = visibility_timeout
+        self.messages = {i: {'body': body, 'visible_at': 0.0, 'receive_count': 0} for i, body in enumerate(bodies)}
+        self._lock = threading.Lock()
+
+    def receive(self, max_messages):
+        now = time.monotonic()
+        with self._lock:
+            received = []
+            for message_id, message in self.messages.items():
+                if message['visible_at'] <= now:
+                    message['visible_at'] = now + self.visibility_timeout
+                    message['receive_count'] += 1
+                    received.append((message_id, message['body'], message['receive_count']))
+                    if len(received) == max_messages:
+                        break
+            return received
+
+    def delete(self, message_id):
+        with self._lock:
+            self.messages.pop(message_id, None)
+
+    def change_visibility(self, message_id, delay):
+        with self._lock:
+            if message_id in self.messages:
+                self.messages[message_id]['visible_at'] = time.monotonic() + delay
+
+    def __len__(self):
+        with self._lock:
+            return len(self.messages)
+
+
+def run_direct(queue, transcribe, stats):
+    while True:
+        batch = queue.receive(10)
+        if not batch:
+            return
+        for message_id, name, receive_count in batch:
+            try:
+                transcribe.start_transcription_job(TranscriptionJobName=name)
+                stats['started'] += 1
+            except Exception:
+                # Logged and swallowed, the event is lost
+                stats['dropped'] += 1
+            queue.delete(message_id)
+
+
+def run_admission(queue, transcribe, controller, args, stats):
+    while len(queue):
+        batch = queue.receive(10)
+        if not batch:
+            time.sleep(0.01)
+            continue
+        deferred = False
+        for message_id, name, receive_count in batch:
+            if not deferred:
+                outcome = controller.admit(name, lambda: transcribe.start_transcription_job(TranscriptionJobName=name))
+                if outcome in (admission.STARTED, admission.EXISTS):
+                    stats['started'] += 1
+                    queue.delete(message_id)
+                    continue
+                deferred = True
+                stats['deferred'] += 1
+            queue.change_visibility(message_id,
+                aws_clients.backoff_delay(receive_count - 1, args.requeue_base_delay, args.requeue_max_delay))
+
+
+def run_case(mode, args):
+    names = [f'asset{i:06d}___bench' for i in range(args.jobs)]
+    queue = FakeQueue(names, visibility_timeout=30)
+    slots = admission.SQLiteSlots()
+    transcribe = FakeTranscribe(args.tps, args.max_concurrent, args.duration, on_finished=slots.release)
+    stats = {'started': 0, 'dropped': 0, 'deferred': 0}
+    lock = threading.Lock()
+
+    def worker():
+        local = {'started': 0, 'dropped': 0, 'deferred': 0}
+        if mode == 'direct':
+            run_direct(queue, transcribe, local)
+        else:
+            # The pool of slots is shared, each invocation has its own token bucket
+            controller = admission.AdmissionController(
+                slots,
+                admission.TokenBucket(args.tps * args.rate_margin / args.workers, 1),
+                max_in_flight=args.max_concurrent,
+                job_status=admission.transcription_job_status(lambda service_name: transcribe)
+            )
+            run_admission(queue, transcribe, controller, args, local)
+        with lock:
+            for name, value in local.items():
+                stats[name] += value
+
+    start = time.monotonic()
+    workers = [threading.Thread(target=worker) for i in range(args.workers)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    admitted = time.monotonic() - start
+    while transcribe.running:
+        time.sleep(0.01)
+    elapsed = time.monotonic() - start
+    transcribe.stop()
+
+    # Lower bound of the drain time set by the quotas
+    bound = max(args.jobs / args.tps, args.jobs * args.duration / args.max_concurrent)
+    return {
+        'mode': mode,
+        'jobs': args.jobs,
+        'started': stats['started'],
+        'dropped': stats['dropped'],
+        'deferred_batches': stats['deferred'],
+        'service_errors': dict(transcribe.errors),
+        'peak_running': transcribe.peak_running,
+        'admission_seconds': round(admitted, 3),
+        'drain_seconds': round(elapsed, 3),
+        'quota_bound_seconds': round(bound, 3),
+        'efficiency': round(bound / elapsed, 3) if stats['started'] == args.jobs else None,
+        'jobs_per_second': round(stats['started'] / admitted, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the transcription admission controller against a fake Transcribe')
+    parser.add_argument('--modes', nargs='+', default=['direct', 'admission'], choices=['direct', 'admission'])
+    parser.add_argument('--jobs', type=int, default=200, help='jobs of the bulk upload')
+    parser.add_argument('--tps', type=int, default=25, help='start rate quota of the fake service')
+    parser.add_argument('--max-concurrent', type=int, default=20, help='concurrent job quota of the fake service')
+    parser.add_argument('--duration', type=float, default=0.5, help='mean job duration in seconds')
+    parser.add_argument('--workers', type=int, default=2, help='concurrent invocations draining the queue')
+    parser.add_argument('--rate-margin', type=float, default=0.9, help='share of the start rate quota used by the token buckets')
+    parser.add_argument('--requeue-base-delay', type=float, default=0.05, help='seconds, scaled down from the function')
+    parser.add_argument('--requeue-max-delay', type=float, default=0.5, help='seconds, scaled down from the function')
+    parser.add_argument('--output', default='bench_admission.json')
+    args = parser.parse_args()
+
+    results = []
+    for mode in args.modes:
+        result = run_case(mode, args)
+        results.append(result)
+        print(f"{mode:>9}: {result['started']}/{result['jobs']} started, {result['dropped']} dropped, "
+              f"peak {result['peak_running']} running, drained in {result['drain_seconds']:.2f}s "
+              f"(quota bound {result['quota_bound_seconds']:.2f}s), service errors {result['service_errors']}")
+
+    report = {
+        'benchmark': 'admission',
+        'revision': git_revision(),
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+# Throughput benchmark of the local word list matcher of the processing Lambda
+# function. Synthetic word lists (single words, phrases and wildcards) are compiled
+# and matched over synthetic transcripts, and compile time, matched items and
+# words per second are reported per case in a JSON file.
+#
+#   $ python benchmarks/bench_matcher.py --words 1000000 5000000 --patterns 1000 10000 --output bench.json
+
+import argparse
+import datetime
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda'))
+
+import word_matcher
+
+import synthetic
+from bench_redaction import StageTimer, git_revision
+
+
+def scan(matcher, pronunciations):
+    return sum(1 for item in matcher.scan(pronunciations) if item[3])
+
+
+def run_case(case, trace_allocations):
+    vocabulary = synthetic.generate_vocabulary(case['vocabulary'])
+    word_list = synthetic.generate_word_list(vocabulary, case['patterns'], case['phrases'], case['wildcards'])
+    pronunciations = synthetic.generate_pronunciations(vocabulary, case['words'])
+
+    timer = StageTimer(trace_allocations)
+    matcher = timer.run('compile', word_matcher.WordMatcher, word_list)
+    matched = timer.run('scan', scan, matcher, pronunciations)
+
+    return dict(
+        case,
+        compiled_patterns=matcher.patterns,
+        matched_words=matched,
+        words_per_second=round(case['words'] / timer.stages['scan']['seconds']),
+        stages=timer.stages
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the local word list matcher on synthetic transcripts')
+    parser.add_argument('--words', type=int, nargs='+', default=[1000000, 5000000], help='pronunciation items per transcript')
+    parser.add_argument('--patterns', type=int, nargs='+', default=[1000, 10000], help='lines per word list')
+    parser.add_argument('--vocabulary', type=int, default=50000, help='distinct words of the transcripts')
+    parser.add_argument('--phrases', type=float, default=0.1, help='share of multi-word patterns')
+    parser.add_argument('--wildcards', type=float, default=0.1, help='share of prefix wildcard patterns')
+    parser.add_argument('--trace-allocations', action='store_true', help='trace allocations with tracemalloc, which slows the stages down')
+    parser.add_argument('--output', default='bench_matcher.json')
+    args = parser.parse_args()
+
+    cases = [
+        {
+            'words': words,
+            'patterns': patterns,
+            'vocabulary': args.vocabulary,
+            'phrases': args.phrases,
+            'wildcards': args.wildcards,
+        }
+        for words, patterns in itertools.product(args.words, args.patterns)
+    ]
+
+    results = []
+    for case in cases:
+        # A fresh process per case, so that peak RSS is not inherited from the previous cases
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('fork')) as executor:
+            result = executor.submit(run_case, case, args.trace_allocations).result()
+        results.append(result)
+        print(f"{case['words']:>9} words {case['patterns']:>6} patterns: compile {result['stages']['compile']['seconds']:.3f}s, "
+              f"scan {result['stages']['scan']['seconds']:.3f}s ({result['words_per_second']} words/s), "
+              f"{result['matched_words']} matched")
+
+    report = {
+        'benchmark': 'matcher',
+        'revision': git_revision(),
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
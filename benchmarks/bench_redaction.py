@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+# Micro-benchmark of the redaction path of the processing Lambda function.
+# Synthetic audio proxies and transcripts are generated at the requested sizes,
+# then each redaction mode runs offline, with S3 replaced by an in-memory stand-in.
+# Every case runs in its own process, and time, peak RSS and traced allocations
+# are reported per stage in a JSON file to compare versions of the engine.
+#
+#   $ python benchmarks/bench_redaction.py --durations 60 600 --masked 10 1000 --output bench.json
+
+import argparse
+import datetime
+import importlib.util
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda'))
+
+import audio_redaction
+import streaming_redaction
+import transcript
+
+import synthetic
+from fake_s3 import FakeS3
+
+
+MODES = ['memory', 'mmap', 'stream', 'sparse', 'fanout']
+
+
+class StageTimer:
+
+    def __init__(self, trace_allocations):
+        self.trace_allocations = trace_allocations
+        self.stages = {}
+
+    def run(self, name, function, *args, **kwargs):
+        if self.trace_allocations:
+            tracemalloc.start()
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+
+        stage = {
+            'seconds': round(elapsed, 6),
+            'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        }
+        if self.trace_allocations:
+            current, peak = tracemalloc.get_traced_memory()
+            stage['allocated_peak_bytes'] = peak
+            stage['allocated_blocks'] = sum(stat.count for stat in tracemalloc.take_snapshot().statistics('filename'))
+            tracemalloc.stop()
+        self.stages[name] = stage
+        return result
+
+
+def parse_transcript(path):
+    with open(path, 'rb') as f:
+        return list(transcript.iter_masked_windows(f))
+
+
+def redact(mode, source, workdir, windows, tones, chunk_size):
+    s3 = FakeS3()
+    if mode == 'memory':
+        audio_redaction.redact_wav(source, os.path.join(workdir, 'redacted.wav'), windows, tones)
+        return s3
+
+    if mode == 'mmap':
+        audio_redaction.redact_wav_in_place(source, windows, tones)
+        return s3
+
+    with open(source, 'rb') as f:
+        s3.put('proxy', 'audio.wav', f.read())
+
+    if mode in ('stream', 'sparse'):
+        streaming_redaction.stream_redact(s3, 'proxy', 'audio.wav', 'audio_redacted.wav', windows, tones,
+            chunk_size=chunk_size, copy_unmasked=(mode == 'sparse'))
+    else:
+        # The fan-out workers run in process through the local invoker
+        import fanout
+        invoker = fanout.LocalInvoker(lambda event, context: fanout.redact_segment(s3, event, tones))
+        fanout.fan_out_redact(invoker, s3, 'proxy', 'audio.wav', 'audio_redacted.wav', windows, chunk_size=chunk_size)
+    return s3
+
+
+def run_case(case, trace_allocations):
+    workdir = tempfile.mkdtemp(prefix='bench_redaction_')
+    try:
+        source = os.path.join(workdir, 'audio.wav')
+        transcript_path = os.path.join(workdir, 'transcription.json')
+        synthetic.generate_wav(source, case['duration'], case['sample_rate'], case['channels'])
+        synthetic.write_transcript(transcript_path, synthetic.generate_transcript(case['duration'], masked_words=case['masked']))
+        tones = synthetic.SineTones()
+        tones.get(case['sample_rate'], case['channels'], 2)
+
+        timer = StageTimer(trace_allocations)
+        windows = timer.run('parse_transcript', parse_transcript, transcript_path)
+        s3 = timer.run('redact', redact, case['mode'], source, workdir, windows, tones, case['chunk_size'])
+
+        return dict(
+            case,
+            proxy_bytes=os.path.getsize(source),
+            transcript_bytes=os.path.getsize(transcript_path),
+            masked_windows=len(windows),
+            s3_bytes_read=s3.bytes_out,
+            s3_bytes_written=s3.bytes_in,
+            stages=timer.stages
+        )
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the redaction modes on synthetic assets')
+    parser.add_argument('--durations', type=float, nargs='+', default=[60, 600], help='asset durations in seconds')
+    parser.add_argument('--channels', type=int, nargs='+', default=[2])
+    parser.add_argument('--masked', type=int, nargs='+', default=[10, 1000], help='masked words per asset')
+    parser.add_argument('--modes', nargs='+', default=MODES, choices=MODES)
+    parser.add_argument('--sample-rate', type=int, default=48000)
+    parser.add_argument('--chunk-size-mb', type=int, default=8)
+    parser.add_argument('--no-trace-allocations', action='store_true', help='skip tracemalloc, which slows the stages down')
+    parser.add_argument('--output', default='bench_redaction.json')
+    args = parser.parse_args()
+
+    if 'fanout' in args.modes and importlib.util.find_spec('boto3') is None:
+        # The fan-out module imports the shared AWS client layer
+        print("boto3 is not installed, skipping the fanout mode")
+        args.modes.remove('fanout')
+
+    cases = [
+        {
+            'mode': mode,
+            'duration': duration,
+            'channels': channels,
+            'masked': masked,
+            'sample_rate': args.sample_rate,
+            'chunk_size': args.chunk_size_mb * 1024 * 1024,
+        }
+        for duration, channels, masked, mode in itertools.product(args.durations, args.channels, args.masked, args.modes)
+    ]
+
+    results = []
+    for case in cases:
+        # A fresh process per case, so that peak RSS is not inherited from the previous cases
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('fork')) as executor:
+            result = executor.submit(run_case, case, not args.no_trace_allocations).result()
+        results.append(result)
+        stages = ', '.join(
+            f"{name} {stage['seconds']:.3f}s rss {stage['max_rss_kb'] // 1024} MiB"
+            for name, stage in result['stages'].items()
+        )
+        print(f"{case['mode']:>7} {case['duration']:>7.0f}s {case['channels']}ch {case['masked']:>6} masked: {stages}")
+
+    report = {
+        'benchmark': 'redaction',
+        'revision': git_revision(),
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+# Load time of the word timings of a transcript by the processing Lambda function:
+# parsing the Transcribe JSON results, against reading the binary sidecar written
+# after the first parse (word_timings.WordTimingsView), from bytes and from a
+# memory mapped file. Sizes and time per stage are reported per case in a JSON file.
+#
+#   $ python benchmarks/bench_word_timings.py --durations 600 3600 14400 --output bench.json
+
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda'))
+
+import transcript
+import word_timings
+
+import synthetic
+from bench_redaction import StageTimer, git_revision
+
+
+def parse_json(path):
+    timings = word_timings.WordTimings()
+    with open(path, 'rb') as f:
+        for start, end, content, masked in transcript.iter_pronunciations(f):
+            timings.append(start, end, content, masked)
+    return timings
+
+
+def load_sidecar(path):
+    with open(path, 'rb') as f:
+        return word_timings.WordTimingsView(f.read()).to_word_timings()
+
+
+def scan_mapped(path):
+    # Masked items read in place, without building the word timings
+    with word_timings.WordTimingsView.open(path) as view:
+        return sum(1 for i in range(len(view)) if view.is_masked(i))
+
+
+def run_case(case, workdir, trace_allocations):
+    json_path = os.path.join(workdir, 'transcription.json')
+    sidecar_path = os.path.join(workdir, 'word_timings.bin')
+    synthetic.write_transcript(json_path, synthetic.generate_transcript(case['duration'], masked_words=case['masked']))
+
+    timer = StageTimer(trace_allocations)
+    timings = timer.run('parse_json', parse_json, json_path)
+    data = timer.run('write_sidecar', timings.to_bytes)
+    with open(sidecar_path, 'wb') as f:
+        f.write(data)
+    loaded = timer.run('load_sidecar', load_sidecar, sidecar_path)
+    masked = timer.run('scan_mapped', scan_mapped, sidecar_path)
+    if loaded.masked_windows() != timings.masked_windows() or masked != timings.masked_count():
+        raise AssertionError("The sidecar does not match the transcript")
+
+    return dict(
+        case,
+        items=len(timings),
+        json_bytes=os.path.getsize(json_path),
+        sidecar_bytes=len(data),
+        speedup=round(timer.stages['parse_json']['seconds'] / timer.stages['load_sidecar']['seconds'], 1),
+        stages=timer.stages
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the binary word timings sidecar against the Transcribe JSON results')
+    parser.add_argument('--durations', type=float, nargs='+', default=[600, 3600, 14400], help='asset durations in seconds')
+    parser.add_argument('--masked', type=int, default=100, help='masked words per transcript')
+    parser.add_argument('--trace-allocations', action='store_true', help='trace allocations with tracemalloc, which slows the stages down')
+    parser.add_argument('--output', default='bench_word_timings.json')
+    args = parser.parse_args()
+
+    results = []
+    for duration in args.durations:
+        case = {'duration': duration, 'masked': args.masked}
+        # A fresh process per case, so that peak RSS is not inherited from the previous cases
+        with tempfile.TemporaryDirectory() as workdir, \
+                ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('fork')) as executor:
+            result = executor.submit(run_case, case, workdir, args.trace_allocations).result()
+        results.append(result)
+        print(f"{duration:>8.0f}s {result['items']:>7} items: JSON {result['json_bytes']} bytes parsed in "
+              f"{result['stages']['parse_json']['seconds']:.3f}s, sidecar {result['sidecar_bytes']} bytes loaded in "
+              f"{result['stages']['load_sidecar']['seconds']:.4f}s ({result['speedup']}x)")
+
+    report = {
+        'benchmark': 'word_timings',
+        'revision': git_revision(),
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
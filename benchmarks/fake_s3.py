@@ -0,0 +1,75 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import io
+import threading
+import uuid
+
+
+# In-memory stand-in for the subset of the S3 client used by the redaction path
+
+
+class FakeS3:
+
+    def __init__(self):
+        self.objects = {}
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self._uploads = {}
+        self._lock = threading.Lock()
+
+    def put(self, bucket, key, data):
+        self.objects[(bucket, key)] = bytes(data)
+
+    def _range(self, data, byte_range):
+        start, end = byte_range.split('=')[1].split('-')
+        return data[int(start):int(end) + 1]
+
+    def head_object(self, Bucket, Key):
+        return {'ContentLength': len(self.objects[(Bucket, Key)])}
+
+    def get_object(self, Bucket, Key, Range=None, **kwargs):
+        data = self.objects[(Bucket, Key)]
+        if Range:
+            data = self._range(data, Range)
+        with self._lock:
+            self.bytes_out += len(data)
+        return {'Body': io.BytesIO(data), 'ETag': '"benchmark"'}
+
+    def download_file(self, Bucket, Key, Filename):
+        data = self.objects[(Bucket, Key)]
+        with self._lock:
+            self.bytes_out += len(data)
+        with open(Filename, 'wb') as f:
+            f.write(data)
+
+    def upload_file(self, Filename, Bucket, Key):
+        with open(Filename, 'rb') as f:
+            data = f.read()
+        with self._lock:
+            self.bytes_in += len(data)
+        self.objects[(Bucket, Key)] = data
+
+    def create_multipart_upload(self, Bucket, Key):
+        upload_id = str(uuid.uuid4())
+        self._uploads[upload_id] = {}
+        return {'UploadId': upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        with self._lock:
+            self.bytes_in += len(Body)
+            self._uploads[UploadId][PartNumber] = bytes(Body)
+        return {'ETag': f'"{PartNumber}"'}
+
+    def upload_part_copy(self, Bucket, Key, UploadId, PartNumber, CopySource, CopySourceRange):
+        data = self._range(self.objects[(CopySource['Bucket'], CopySource['Key'])], CopySourceRange)
+        with self._lock:
+            self._uploads[UploadId][PartNumber] = data
+        return {'CopyPartResult': {'ETag': f'"{PartNumber}"'}}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        parts = self._uploads.pop(UploadId)
+        self.objects[(Bucket, Key)] = b''.join(parts[part['PartNumber']] for part in MultipartUpload['Parts'])
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self._uploads.pop(UploadId, None)
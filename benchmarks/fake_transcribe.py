@@ -0,0 +1,87 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import collections
+import random
+import threading
+import time
+
+
+# In-memory stand-in for start_transcription_job with the account quotas of the
+# service: starts beyond tps in any second are throttled, and starts beyond
+# max_concurrent running jobs fail with LimitExceededException. Jobs run for
+# duration seconds (+/- 50%), and on_finished(job name) is called when they end,
+# like the Transcribe Job State Change event.
+
+
+class FakeTranscribeError(Exception):
+    # Shaped like a botocore ClientError
+
+    def __init__(self, code):
+        super().__init__(code)
+        self.response = {'Error': {'Code': code}}
+
+
+class FakeTranscribe:
+
+    def __init__(self, tps, max_concurrent, duration, on_finished=None):
+        self.tps = tps
+        self.max_concurrent = max_concurrent
+        self.duration = duration
+        self.on_finished = on_finished
+        self.names = set()
+        self.running = {}
+        self.completed = 0
+        self.peak_running = 0
+        self.errors = collections.Counter()
+        self._starts = collections.deque()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._reaper = threading.Thread(target=self._reap, daemon=True)
+        self._reaper.start()
+
+    def start_transcription_job(self, TranscriptionJobName, **kwargs):
+        now = time.monotonic()
+        with self._lock:
+            while self._starts and self._starts[0] <= now - 1:
+                self._starts.popleft()
+            if len(self._starts) >= self.tps:
+                self.errors['ThrottlingException'] += 1
+                raise FakeTranscribeError('ThrottlingException')
+            self._starts.append(now)
+            if TranscriptionJobName in self.names:
+                self.errors['ConflictException'] += 1
+                raise FakeTranscribeError('ConflictException')
+            if len(self.running) >= self.max_concurrent:
+                self.errors['LimitExceededException'] += 1
+                raise FakeTranscribeError('LimitExceededException')
+            self.names.add(TranscriptionJobName)
+            self.running[TranscriptionJobName] = now + self.duration * random.uniform(0.5, 1.5)
+            self.peak_running = max(self.peak_running, len(self.running))
+        return {'TranscriptionJob': {'TranscriptionJobName': TranscriptionJobName, 'TranscriptionJobStatus': 'IN_PROGRESS'}}
+
+    def get_transcription_job(self, TranscriptionJobName):
+        with self._lock:
+            if TranscriptionJobName in self.running:
+                status = 'IN_PROGRESS'
+            elif TranscriptionJobName in self.names:
+                status = 'COMPLETED'
+            else:
+                raise FakeTranscribeError('BadRequestException')
+        return {'TranscriptionJob': {'TranscriptionJobName': TranscriptionJobName, 'TranscriptionJobStatus': status}}
+
+    def _reap(self):
+        while not self._stopped.wait(0.005):
+            now = time.monotonic()
+            with self._lock:
+                finished = [name for name, end in self.running.items() if end <= now]
+                for name in finished:
+                    del self.running[name]
+                self.completed += len(finished)
+            for name in finished:
+                if self.on_finished:
+                    self.on_finished(name)
+
+    def stop(self):
+        self._stopped.set()
+        self._reaper.join()
@@ -0,0 +1,123 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import array
+import json
+import math
+import random
+import wave
+
+
+# Generators of synthetic audio proxies and Amazon Transcribe results
+
+
+def generate_wav(path, duration, sample_rate=48000, channels=2, sample_width=2):
+    # Write a WAV file of duration seconds of noise, one second at a time to keep memory flat
+    frame_size = channels * sample_width
+    second = random.Random(0).randbytes(sample_rate * frame_size)
+    with wave.open(path, 'wb') as output:
+        output.setnchannels(channels)
+        output.setsampwidth(sample_width)
+        output.setframerate(sample_rate)
+        remaining = int(duration * sample_rate)
+        while remaining > 0:
+            frames = min(remaining, sample_rate)
+            output.writeframesraw(second[:frames * frame_size])
+            remaining -= frames
+
+
+def generate_transcript(duration, words_per_second=2.5, masked_words=100, seed=0):
+    # Transcribe style results with pronunciation/punctuation items, masked_words of them "***"
+    rng = random.Random(seed)
+    vocabulary = ["the", "a", "video", "filter", "profanity", "amazon", "transcribe", "hello", "world"]
+    word_count = max(int(duration * words_per_second), masked_words)
+    masked = set(rng.sample(range(word_count), min(masked_words, word_count)))
+    step = duration / word_count
+
+    items = []
+    words = []
+    for i in range(word_count):
+        start = i * step
+        content = "***" if i in masked else rng.choice(vocabulary)
+        words.append(content)
+        items.append({
+            "start_time": f"{start:.3f}",
+            "end_time": f"{start + step * 0.8:.3f}",
+            "alternatives": [{"confidence": "0.99", "content": content}],
+            "type": "pronunciation"
+        })
+        if i % 12 == 11:
+            items.append({"alternatives": [{"confidence": "0.0", "content": "."}], "type": "punctuation"})
+
+    return {
+        "jobName": "benchmark",
+        "accountId": "000000000000",
+        "results": {
+            "transcripts": [{"transcript": " ".join(words)}],
+            "items": items
+        },
+        "status": "COMPLETED"
+    }
+
+
+def generate_vocabulary(size, seed=0):
+    # Distinct random lowercase words of 3 to 9 letters
+    rng = random.Random(seed)
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    vocabulary = set()
+    while len(vocabulary) < size:
+        vocabulary.add(''.join(rng.choice(letters) for _ in range(rng.randint(3, 9))))
+    return sorted(vocabulary)
+
+
+def generate_word_list(vocabulary, patterns, phrases=0.1, wildcards=0.1, seed=0):
+    # Word list lines: single words, phrases of 2 or 3 words and "prefix*" wildcards
+    rng = random.Random(seed)
+    lines = []
+    for _ in range(patterns):
+        kind = rng.random()
+        if kind < phrases:
+            lines.append(' '.join(rng.sample(vocabulary, rng.randint(2, 3))))
+        elif kind < phrases + wildcards:
+            lines.append(rng.choice(vocabulary)[:4] + '*')
+        else:
+            lines.append(rng.choice(vocabulary))
+    return lines
+
+
+def generate_pronunciations(vocabulary, count, seed=0):
+    # (start_time, end_time, content, masked) items as yielded by transcript.iter_pronunciations
+    rng = random.Random(seed)
+    return [(i * 0.4, i * 0.4 + 0.3, rng.choice(vocabulary), False) for i in range(count)]
+
+
+def write_transcript(path, transcript):
+    with open(path, 'w') as f:
+        json.dump(transcript, f)
+
+
+class SineTones:
+    # Tone bank generating a 1 kHz sine in any PCM layout, without pydub
+
+    def __init__(self, frequency=1000, duration=1.0):
+        self.frequency = frequency
+        self.duration = duration
+        self._tones = {}
+
+    def get(self, sample_rate, channels, sample_width):
+        key = (sample_rate, channels, sample_width)
+        if key not in self._tones:
+            typecode = {1: 'b', 2: 'h', 4: 'i'}[sample_width]
+            peak = (1 << (8 * sample_width - 1)) // 4
+            samples = array.array(typecode)
+            for n in range(int(sample_rate * self.duration)):
+                value = int(peak * math.sin(2 * math.pi * self.frequency * n / sample_rate))
+                samples.extend([value] * channels)
+            data = samples.tobytes()
+            if sample_width == 1:
+                data = bytes((b + 128) & 0xFF for b in data)
+            self._tones[key] = data
+        return self._tones[key]
+
+    def get_for(self, layout):
+        return self.get(layout.sample_rate, layout.channels, layout.sample_width)
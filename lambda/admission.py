@@ -0,0 +1,278 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import os
+import sqlite3
+import threading
+import time
+
+import aws_clients
+import backends
+
+
+# Admission control of the transcription jobs. Jobs waiting for Transcribe are
+# queued in SQS, and a job is only started when:
+# - a slot is free in the pool of in-flight jobs (ADMISSION_MAX_IN_FLIGHT), a
+#   slot being leased until the Transcribe Job State Change event of the job
+#   releases it, or until ADMISSION_SLOT_TTL when the event is missed;
+# - the token bucket of the container allows it (ADMISSION_START_RATE starts per
+#   second, ADMISSION_BURST at once).
+# Throttled starts are retried with exponential backoff and full jitter. Jobs that
+# cannot be admitted are left in the queue, whose messages are made visible again
+# after a jittered delay (requeue_delay), so the queue drains as jobs finish.
+# Backends of the pool: "dynamodb" (ADMISSION_TABLE) or "sqlite"
+# (ADMISSION_SQLITE_PATH, ":memory:" by default) for local runs.
+# AWS clients are passed in, which lets the controller run against a local fake
+# Transcribe (see benchmarks/bench_admission.py).
+ADMISSION_BACKEND = os.environ.get('ADMISSION_BACKEND', '')
+ADMISSION_POOL = os.environ.get('ADMISSION_POOL', 'transcribe')
+MAX_IN_FLIGHT = int(os.environ.get('ADMISSION_MAX_IN_FLIGHT', '100'))
+START_RATE = float(os.environ.get('ADMISSION_START_RATE', '4'))
+BURST = float(os.environ.get('ADMISSION_BURST', str(START_RATE)))
+SLOT_TTL = int(os.environ.get('ADMISSION_SLOT_TTL', str(6 * 3600)))
+# Start attempts of a throttled job, and delays of the messages left in the queue
+THROTTLE_MAX_ATTEMPTS = int(os.environ.get('ADMISSION_THROTTLE_MAX_ATTEMPTS', '4'))
+THROTTLE_BASE_DELAY = 0.25
+THROTTLE_MAX_DELAY = 5
+REQUEUE_BASE_DELAY = int(os.environ.get('ADMISSION_REQUEUE_BASE_DELAY', '5'))
+REQUEUE_MAX_DELAY = int(os.environ.get('ADMISSION_REQUEUE_MAX_DELAY', '120'))
+
+# Transcription job statuses after which the job no longer holds its slot
+FINISHED_STATUSES = ('COMPLETED', 'FAILED')
+
+# Outcomes of AdmissionController.admit
+STARTED = 'STARTED'
+EXISTS = 'EXISTS'
+FULL = 'FULL'
+THROTTLED = 'THROTTLED'
+
+
+def requeue_delay(receive_count):
+    # Visibility timeout of a message that could not be admitted, in whole seconds
+    return max(1, int(aws_clients.backoff_delay(max(0, receive_count - 1), REQUEUE_BASE_DELAY, REQUEUE_MAX_DELAY)))
+
+
+class TokenBucket:
+
+    def __init__(self, rate, burst, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self._tokens = self.burst
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        # Take one token, waiting for it if needed. Returns the seconds waited.
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+            self._sleep(delay)
+            waited += delay
+
+
+class DynamoDBSlots:
+    # Pool of in-flight jobs in one item: {Pool, Jobs: {job name: lease expiry}}
+
+    def __init__(self, client_factory, table_name, pool=ADMISSION_POOL):
+        self._client_factory = client_factory
+        self.table_name = table_name
+        self.pool = pool
+        self._created = False
+
+    def _client(self):
+        return self._client_factory('dynamodb')
+
+    def _create(self):
+        if self._created:
+            return
+        try:
+            self._client().put_item(
+                TableName=self.table_name,
+                Item={'Pool': {'S': self.pool}, 'Jobs': {'M': {}}},
+                ConditionExpression='attribute_not_exists(Pool)'
+            )
+        except Exception as e:
+            if aws_clients.error_code(e) != 'ConditionalCheckFailedException':
+                raise
+        self._created = True
+
+    def acquire(self, job_name, limit, ttl=SLOT_TTL):
+        # Lease a slot for the job, False when the pool is full
+        self._create()
+        for attempt in range(2):
+            now = int(time.time())
+            try:
+                self._client().update_item(
+                    TableName=self.table_name,
+                    Key={'Pool': {'S': self.pool}},
+                    UpdateExpression='SET Jobs.#job = :expires',
+                    ConditionExpression='size(Jobs) < :limit OR attribute_exists(Jobs.#job)',
+                    ExpressionAttributeNames={'#job': job_name},
+                    ExpressionAttributeValues={
+                        ':expires': {'N': str(now + ttl)},
+                        ':limit': {'N': str(limit)}
+                    }
+                )
+                return True
+            except Exception as e:
+                if aws_clients.error_code(e) != 'ConditionalCheckFailedException':
+                    raise
+            # Full: free the slots of the jobs whose completion event was missed, then try again
+            if not attempt and not self._expire(now):
+                break
+        return False
+
+    def _expire(self, now):
+        jobs = self._jobs()
+        expired = [name for name, expires in jobs.items() if expires < now]
+        for i in range(0, len(expired), 100):
+            names = {f'#job{j}': name for j, name in enumerate(expired[i:i + 100])}
+            self._client().update_item(
+                TableName=self.table_name,
+                Key={'Pool': {'S': self.pool}},
+                UpdateExpression='REMOVE ' + ', '.join('Jobs.' + key for key in names),
+                ExpressionAttributeNames=names
+            )
+        if expired:
+            print(f"Admission: {len(expired)} expired slots released")
+        return len(expired)
+
+    def release(self, job_name):
+        self._create()
+        self._client().update_item(
+            TableName=self.table_name,
+            Key={'Pool': {'S': self.pool}},
+            UpdateExpression='REMOVE Jobs.#job',
+            ExpressionAttributeNames={'#job': job_name}
+        )
+
+    def _jobs(self):
+        response = self._client().get_item(
+            TableName=self.table_name,
+            Key={'Pool': {'S': self.pool}},
+            ConsistentRead=True
+        )
+        jobs = response.get('Item', {}).get('Jobs', {}).get('M', {})
+        return {name: int(value['N']) for name, value in jobs.items()}
+
+    def in_flight(self):
+        return len(self._jobs())
+
+
+class SQLiteSlots:
+    # Local stand-in for the DynamoDB pool, with the same semantics
+
+    def __init__(self, path=':memory:', pool=ADMISSION_POOL):
+        self.pool = pool
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS admission ('
+                'Pool TEXT, JobName TEXT, ExpiresAt INTEGER, PRIMARY KEY (Pool, JobName))'
+            )
+
+    def acquire(self, job_name, limit, ttl=SLOT_TTL):
+        now = int(time.time())
+        with self._lock, self._connection:
+            self._connection.execute('DELETE FROM admission WHERE Pool = ? AND ExpiresAt < ?', (self.pool, now))
+            held = self._connection.execute(
+                'SELECT COUNT(*) FROM admission WHERE Pool = ? AND JobName = ?', (self.pool, job_name)).fetchone()[0]
+            count = self._connection.execute(
+                'SELECT COUNT(*) FROM admission WHERE Pool = ?', (self.pool,)).fetchone()[0]
+            if not held and count >= limit:
+                return False
+            self._connection.execute(
+                'INSERT OR REPLACE INTO admission (Pool, JobName, ExpiresAt) VALUES (?, ?, ?)',
+                (self.pool, job_name, now + ttl)
+            )
+            return True
+
+    def release(self, job_name):
+        with self._lock, self._connection:
+            self._connection.execute('DELETE FROM admission WHERE Pool = ? AND JobName = ?', (self.pool, job_name))
+
+    def in_flight(self):
+        with self._lock:
+            return self._connection.execute(
+                'SELECT COUNT(*) FROM admission WHERE Pool = ?', (self.pool,)).fetchone()[0]
+
+
+def transcription_job_status(client_factory):
+    # Status of a transcription job by name, from Transcribe
+    def job_status(job_name):
+        response = client_factory('transcribe').get_transcription_job(TranscriptionJobName=job_name)
+        return response['TranscriptionJob']['TranscriptionJobStatus']
+    return job_status
+
+
+class AdmissionController:
+    # job_status(job name) tells whether a job started by an earlier delivery still
+    # holds its slot; without it the slot of such a job is kept until it expires
+
+    def __init__(self, slots, bucket, max_in_flight=MAX_IN_FLIGHT, job_status=None, sleep=time.sleep):
+        self.slots = slots
+        self.bucket = bucket
+        self.max_in_flight = max_in_flight
+        self.job_status = job_status
+        self._sleep = sleep
+
+    def admit(self, job_name, start, metrics=None):
+        # Start the job with start() if a slot and a token are available.
+        # Returns STARTED, EXISTS (already started), FULL or THROTTLED; other errors are raised.
+        if not self.slots.acquire(job_name, self.max_in_flight):
+            return FULL
+
+        waited = self.bucket.acquire()
+        if metrics:
+            metrics.put('AdmissionWait', waited * 1000, 'Milliseconds')
+
+        for attempt in range(THROTTLE_MAX_ATTEMPTS):
+            try:
+                start()
+                return STARTED
+            except Exception as e:
+                code = aws_clients.error_code(e)
+                if code == 'ConflictException':
+                    # Started by an earlier delivery of the message. While the job runs the
+                    # lease is its slot, released by its job state event; a job already
+                    # finished released it before this delivery took it again.
+                    if self.job_status and self.job_status(job_name) in FINISHED_STATUSES:
+                        self.slots.release(job_name)
+                    return EXISTS
+                if code not in aws_clients.THROTTLING_ERROR_CODES:
+                    self.slots.release(job_name)
+                    raise
+                if metrics:
+                    metrics.put('Throttled', attempt + 1)
+                if attempt < THROTTLE_MAX_ATTEMPTS - 1:
+                    self._sleep(aws_clients.backoff_delay(attempt, THROTTLE_BASE_DELAY, THROTTLE_MAX_DELAY))
+
+        self.slots.release(job_name)
+        return THROTTLED
+
+
+def _open_controller(client_factory):
+    slots = backends.select(ADMISSION_BACKEND, 'ADMISSION', 'admission',
+        lambda table_name: DynamoDBSlots(client_factory, table_name), SQLiteSlots)
+    if slots is None:
+        return None
+    return AdmissionController(slots, TokenBucket(START_RATE, BURST),
+        job_status=transcription_job_status(client_factory))
+
+
+_controller = backends.Shared(_open_controller)
+
+
+def open_controller(client_factory):
+    # Controller configured by the environment, shared across warm invocations (None when disabled)
+    return _controller.get(client_factory)
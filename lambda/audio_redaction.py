@@ -0,0 +1,191 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import bisect
+import collections
+import mmap
+import struct
+import wave
+
+
+# Layout of the PCM samples in a WAV file, data_offset and data_size in bytes
+WavLayout = collections.namedtuple(
+    'WavLayout',
+    ['sample_rate', 'channels', 'sample_width', 'data_offset', 'data_size']
+)
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+def read_wav_layout(read_at):
+    # Walk the RIFF chunks up to the "data" chunk. read_at(offset, size) returns
+    # the file bytes at offset, so the same parser works on local files and S3.
+    riff = read_at(0, 12)
+    if len(riff) < 12 or riff[0:4] != b'RIFF' or riff[8:12] != b'WAVE':
+        raise ValueError("Not a RIFF/WAVE file")
+
+    fmt = None
+    offset = 12
+    while True:
+        chunk_header = read_at(offset, 8)
+        if len(chunk_header) < 8:
+            raise ValueError("WAV file has no data chunk")
+        chunk_id, chunk_size = struct.unpack('<4sI', chunk_header)
+
+        if chunk_id == b'fmt ':
+            fmt = read_at(offset + 8, chunk_size)
+            audio_format, channels, sample_rate = struct.unpack('<HHI', fmt[0:8])
+            bits_per_sample = struct.unpack('<H', fmt[14:16])[0]
+            if audio_format == WAVE_FORMAT_EXTENSIBLE and len(fmt) >= 26:
+                audio_format = struct.unpack('<H', fmt[24:26])[0]
+            if audio_format != WAVE_FORMAT_PCM:
+                raise ValueError(f"Unsupported WAV format: {audio_format}")
+
+        elif chunk_id == b'data':
+            if fmt is None:
+                raise ValueError("WAV data chunk found before fmt chunk")
+            return WavLayout(sample_rate, channels, bits_per_sample // 8, offset + 8, chunk_size)
+
+        # Chunks are word aligned
+        offset += 8 + chunk_size + (chunk_size & 1)
+
+
+def file_reader(f):
+    def read_at(offset, size):
+        f.seek(offset)
+        return f.read(size)
+    return read_at
+
+
+def masked_byte_ranges(masked_windows, sample_rate, frame_size, data_offset, data_size):
+    # Convert the (start_time, end_time) windows in seconds into sorted, frame aligned
+    # [start, end) byte ranges of the file. Overlapping windows are merged.
+    nframes = data_size // frame_size
+    frame_ranges = []
+    for start_time, end_time in masked_windows:
+        s = min(max(int(round(float(start_time) * sample_rate)), 0), nframes)
+        e = min(max(int(round(float(end_time) * sample_rate)), 0), nframes)
+        if e > s:
+            frame_ranges.append((s, e))
+    frame_ranges.sort()
+
+    byte_ranges = []
+    for s, e in frame_ranges:
+        start = data_offset + s * frame_size
+        end = data_offset + e * frame_size
+        if byte_ranges and start < byte_ranges[-1][1]:
+            byte_ranges[-1] = (byte_ranges[-1][0], max(end, byte_ranges[-1][1]))
+        else:
+            byte_ranges.append((start, end))
+    return byte_ranges
+
+
+def overlaps(byte_ranges, start, end):
+    # True if any of the sorted, disjoint byte ranges intersects [start, end)
+    i = bisect.bisect_left(byte_ranges, (end,))
+    return i > 0 and byte_ranges[i - 1][1] > start
+
+
+def silence_byte(sample_width):
+    # 8 bit WAV samples are unsigned, all other widths are signed
+    return b'\x80' if sample_width == 1 else b'\x00'
+
+
+def patch(buffer, buffer_offset, byte_ranges, tone, sample_width):
+    # Overwrite the parts of the masked byte ranges that fall within buffer, where
+    # buffer holds the file bytes starting at buffer_offset. Every range starts the
+    # tone from its beginning and repeats it for as long as the range lasts.
+    buffer_end = buffer_offset + len(buffer)
+    tone = memoryview(tone)
+    patched = 0
+
+    first = bisect.bisect_right(byte_ranges, (buffer_offset, buffer_offset))
+    if first > 0 and byte_ranges[first - 1][1] > buffer_offset:
+        first -= 1
+
+    for range_start, range_end in byte_ranges[first:]:
+        if range_start >= buffer_end:
+            break
+        start = max(range_start, buffer_offset)
+        end = min(range_end, buffer_end)
+        patched += end - start
+
+        if not tone:
+            buffer[start - buffer_offset:end - buffer_offset] = silence_byte(sample_width) * (end - start)
+            continue
+
+        phase = (start - range_start) % len(tone)
+        while start < end:
+            size = min(len(tone) - phase, end - start)
+            buffer[start - buffer_offset:start - buffer_offset + size] = tone[phase:phase + size]
+            start += size
+            phase = 0
+
+    return patched
+
+
+def redact_wav(source_path, output_path, masked_windows, tones):
+    # Load the PCM samples once into a mutable buffer, overwrite each masked
+    # window in place at sample precision and write the result back as WAV
+    with wave.open(source_path, 'rb') as source:
+        params = source.getparams()
+        frames = bytearray(source.readframes(params.nframes))
+
+    frame_size = params.nchannels * params.sampwidth
+    tone = tones.get(params.framerate, params.nchannels, params.sampwidth)
+    byte_ranges = masked_byte_ranges(masked_windows, params.framerate, frame_size, 0, len(frames))
+    patch(frames, 0, byte_ranges, tone, params.sampwidth)
+
+    with wave.open(output_path, 'wb') as output:
+        output.setparams(params)
+        output.writeframes(frames)
+
+    return len(byte_ranges)
+
+
+def redact_wav_in_place(path, masked_windows, tones):
+    # Memory map the WAV file and write the tone directly into the masked byte
+    # ranges, without decoding or re-encoding the audio. Only the pages of the
+    # masked ranges are touched, so memory use does not grow with the file size.
+    with open(path, 'r+b') as f:
+        layout = read_wav_layout(file_reader(f))
+        file_size = f.seek(0, 2)
+        data_size = min(layout.data_size, file_size - layout.data_offset)
+
+        frame_size = layout.channels * layout.sample_width
+        byte_ranges = masked_byte_ranges(
+            masked_windows, layout.sample_rate, frame_size, layout.data_offset, data_size
+        )
+        if not byte_ranges:
+            return 0
+
+        tone = tones.get_for(layout)
+        with mmap.mmap(f.fileno(), 0) as mapped:
+            patch(mapped, 0, byte_ranges, tone, layout.sample_width)
+            mapped.flush()
+
+    return len(byte_ranges)
+
+
+def redact_encoded(source_path, output_path, masked_windows, tones, audio_format):
+    # Compressed proxies (FLAC) are decoded with pydub, which requires ffmpeg,
+    # patched at sample precision and encoded again losslessly
+    from pydub import AudioSegment
+
+    audio = AudioSegment.from_file(source_path, format=audio_format)
+    frames = bytearray(audio.raw_data)
+
+    frame_size = audio.channels * audio.sample_width
+    tone = tones.get(audio.frame_rate, audio.channels, audio.sample_width)
+    byte_ranges = masked_byte_ranges(masked_windows, audio.frame_rate, frame_size, 0, len(frames))
+    patch(frames, 0, byte_ranges, tone, audio.sample_width)
+
+    AudioSegment(
+        data=bytes(frames),
+        sample_width=audio.sample_width,
+        frame_rate=audio.frame_rate,
+        channels=audio.channels
+    ).export(output_path, format=audio_format)
+
+    return len(byte_ranges)
@@ -0,0 +1,133 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import json
+import os
+import random
+import threading
+import time
+
+import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError
+
+
+# Clients are built lazily, once per container, with connection pooling and
+# adaptive retries. Nothing here calls AWS at import time.
+CLIENT_CONFIG = Config(
+    max_pool_connections=int(os.environ.get('AWS_MAX_POOL_CONNECTIONS', '50')),
+    retries={
+        'max_attempts': int(os.environ.get('AWS_MAX_ATTEMPTS', '10')),
+        'mode': 'adaptive'
+    }
+)
+
+# Synchronous invocations of the fan-out workers can last up to the function timeout
+SERVICE_CONFIGS = {
+    'lambda': CLIENT_CONFIG.merge(Config(read_timeout=900))
+}
+
+# The account MediaConvert endpoint is taken from the environment when set,
+# otherwise resolved once and cached on /tmp for the life of the container
+MEDIACONVERT_ENDPOINT_CACHE = '/tmp/mediaconvert_endpoint.json'
+
+# Throttling errors that outlast the client retries are retried again by
+# call_with_backoff, with exponential backoff and full jitter
+THROTTLING_ERROR_CODES = ('TooManyRequestsException', 'ThrottlingException', 'LimitExceededException')
+BACKOFF_MAX_ATTEMPTS = int(os.environ.get('BACKOFF_MAX_ATTEMPTS', '6'))
+BACKOFF_BASE_DELAY = 0.5
+BACKOFF_MAX_DELAY = 20
+
+_clients = {}
+_lock = threading.Lock()
+
+
+def client(service_name):
+    with _lock:
+        if service_name not in _clients:
+            _clients[service_name] = boto3.client(
+                service_name,
+                config=SERVICE_CONFIGS.get(service_name, CLIENT_CONFIG)
+            )
+        return _clients[service_name]
+
+
+def mediaconvert_endpoint():
+    endpoint = os.environ.get('MEDIACONVERT_ENDPOINT')
+    if endpoint:
+        return endpoint
+
+    try:
+        with open(MEDIACONVERT_ENDPOINT_CACHE) as f:
+            return json.load(f)['Url']
+    except (OSError, ValueError, KeyError):
+        pass
+
+    endpoints = client('mediaconvert').describe_endpoints()
+    endpoint = endpoints['Endpoints'][0]['Url']
+    try:
+        with open(MEDIACONVERT_ENDPOINT_CACHE, 'w') as f:
+            json.dump({'Url': endpoint}, f)
+    except OSError as e:
+        print(f"Unable to cache the MediaConvert endpoint: {e}")
+    return endpoint
+
+
+def mediaconvert():
+    # AWS Elemental MediaConvert client bound to the account endpoint
+    with _lock:
+        mediaconvert_client = _clients.get('mediaconvert_account')
+    if mediaconvert_client:
+        return mediaconvert_client
+
+    endpoint = mediaconvert_endpoint()
+    with _lock:
+        if 'mediaconvert_account' not in _clients:
+            _clients['mediaconvert_account'] = boto3.client(
+                'mediaconvert',
+                endpoint_url=endpoint,
+                verify=False,
+                config=CLIENT_CONFIG
+            )
+        return _clients['mediaconvert_account']
+
+
+def error_code(e):
+    # Error code of a ClientError (or of an error shaped like one), None for other errors
+    return (getattr(e, 'response', None) or {}).get('Error', {}).get('Code')
+
+
+def backoff_delay(attempt, base_delay=BACKOFF_BASE_DELAY, max_delay=BACKOFF_MAX_DELAY):
+    # Full jitter: a random delay up to an exponentially growing cap
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+
+
+def call_with_backoff(operation, **kwargs):
+    # Call a client operation, sleeping a random delay up to an exponentially
+    # growing cap each time it is throttled
+    for attempt in range(BACKOFF_MAX_ATTEMPTS):
+        try:
+            return operation(**kwargs)
+        except ClientError as e:
+            if error_code(e) not in THROTTLING_ERROR_CODES or attempt == BACKOFF_MAX_ATTEMPTS - 1:
+                raise
+            delay = backoff_delay(attempt)
+            print(f"Throttled, retrying in {delay:.2f}s (attempt {attempt + 1})")
+            time.sleep(delay)
+
+
+def dead_letter(queue_url, record, error):
+    # Send an SQS message that fails on every delivery (a configuration error) to its
+    # dead-letter queue right away, instead of waiting for the redrive policy. False when
+    # it could not be sent, the message is then left to the redrive policy.
+    try:
+        client('sqs').send_message(
+            QueueUrl=queue_url,
+            MessageBody=record["body"],
+            MessageAttributes={'Error': {'DataType': 'String', 'StringValue': str(error)[:1024]}}
+        )
+    except Exception as e:
+        print("Unable to send message {} to the dead-letter queue: {}".format(record["messageId"], e))
+        return False
+    print("Message {} sent to the dead-letter queue".format(record["messageId"]))
+    return True
@@ -0,0 +1,51 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import os
+import threading
+
+
+# Storage backends of the indexes and stores of the pipeline (dedup_index,
+# word_index, admission, pipeline_state), configured by the environment with
+# a common prefix:
+# - <PREFIX>_BACKEND: "dynamodb", "sqlite", or empty to disable the feature
+# - <PREFIX>_TABLE: table of the "dynamodb" backend
+# - <PREFIX>_SQLITE_PATH: database of the "sqlite" backend, for local runs
+DYNAMODB = 'dynamodb'
+SQLITE = 'sqlite'
+
+
+def select(backend, prefix, description, dynamodb, sqlite):
+    # Instance of the backend: dynamodb(table name) or sqlite(database path), None when
+    # the backend is empty. Unknown backends and missing tables raise a ValueError.
+    if not backend:
+        return None
+    if backend == DYNAMODB:
+        table_name = os.environ.get(prefix + '_TABLE')
+        if not table_name:
+            raise ValueError(f"{prefix}_TABLE is required by the DynamoDB {description} backend")
+        return dynamodb(table_name)
+    if backend == SQLITE:
+        return sqlite(os.environ.get(prefix + '_SQLITE_PATH', ':memory:'))
+    raise ValueError(f"Unknown {description} backend: {backend}")
+
+
+class Shared:
+    # Instance built by open(*args) on first use and shared across warm invocations.
+    # None (disabled) is not kept, nor are errors: the next call opens it again.
+
+    def __init__(self, open):
+        self._open = open
+        self._instance = None
+        self._lock = threading.Lock()
+
+    def get(self, *args):
+        with self._lock:
+            if self._instance is None:
+                self._instance = self._open(*args)
+            return self._instance
+
+    def reset(self):
+        # Drop the instance, the next call opens it again (tests)
+        with self._lock:
+            self._instance = None
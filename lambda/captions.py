@@ -0,0 +1,72 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import codecs
+import re
+
+import transcript
+
+
+# Streaming rewriter of the WebVTT captions produced by Transcribe, driven by the
+# WordTimings of the transcript so that captions are masked exactly where the
+# audio is bleeped. The words of each cue are aligned in order with the
+# transcript items from the cue start time, and the words of masked items are
+# replaced with the Transcribe mask. Only the cue text is rewritten; the header,
+# cue identifiers and timings are kept.
+READ_SIZE = 64 * 1024
+# Seconds before the cue start where the aligned items may start
+TIME_SLACK = 0.5
+# Transcript items skipped at most to align a caption word
+LOOKAHEAD = 4
+
+_timestamp = re.compile(r'(?:(\d+):)?(\d{2}):(\d{2})\.(\d{3})')
+_token = re.compile(r"""[^\s.,!?;:"()\[\]]+""")
+
+
+def iter_lines(body, read_size=READ_SIZE):
+    # Text lines, without line endings, of a binary file-like body
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    rest = ''
+    while True:
+        data = body.read(read_size)
+        lines = (rest + decoder.decode(data or b'', final=not data)).split('\n')
+        rest = lines.pop()
+        for line in lines:
+            yield line.rstrip('\r')
+        if not data:
+            break
+    if rest:
+        yield rest.rstrip('\r')
+
+
+def parse_timestamp(text):
+    match = _timestamp.match(text.strip())
+    hours, minutes, seconds, milliseconds = match.groups()
+    return int(hours or 0) * 3600 + int(minutes) * 60 + int(seconds) + int(milliseconds) / 1000
+
+
+def redact_vtt(lines, timings):
+    # Yield the lines of the captions with the words of the masked items masked.
+    # Words that cannot be aligned with an item are masked if their word is masked elsewhere.
+    masked_words = timings.masked_words()
+    item = 0
+    in_cue = False
+
+    def redact_token(match):
+        nonlocal item
+        word = transcript.normalize_word(match.group())
+        for i in range(item, min(item + LOOKAHEAD, len(timings))):
+            if timings.word(i) == word:
+                item = i + 1
+                return transcript.MASK if timings.masked[i] else match.group()
+        return transcript.MASK if word in masked_words else match.group()
+
+    for line in lines:
+        if not line.strip():
+            in_cue = False
+        elif '-->' in line:
+            in_cue = True
+            item = max(item, timings.index_at(parse_timestamp(line.split('-->')[0]) - TIME_SLACK))
+        elif in_cue:
+            line = _token.sub(redact_token, line)
+        yield line
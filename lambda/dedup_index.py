@@ -0,0 +1,175 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+import aws_clients
+import backends
+
+
+# Index of the assets already processed, keyed by the content of the source
+# object and the fingerprint of the configuration applied to it. Ingest claims
+# the key of every upload, and the processing function marks it COMPLETE with
+# the destination of the final asset once the last MediaConvert job completes
+# (or releases it when the job fails).
+# Claims left PENDING longer than PENDING_TTL (failed runs) can be claimed again.
+# Backends: "dynamodb" (DEDUP_TABLE) or "sqlite" (DEDUP_SQLITE_PATH, ":memory:"
+# by default) for local runs. Deduplication is disabled when DEDUP_BACKEND is empty.
+DEDUP_BACKEND = os.environ.get('DEDUP_BACKEND', '')
+PENDING_TTL = int(os.environ.get('DEDUP_PENDING_TTL', str(6 * 3600)))
+
+PENDING = 'PENDING'
+COMPLETE = 'COMPLETE'
+
+
+def content_key(etag, size, fingerprint):
+    # S3 ETags identify the content of single part uploads, and of multipart
+    # uploads made with the same part size; the size guards against collisions
+    etag = etag.strip('"')
+    return hashlib.sha256(f'{etag}|{size}|{fingerprint}'.encode('utf-8')).hexdigest()
+
+
+class DynamoDBIndex:
+
+    def __init__(self, table_name):
+        self.table_name = table_name
+
+    def claim(self, key, asset_id, source):
+        # Returns (True, new item) when the key is claimed, (False, existing item) otherwise
+        now = int(time.time())
+        item = {'ContentKey': key, 'AssetID': asset_id, 'Source': source, 'Status': PENDING, 'UpdatedAt': now}
+        try:
+            aws_clients.client('dynamodb').put_item(
+                TableName=self.table_name,
+                Item=_to_attributes(item),
+                ConditionExpression='attribute_not_exists(ContentKey) OR (#status <> :complete AND UpdatedAt < :stale)',
+                ExpressionAttributeNames={'#status': 'Status'},
+                ExpressionAttributeValues={
+                    ':complete': {'S': COMPLETE},
+                    ':stale': {'N': str(now - PENDING_TTL)}
+                }
+            )
+            return True, item
+        except aws_clients.ClientError as e:
+            if aws_clients.error_code(e) != 'ConditionalCheckFailedException':
+                raise
+            return False, self.get(key)
+
+    def complete(self, key, destination):
+        aws_clients.client('dynamodb').update_item(
+            TableName=self.table_name,
+            Key={'ContentKey': {'S': key}},
+            UpdateExpression='SET #status = :complete, Destination = :destination, UpdatedAt = :now',
+            ExpressionAttributeNames={'#status': 'Status'},
+            ExpressionAttributeValues={
+                ':complete': {'S': COMPLETE},
+                ':destination': {'S': destination},
+                ':now': {'N': str(int(time.time()))}
+            }
+        )
+
+    def release(self, key, asset_id):
+        # Drop a claim whose pipeline could not be started, so that the next upload is processed
+        try:
+            aws_clients.client('dynamodb').delete_item(
+                TableName=self.table_name,
+                Key={'ContentKey': {'S': key}},
+                ConditionExpression='AssetID = :asset_id AND #status = :pending',
+                ExpressionAttributeNames={'#status': 'Status'},
+                ExpressionAttributeValues={':asset_id': {'S': asset_id}, ':pending': {'S': PENDING}}
+            )
+        except aws_clients.ClientError as e:
+            if aws_clients.error_code(e) != 'ConditionalCheckFailedException':
+                raise
+
+    def get(self, key):
+        response = aws_clients.client('dynamodb').get_item(
+            TableName=self.table_name,
+            Key={'ContentKey': {'S': key}},
+            ConsistentRead=True
+        )
+        return _from_attributes(response.get('Item'))
+
+
+class SQLiteIndex:
+    # Local stand-in for the DynamoDB index, with the same conditional semantics
+
+    def __init__(self, path=':memory:'):
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS dedup ('
+                'ContentKey TEXT PRIMARY KEY, AssetID TEXT, Source TEXT, Status TEXT, '
+                'Destination TEXT, UpdatedAt INTEGER)'
+            )
+
+    def claim(self, key, asset_id, source):
+        now = int(time.time())
+        with self._lock, self._connection:
+            cursor = self._connection.execute(
+                'INSERT INTO dedup (ContentKey, AssetID, Source, Status, UpdatedAt) VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT (ContentKey) DO UPDATE SET AssetID = excluded.AssetID, Source = excluded.Source, '
+                'Status = excluded.Status, Destination = NULL, UpdatedAt = excluded.UpdatedAt '
+                'WHERE dedup.Status <> ? AND dedup.UpdatedAt < ?',
+                (key, asset_id, source, PENDING, now, COMPLETE, now - PENDING_TTL)
+            )
+            claimed = cursor.rowcount == 1
+        if claimed:
+            return True, {'ContentKey': key, 'AssetID': asset_id, 'Source': source, 'Status': PENDING, 'UpdatedAt': now}
+        return False, self.get(key)
+
+    def complete(self, key, destination):
+        with self._lock, self._connection:
+            self._connection.execute(
+                'UPDATE dedup SET Status = ?, Destination = ?, UpdatedAt = ? WHERE ContentKey = ?',
+                (COMPLETE, destination, int(time.time()), key)
+            )
+
+    def release(self, key, asset_id):
+        with self._lock, self._connection:
+            self._connection.execute(
+                'DELETE FROM dedup WHERE ContentKey = ? AND AssetID = ? AND Status = ?',
+                (key, asset_id, PENDING)
+            )
+
+    def get(self, key):
+        with self._lock:
+            cursor = self._connection.execute(
+                'SELECT ContentKey, AssetID, Source, Status, Destination, UpdatedAt FROM dedup WHERE ContentKey = ?',
+                (key,)
+            )
+            row = cursor.fetchone()
+        if row is None:
+            return None
+        return {name: value for name, value in zip(
+            ('ContentKey', 'AssetID', 'Source', 'Status', 'Destination', 'UpdatedAt'), row) if value is not None}
+
+
+_index = backends.Shared(
+    lambda: backends.select(DEDUP_BACKEND, 'DEDUP', 'deduplication', DynamoDBIndex, SQLiteIndex))
+
+
+def open_index():
+    # Index configured by the environment, shared across warm invocations (None when disabled)
+    return _index.get()
+
+
+def _to_attributes(item):
+    return {
+        name: {'N': str(value)} if isinstance(value, int) else {'S': value}
+        for name, value in item.items()
+    }
+
+
+def _from_attributes(attributes):
+    if not attributes:
+        return None
+    return {
+        name: int(value['N']) if 'N' in value else value['S']
+        for name, value in attributes.items()
+    }
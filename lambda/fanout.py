@@ -0,0 +1,127 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import audio_redaction
+import aws_clients
+import streaming_redaction
+
+
+# Fan-out/fan-in redaction of very long audio proxies. The coordinator opens the
+# multipart upload of the redacted file and splits its parts into segments. Each
+# segment is redacted by a parallel worker invocation (sparse copy + patching),
+# then the coordinator completes the upload with the ETags returned by the workers.
+SEGMENT_ACTION = "RedactSegment"
+
+
+class LambdaInvoker:
+    # Synchronously invoke a worker Lambda function with a JSON payload
+
+    def __init__(self, function_name):
+        self.function_name = function_name
+
+    def __call__(self, payload):
+        response = aws_clients.client('lambda').invoke(
+            FunctionName=self.function_name,
+            InvocationType='RequestResponse',
+            Payload=json.dumps(payload).encode('utf-8')
+        )
+        result = json.loads(response['Payload'].read())
+        if 'FunctionError' in response:
+            raise RuntimeError(f"Segment worker failed: {result}")
+        return result
+
+
+class LocalInvoker:
+    # In-process stand-in for LambdaInvoker, used to run the orchestration locally.
+    # Payloads and results go through JSON as they would through Lambda.
+
+    def __init__(self, handler):
+        self.handler = handler
+
+    def __call__(self, payload):
+        result = self.handler(json.loads(json.dumps(payload)), None)
+        return json.loads(json.dumps(result))
+
+
+def plan_segments(object_size, part_size, parts_per_segment):
+    # Group the (part number, offset) parts of the upload into contiguous segments
+    parts = list(enumerate(range(0, max(object_size, 1), part_size), start=1))
+    return [parts[i:i + parts_per_segment] for i in range(0, len(parts), parts_per_segment)]
+
+
+def fan_out_redact(invoker, s3_client, bucket, source_key, destination_key, masked_windows,
+                   chunk_size=8 * 1024 * 1024, parts_per_segment=16, max_invocations=32):
+    object_size, layout, byte_ranges = streaming_redaction.read_layout(s3_client, bucket, source_key, masked_windows)
+    part_size = streaming_redaction.part_size_for(object_size, chunk_size)
+    segments = plan_segments(object_size, part_size, parts_per_segment)
+
+    upload_id = s3_client.create_multipart_upload(Bucket=bucket, Key=destination_key)['UploadId']
+
+    def payload(segment):
+        # Only the masked ranges of the segment are sent, to stay within the invocation payload limit
+        start = segment[0][1]
+        end = min(segment[-1][1] + part_size, object_size)
+        return {
+            "Action": SEGMENT_ACTION,
+            "Bucket": bucket,
+            "SourceKey": source_key,
+            "DestinationKey": destination_key,
+            "UploadId": upload_id,
+            "ObjectSize": object_size,
+            "PartSize": part_size,
+            "Parts": segment,
+            "Layout": layout._asdict(),
+            "ByteRanges": [
+                byte_range for byte_range in byte_ranges
+                if audio_redaction.overlaps([byte_range], start, end)
+            ],
+        }
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_invocations, len(segments)))) as executor:
+            results = list(executor.map(lambda segment: invoker(payload(segment)), segments))
+
+        parts = sorted(
+            (part for result in results for part in result["Parts"]),
+            key=lambda part: part['PartNumber']
+        )
+        transferred = sum(result["BytesTransferred"] for result in results)
+        s3_client.complete_multipart_upload(
+            Bucket=bucket,
+            Key=destination_key,
+            UploadId=upload_id,
+            MultipartUpload={'Parts': parts}
+        )
+
+    except Exception:
+        s3_client.abort_multipart_upload(Bucket=bucket, Key=destination_key, UploadId=upload_id)
+        raise
+
+    print(f"Redacted {len(byte_ranges)} masked ranges in {len(segments)} segments")
+    return transferred
+
+
+def redact_segment(s3_client, event, tones, max_workers=4):
+    # Worker side: produce the parts of one segment and return their ETags
+    # with the bytes read and uploaded by the worker
+    layout = audio_redaction.WavLayout(**event["Layout"])
+    byte_ranges = [tuple(byte_range) for byte_range in event["ByteRanges"]]
+    parts, transferred = streaming_redaction.upload_parts(
+        s3_client,
+        event["Bucket"],
+        event["SourceKey"],
+        event["DestinationKey"],
+        event["UploadId"],
+        [tuple(part) for part in event["Parts"]],
+        event["PartSize"],
+        event["ObjectSize"],
+        byte_ranges,
+        tones.get_for(layout),
+        layout.sample_width,
+        max_workers=max_workers,
+        copy_unmasked=True
+    )
+    return {"Parts": parts, "BytesTransferred": transferred}
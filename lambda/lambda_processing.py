@@ -1,11 +1,32 @@
 # Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
 # SPDX-License-Identifier: MIT-0
 
+import copy
 import json
-import boto3
 import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
 
-from pydub import AudioSegment
+import audio_redaction
+import aws_clients
+import captions
+import dedup_index
+import fanout
+import output_profiles
+import pipeline_state
+import proxy_job
+import proxy_profiles
+import resource_cache
+import streaming_redaction
+import tone_bank
+import transcribe_config
+import transcribe_jobs
+import transcript
+import vocabulary_filters
+import word_index
+import word_matcher
+import word_timings
+from metrics import Metrics
 
 
 # Environment Variables
@@ -13,106 +34,528 @@ PROXY_BUCKET = os.environ['PROXY_BUCKET']
 OUTPUT_BUCKET = os.environ['DESTINATION_BUCKET']
 RESOURCES_BUCKET = os.environ['RESOURCES_BUCKET']
 MEDIACONVERT_EXECUTION_ROLE_ARN = os.environ['MEDIACONVERT_EXECUTION_ROLE_ARN']
+# memory: decode the proxy into memory and write a new WAV file
+# mmap: patch the downloaded proxy file in place through a memory map
+# stream: redact while streaming the proxy from S3 into a multipart upload, without /tmp staging
+# sparse: like stream, but parts without masked words are copied server side from the proxy
+# fanout: like sparse, with the parts split into segments redacted by parallel invocations of this function
+# Compressed (FLAC) audio proxies are always decoded into memory, which requires ffmpeg
+REDACTION_MODE = os.environ.get('REDACTION_MODE', 'memory')
+STREAM_CHUNK_SIZE = int(os.environ.get('STREAM_CHUNK_SIZE_MB', '8')) * 1024 * 1024
+STREAM_MAX_WORKERS = int(os.environ.get('STREAM_MAX_WORKERS', '4'))
+# Fan-out mode: parts per segment, concurrent worker invocations, and "lambda" or "local" (in-process) workers
+FANOUT_SEGMENT_PARTS = int(os.environ.get('FANOUT_SEGMENT_PARTS', '16'))
+FANOUT_MAX_INVOCATIONS = int(os.environ.get('FANOUT_MAX_INVOCATIONS', '32'))
+FANOUT_INVOKER = os.environ.get('FANOUT_INVOKER', 'lambda')
+# Batch mode: assets of an SQS batch processed concurrently, each staged in its own /tmp directory
+BATCH_MAX_WORKERS = int(os.environ.get('BATCH_MAX_WORKERS', '4'))
+# Dead-letter queue of the processing queue, configuration errors are sent there without retries
+DEAD_LETTER_QUEUE_URL = os.environ.get('DEAD_LETTER_QUEUE_URL')
+WORK_DIR = os.environ.get('WORK_DIR', '/tmp/assets')
+# Direct transcription (see transcribe_jobs): the audio proxy of sources transcribed
+# directly is extracted only when masked words are found, with this role
+PROXY_EXECUTION_ROLE_ARN = os.environ.get('PROXY_EXECUTION_ROLE_ARN')
+WORKLOAD_NAME = os.environ.get('WORKLOAD_NAME')
+# Stage of the final MediaConvert jobs of deduplicated assets, whose state change
+# events come back to this function to complete the deduplication entry
+FINAL_STAGE = "FINAL"
+# Output profile of the final MediaConvert job (see output_profiles): "transcode", "passthrough" or "abr"
+OUTPUT_PROFILE = os.environ.get('OUTPUT_PROFILE', output_profiles.DEFAULT_PROFILE)
     
 
-# AWS services clients
-# AWS Elemental MediaConvert: 
-mediaconvert_client = boto3.client('mediaconvert')
-endpoints = mediaconvert_client.describe_endpoints()
-mediaconvert_client = boto3.client(
-    'mediaconvert',
-    endpoint_url=endpoints['Endpoints'][0]['Url'], 
-    verify=False
-)
+def load_tones():
+    # Load the beep audio file from the Resources bucket, cached across warm invocations
+    # as a bank of tones converted to the layout of each audio proxy
+    return resource_cache.get(aws_clients.client('s3'), RESOURCES_BUCKET, "Audio/beep.wav", tone_bank.ToneBank.from_wav_bytes)
 
-# Amazon S3:
-s3 = boto3.resource('s3')
-s3_client = boto3.client('s3')
 
+def fanout_invoker():
+    if FANOUT_INVOKER == 'local':
+        return fanout.LocalInvoker(handler)
+    return fanout.LambdaInvoker(os.environ.get('FANOUT_FUNCTION_NAME') or os.environ['AWS_LAMBDA_FUNCTION_NAME'])
+
+
+def put_upstream_metrics(metrics, emc_job, transcription_job_name):
+    # Queue and processing times of the audio proxy MediaConvert job (if any) and of the Transcribe job,
+    # returns the Transcribe job (None if it could not be read)
+    if emc_job:
+        timing = emc_job["Job"].get("Timing", {})
+        metrics.put_interval('ProxyQueue', timing.get("SubmitTime"), timing.get("StartTime"))
+        metrics.put_interval('ProxyTranscode', timing.get("StartTime"), timing.get("FinishTime"))
+        for output_group in emc_job["Job"].get("OutputGroupDetails", []):
+            for output in output_group.get("OutputDetails", []):
+                metrics.put('AssetDuration', output.get("DurationInMs"), 'Milliseconds')
 
-def handler(event, context):
-    #print( json.dumps(event,default=str) )
-    
-    assetID , emc_job_id = event["detail"]["TranscriptionJobName"].split('___')
-    
     try:
-        # Get MediaConvert job
-        job = mediaconvert_client.get_job(Id=emc_job_id)
-        #print( json.dumps(job, default=str) )
-        
-        # Source Asset
-        source_s3_uri = job["Job"]["UserMetadata"]["Source"]
-
-        # Transcribe Output
-        transcription_file_key = "transcriptions/" + assetID + "/transcription.json"
-        transcription_vtt_file_key = "transcriptions/" + assetID + "/transcription.vtt"
-        
-        # Audio proxy file key
-        s3_audio_proxy_key = "audio_proxy/" + assetID + "/audio.wav"
-        
-        # Load the transcription results' json file
-        json_s3_object = s3.Object(PROXY_BUCKET, transcription_file_key)
-        transcription_results_text = json_s3_object.get()['Body'].read().decode('utf-8')
-        
-        if '***' not in transcription_results_text:
-            # No masked words found, simply pass the initial audio source file to MediaConvert  
-            print("No Masked words found in the transcription, the original audio will be used")
-            s3_audio_redacted_key = s3_audio_proxy_key
+        transcription_job = aws_clients.client('transcribe').get_transcription_job(
+            TranscriptionJobName=transcription_job_name
+        )["TranscriptionJob"]
+    except Exception as e:
+        print(f"Unable to get the transcription job timings: {e}")
+        return None
+    metrics.put_interval('TranscribeQueue', transcription_job.get("CreationTime"), transcription_job.get("StartTime"))
+    metrics.put_interval('Transcribe', transcription_job.get("StartTime"), transcription_job.get("CompletionTime"))
+    return transcription_job
+
+
+def redact_audio(s3_audio_proxy_key, s3_audio_redacted_key, masked_windows, profile, work_dir):
+    # Returns the bytes of audio read from and written to S3 by the function
+    tones = load_tones()
+    extension = profile["Extension"]
+
+    if profile["Codec"] == "WAV" and REDACTION_MODE == 'fanout':
+        return fanout.fan_out_redact(fanout_invoker(), aws_clients.client('s3'), PROXY_BUCKET, s3_audio_proxy_key,
+            s3_audio_redacted_key, masked_windows, chunk_size=STREAM_CHUNK_SIZE,
+            parts_per_segment=FANOUT_SEGMENT_PARTS, max_invocations=FANOUT_MAX_INVOCATIONS)
+
+    if profile["Codec"] == "WAV" and REDACTION_MODE in ('stream', 'sparse'):
+        return streaming_redaction.stream_redact(aws_clients.client('s3'), PROXY_BUCKET, s3_audio_proxy_key, s3_audio_redacted_key,
+            masked_windows, tones, chunk_size=STREAM_CHUNK_SIZE, max_workers=STREAM_MAX_WORKERS,
+            copy_unmasked=(REDACTION_MODE == 'sparse'))
 
+    # Download the audio proxy file to the working directory of the asset
+    os.makedirs(work_dir, exist_ok=True)
+    try:
+        source_file = os.path.join(work_dir, "source." + extension)
+        aws_clients.client('s3').download_file(PROXY_BUCKET, s3_audio_proxy_key, source_file)
+
+        # Beep every masked word in place, then upload the redacted file to S3
+        if profile["Codec"] != "WAV":
+            # Compressed proxies are decoded and encoded again whatever the redaction mode
+            redacted_file = os.path.join(work_dir, "audio_redacted." + extension)
+            audio_redaction.redact_encoded(source_file, redacted_file, masked_windows, tones, extension)
+        elif REDACTION_MODE == 'mmap':
+            audio_redaction.redact_wav_in_place(source_file, masked_windows, tones)
+            redacted_file = source_file
         else:
-            transcription_results = json.loads( transcription_results_text )
-        
-            # Load the audio proxy file into pydub AudioSegment
-            s3_client.download_file(PROXY_BUCKET, s3_audio_proxy_key, "/tmp/source.wav")
-            audio_proxy_wav = AudioSegment.from_wav("/tmp/source.wav")
-
-            # Load the beep audio file from the Resources bucket
-            s3_client.download_file(RESOURCES_BUCKET, "Audio/beep.wav", "/tmp/beep.wav")
-            beep = AudioSegment.from_wav("/tmp/beep.wav")
-
-            # Parse the transcription results looking for masked "***" words
-            # For each masked word, mute/beep the audio using pydub
-            previous_end_index = 0
-            redacted_audio = AudioSegment.empty()
-            
-            for item in transcription_results["results"]["items"]:
-                if item["type"] == "pronunciation" and item["alternatives"][0]["content"] == "***":
-                    s = int(float(item["start_time"]) *1000) #in ms
-                    e = int(float(item["end_time"]) *1000)
-                    #redacted_audio = redacted_audio + audio_proxy_wav[previous_end_index:s] + AudioSegment.silent(duration=(e-s))
-                    redacted_audio = redacted_audio + audio_proxy_wav[previous_end_index:s] + beep[:(e-s)]
-                    previous_end_index = e
-
-            # Add the last segement to the redacted audio file, then upload the file to S3  
-            redacted_audio = redacted_audio + audio_proxy_wav[previous_end_index:]  
-            redacted_audio.export('/tmp/audio_redacted.wav', format="wav")
-            s3_audio_redacted_key = "audio_proxy/" + assetID + "/audio_redacted.wav" 
-            s3_client.upload_file('/tmp/audio_redacted.wav', PROXY_BUCKET, s3_audio_redacted_key)
-        
-        
-        # Push MediaConvert job to produce the final redacted asset
-        emc_destination = 's3://' + OUTPUT_BUCKET + '/' + assetID + '/hls/index'
-        
-        EMC_JOB_SETTINGS["Inputs"][0]["FileInput"] = source_s3_uri
-        EMC_JOB_SETTINGS["Inputs"][0]["AudioSelectors"]["Audio Selector 1"]["ExternalAudioFileInput"] = 's3://' + PROXY_BUCKET + '/' + s3_audio_redacted_key
-        EMC_JOB_SETTINGS["Inputs"][0]["CaptionSelectors"]["Captions Selector 1"]["SourceSettings"]["FileSourceSettings"]["SourceFile"] = 's3://' + PROXY_BUCKET + '/' + transcription_vtt_file_key
-        EMC_JOB_SETTINGS["OutputGroups"][0]["OutputGroupSettings"]["HlsGroupSettings"]["Destination"] = emc_destination
-        
-        jobMetadata = {
-            "AssetID": assetID,
-            "Destination": emc_destination
+            redacted_file = os.path.join(work_dir, "audio_redacted.wav")
+            audio_redaction.redact_wav(source_file, redacted_file, masked_windows, tones)
+
+        aws_clients.client('s3').upload_file(redacted_file, PROXY_BUCKET, s3_audio_redacted_key)
+        return os.path.getsize(source_file) + os.path.getsize(redacted_file)
+
+    finally:
+        # Assets of a batch share /tmp, free the space as soon as the asset is done
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def build_job_settings(source_s3_uri, audio_s3_uri, captions_s3_uri, emc_destination, profile, output_profile=None):
+    # Settings of one MediaConvert job, built from a private copy of the template
+    # so that jobs processed concurrently never share mutable state
+    settings = copy.deepcopy(EMC_JOB_SETTINGS)
+
+    job_input = settings["Inputs"][0]
+    job_input["FileInput"] = source_s3_uri
+    job_input["CaptionSelectors"]["Captions Selector 1"]["SourceSettings"]["FileSourceSettings"]["SourceFile"] = captions_s3_uri
+    settings["OutputGroups"][0]["OutputGroupSettings"]["HlsGroupSettings"]["Destination"] = emc_destination
+
+    # Without an audio file (clean source transcribed directly) the audio of the source is kept as is
+    audio_description = settings["OutputGroups"][0]["Outputs"][0]["AudioDescriptions"][0]
+    if audio_s3_uri:
+        job_input["AudioSelectors"]["Audio Selector 1"]["ExternalAudioFileInput"] = audio_s3_uri
+        remix_settings = proxy_profiles.remix_settings(profile)
+    else:
+        del job_input["AudioSelectors"]["Audio Selector 1"]["ExternalAudioFileInput"]
+        remix_settings = None
+    if remix_settings:
+        audio_description["RemixSettings"] = remix_settings
+    else:
+        audio_description.pop("RemixSettings", None)
+
+    # Video of the source encoded again, packaged as is or encoded as a ladder
+    output_group = settings["OutputGroups"][0]
+    output_group["Outputs"][:1] = output_profiles.hls_outputs(output_profiles.get(output_profile), output_group["Outputs"][0])
+
+    return settings
+
+
+def event_asset_id(event):
+    if "Refilter" in event:
+        return event["Refilter"]["AssetID"]
+    if "TranscriptionJobName" in event["detail"]:
+        return transcribe_jobs.parse_job_name(event["detail"]["TranscriptionJobName"])[0]
+    return event["detail"]["userMetadata"]["AssetID"]
+
+
+def load_asset(event, metrics):
+    # Metadata of the asset of a processing event:
+    # - Refilter event (see refilter.py): an asset already processed, redacted again
+    #   with the current vocabulary filter from its stored transcript
+    # - completed deferred audio proxy job (see submit_deferred_proxy)
+    # - completed transcription job of a source transcribed directly, from its asset manifest
+    # - completed transcription job of an audio proxy, from the ingest MediaConvert job
+    # "Proxy" tells whether the audio proxy exists (None: unknown), "Index" whether the words
+    # of the asset are indexed.
+    refilter = event.get("Refilter")
+    if refilter:
+        metrics.set_property('Refilter', True)
+        return {
+            "AssetID": refilter["AssetID"],
+            "Source": refilter["Source"],
+            "ProxyProfile": refilter.get("ProxyProfile"),
+            "LanguageCode": refilter.get("LanguageCode"),
+            "ContentKey": None,
+            "Refilter": True,
+            "Proxy": None,
+            "Index": False
+        }
+
+    if "TranscriptionJobName" not in event["detail"]:
+        # Time spent in the deferred audio proxy job
+        user_metadata = event["detail"]["userMetadata"]
+        timing = event["detail"].get("timing", {})
+        metrics.put_interval('ProxyQueue', timing.get("submitTime"), timing.get("startTime"))
+        metrics.put_interval('ProxyTranscode', timing.get("startTime"), timing.get("finishTime"))
+        metrics.set_property('DeferredProxy', True)
+        if user_metadata.get("Refilter"):
+            metrics.set_property('Refilter', True)
+        return {
+            "AssetID": user_metadata["AssetID"],
+            "Source": user_metadata["Source"],
+            "ProxyProfile": user_metadata.get("ProxyProfile"),
+            "LanguageCode": user_metadata.get("LanguageCode"),
+            "ContentKey": user_metadata.get("ContentKey"),
+            "Refilter": bool(user_metadata.get("Refilter")),
+            "Proxy": True,
+            "Index": False
         }
 
-        # Push the job to MediaConvert service
-        job = mediaconvert_client.create_job(Role=MEDIACONVERT_EXECUTION_ROLE_ARN, \
-            UserMetadata=jobMetadata, Settings=EMC_JOB_SETTINGS)
-        
-        job_status = job["Job"]["Status"]
-        print( f"MediaConvert job status: {job_status}" )
+    transcription_job_name = event["detail"]["TranscriptionJobName"]
+    assetID, emc_job_id = transcribe_jobs.parse_job_name(transcription_job_name)
+
+    if emc_job_id == transcribe_jobs.DIRECT_JOB_ID:
+        with metrics.stage('GetManifest'):
+            job_metadata = transcribe_jobs.get_manifest(PROXY_BUCKET, assetID)
+        emc_job = None
+        metrics.set_property('Direct', True)
+    else:
+        # Get MediaConvert job
+        with metrics.stage('GetJob'):
+            emc_job = aws_clients.mediaconvert().get_job(Id=emc_job_id)
+        #print( json.dumps(emc_job, default=str) )
+        job_metadata = emc_job["Job"]["UserMetadata"]
+
+    # Time spent upstream in the audio proxy job and in Transcribe
+    transcription_job = put_upstream_metrics(metrics, emc_job, transcription_job_name)
+
+    return {
+        "AssetID": assetID,
+        "Source": job_metadata["Source"],
+        "ProxyProfile": job_metadata.get("ProxyProfile"),
+        "LanguageCode": (transcription_job or {}).get("LanguageCode"),
+        "ContentKey": job_metadata.get("ContentKey"),
+        "Refilter": False,
+        "Proxy": emc_job is not None,
+        "Index": True
+    }
+
+
+def proxy_exists(s3_audio_proxy_key):
+    response = aws_clients.client('s3').list_objects_v2(Bucket=PROXY_BUCKET, Prefix=s3_audio_proxy_key, MaxKeys=1)
+    return any(item['Key'] == s3_audio_proxy_key for item in response.get('Contents', []))
+
+
+def submit_deferred_proxy(asset, profile, metrics):
+    # Extract the audio proxy of a source transcribed directly, its completion
+    # event brings the asset back to this function to be redacted
+    jobMetadata = {
+        "AssetID": asset["AssetID"],
+        "Source": asset["Source"],
+        "ProxyProfile": asset["ProxyProfile"] or proxy_profiles.DEFAULT_PROFILE,
+        "Stage": proxy_job.DEFERRED_PROXY_STAGE,
+        "Workload": WORKLOAD_NAME
+    }
+    for name in ("LanguageCode", "ContentKey"):
+        if asset[name]:
+            jobMetadata[name] = asset[name]
+    if asset["Refilter"]:
+        jobMetadata["Refilter"] = "true"
+
+    with metrics.stage('CreateProxyJob'):
+        job = aws_clients.call_with_backoff(
+            aws_clients.mediaconvert().create_job,
+            Role=PROXY_EXECUTION_ROLE_ARN,
+            UserMetadata=jobMetadata,
+            Settings=proxy_job.build_job_settings(asset["Source"], proxy_job.destination(PROXY_BUCKET, asset["AssetID"]), profile),
+            ClientRequestToken=asset["AssetID"] + "-deferred-proxy"
+        )
+    return job
+
+
+def load_config():
+    return resource_cache.get(aws_clients.client('s3'), RESOURCES_BUCKET, 'Config/config.json', json.loads)
+
+
+def load_word_timings(assetID, transcription_file_key, metrics):
+    # Word timings of the Transcribe results, with the masks of Transcribe only. They are
+    # read from the binary sidecar of the transcript when it exists (redaction after a
+    # deferred proxy, retries, re-filtering); otherwise the JSON results are parsed once
+    # and the sidecar is written for the next events of the asset.
+    s3 = aws_clients.client('s3')
+    sidecar_key = transcribe_jobs.word_timings_key(assetID)
+    try:
+        data = s3.get_object(Bucket=PROXY_BUCKET, Key=sidecar_key)['Body'].read()
+        metrics.put('WordTimingsBytes', len(data), 'Bytes')
+        return word_timings.WordTimingsView(data).to_word_timings()
+    except aws_clients.ClientError as e:
+        if aws_clients.error_code(e) != 'NoSuchKey':
+            raise
+    except ValueError as e:
+        print(f"{assetID}: ignoring the word timings sidecar: {e}")
+
+    timings = word_timings.WordTimings()
+    json_s3_object = s3.get_object(Bucket=PROXY_BUCKET, Key=transcription_file_key)
+    for start, end, content, masked in transcript.iter_pronunciations(json_s3_object['Body']):
+        timings.append(start, end, content, masked)
+    metrics.put('TranscriptBytes', json_s3_object['ContentLength'], 'Bytes')
+
+    data = timings.to_bytes()
+    s3.put_object(Bucket=PROXY_BUCKET, Key=sidecar_key, Body=data)
+    metrics.put('WordTimingsBytes', len(data), 'Bytes')
+    return timings
+
+
+def load_matcher(config, source_s3_uri):
+    # Local word list of the longest source key prefix in the "Local Filter Word Lists"
+    # of config.json, compiled once per container. None when no list applies.
+    word_lists = config.get('Local Filter Word Lists')
+    if not word_lists:
+        return None
+    source_key = source_s3_uri.split('/', 3)[3]
+    prefixes = [prefix for prefix in word_lists if source_key.startswith(prefix)]
+    if not prefixes:
+        return None
+    return resource_cache.get(aws_clients.client('s3'), RESOURCES_BUCKET, word_lists[max(prefixes, key=len)],
+        word_matcher.WordMatcher.from_bytes)
+
+
+def process_transcription_event(event, metrics):
+    # Redact the audio of one completed transcription job and push the final
+    # MediaConvert job. Errors are raised to the caller.
+    # Completed stages are checkpointed (see pipeline_state), a retried event
+    # resumes at the first stage not completed. Re-filtered assets redo them all.
+    asset = load_asset(event, metrics)
+    assetID = asset["AssetID"]
+    source_s3_uri = asset["Source"]
+    proxy_profile_name = asset["ProxyProfile"]
+    language_code = asset["LanguageCode"]
+
+    checkpoints = pipeline_state.checkpoints(assetID, resume=not asset["Refilter"])
+    if checkpoints.completed(pipeline_state.FINAL_JOB):
+        print(f"{assetID}: final MediaConvert job {checkpoints.get('FinalJobId')} already created")
+        return "EXISTS"
+
+    # Audio proxy format produced by the ingest job, or by the deferred proxy job
+    profile = proxy_profiles.get(proxy_profile_name)
+
+    # Transcribe Output
+    transcription_file_key = transcribe_jobs.transcript_key(assetID)
+    transcription_vtt_file_key = transcribe_jobs.transcript_key(assetID, "vtt")
+    
+    # Audio proxy file key
+    s3_audio_proxy_key = "audio_proxy/" + assetID + "/audio." + profile["Extension"]
+
+    config = load_config()
+
+    # Words of the current vocabulary filter, to mask the words added since the transcription
+    filter_words = vocabulary_filters.words_for_language(config, language_code) if asset["Refilter"] else frozenset()
+
+    # Words and phrases of the local word list matched in the same pass
+    with metrics.stage('LoadMatcher'):
+        matcher = load_matcher(config, source_s3_uri)
+    if matcher:
+        metrics.put('MatcherPatterns', matcher.patterns)
+
+    # All the words of the asset are indexed after its first processing
+    index = word_index.open_index() if asset["Index"] else None
+    
+    # Load the transcription results once into the word timings that drive the audio
+    # redaction, the caption redaction and the word index
+    with metrics.stage('ParseTranscript'):
+        timings = load_word_timings(assetID, transcription_file_key, metrics)
+        if matcher or filter_words:
+            # Words masked by the local word list or added to the vocabulary filter since the transcription
+            pronunciations = timings.iter_pronunciations()
+            if matcher:
+                pronunciations = matcher.scan(pronunciations)
+            timings = word_timings.WordTimings()
+            for start, end, word, masked in pronunciations:
+                timings.append(start, end, word, masked or word in filter_words)
+    masked_windows = timings.masked_windows()
+    metrics.put('MaskedWords', len(masked_windows))
+
+    if index is not None and not checkpoints.completed(pipeline_state.WORD_INDEX):
+        with metrics.stage('IndexWords'):
+            word_times = timings.word_times()
+            index.put_asset(assetID, {
+                "Source": source_s3_uri,
+                "ProxyProfile": proxy_profile_name,
+                "LanguageCode": language_code
+            }, word_times)
+        metrics.put('IndexedWords', len(word_times))
+        checkpoints.record(pipeline_state.WORD_INDEX)
+    
+    proxy_available = asset["Proxy"]
+    if masked_windows and proxy_available is None:
+        proxy_available = proxy_exists(s3_audio_proxy_key)
+
+    if not masked_windows:
+        # No masked words found, simply pass the initial audio source file and captions to MediaConvert.
+        # The source audio is used even when a proxy exists, which may be mono or resampled.
+        print(f"{assetID}: No Masked words found in the transcription, the original audio will be used")
+        s3_audio_redacted_key = None
+
+    elif not proxy_available:
+        # Source transcribed directly, extract the audio proxy to redact now that it is needed
+        print(f"{assetID}: {len(masked_windows)} masked words found in the transcription, extracting the audio proxy")
+        if checkpoints.completed(pipeline_state.DEFERRED_PROXY_JOB):
+            print( f"{assetID}: MediaConvert audio proxy job {checkpoints.get('DeferredProxyJobId')} already created" )
+            return "EXISTS"
+        job = submit_deferred_proxy(asset, profile, metrics)
+        checkpoints.record(pipeline_state.DEFERRED_PROXY_JOB, DeferredProxyJobId=job["Job"]["Id"])
+        print( f"{assetID}: MediaConvert audio proxy job status: {job['Job']['Status']}" )
+        return job["Job"]["Status"]
+
+    else:
+        print(f"{assetID}: {len(masked_windows)} masked words found in the transcription")
+        s3_audio_redacted_key = "audio_proxy/" + assetID + "/audio_redacted." + profile["Extension"]
+        if not checkpoints.completed(pipeline_state.REDACTED_AUDIO, RedactedAudioKey=s3_audio_redacted_key):
+            with metrics.stage('Redaction'):
+                transferred = redact_audio(s3_audio_proxy_key, s3_audio_redacted_key, masked_windows, profile,
+                    os.path.join(WORK_DIR, assetID))
+            metrics.put('RedactionBytesTransferred', transferred, 'Bytes')
+            checkpoints.record(pipeline_state.REDACTED_AUDIO, RedactedAudioKey=s3_audio_redacted_key)
+
+        # Mask the captions with the same word timings, so that they match the bleeped audio
+        redacted_vtt_file_key = "transcriptions/" + assetID + "/transcription_redacted.vtt"
+        if not checkpoints.completed(pipeline_state.REDACTED_CAPTIONS, CaptionsKey=redacted_vtt_file_key):
+            with metrics.stage('RedactCaptions'):
+                vtt_s3_object = aws_clients.client('s3').get_object(Bucket=PROXY_BUCKET, Key=transcription_vtt_file_key)
+                redacted_lines = captions.redact_vtt(captions.iter_lines(vtt_s3_object['Body']), timings)
+                aws_clients.client('s3').put_object(Bucket=PROXY_BUCKET, Key=redacted_vtt_file_key,
+                    Body=''.join(line + '\n' for line in redacted_lines).encode('utf-8'))
+            checkpoints.record(pipeline_state.REDACTED_CAPTIONS, CaptionsKey=redacted_vtt_file_key)
+        transcription_vtt_file_key = redacted_vtt_file_key
+    
+    
+    # Push MediaConvert job to produce the final redacted asset
+    emc_destination = 's3://' + OUTPUT_BUCKET + '/' + assetID + '/hls/index'
+
+    output_profile = output_profiles.for_source(OUTPUT_PROFILE, source_s3_uri)
+    metrics.set_property('OutputProfile', output_profile)
+    job_settings = build_job_settings(
+        source_s3_uri,
+        's3://' + PROXY_BUCKET + '/' + s3_audio_redacted_key if s3_audio_redacted_key else None,
+        's3://' + PROXY_BUCKET + '/' + transcription_vtt_file_key,
+        emc_destination,
+        profile,
+        output_profile
+    )
+    
+    jobMetadata = {
+        "AssetID": assetID,
+        "Destination": emc_destination
+    }
+    if asset["ContentKey"] and dedup_index.open_index():
+        # The output is recorded in the deduplication index once the job completes (see complete_asset)
+        jobMetadata.update({"ContentKey": asset["ContentKey"], "Stage": FINAL_STAGE, "Workload": WORKLOAD_NAME})
+
+    # Push the job to MediaConvert service. The request token makes a retried create_job
+    # return the job already created, re-filtered assets get a new job.
+    request_token = {} if asset["Refilter"] else {"ClientRequestToken": assetID + "-final"}
+    with metrics.stage('CreateJob'):
+        job = aws_clients.mediaconvert().create_job(Role=MEDIACONVERT_EXECUTION_ROLE_ARN, \
+            UserMetadata=jobMetadata, Settings=job_settings, **request_token)
+    checkpoints.record(pipeline_state.FINAL_JOB, FinalJobId=job["Job"]["Id"], Destination=emc_destination)
+    metrics.put('ResumedStages', checkpoints.skipped)
+    
+    job_status = job["Job"]["Status"]
+    print( f"{assetID}: MediaConvert job status: {job_status}" )
+
+    return job_status
+
+
+def complete_asset(event, metrics):
+    # State change of the final MediaConvert job of a deduplicated asset. The output only
+    # exists once the job is COMPLETE: it is then recorded in the deduplication index, so
+    # that re-uploads of the source skip the pipeline. A failed job releases the claim,
+    # the next upload of the source is processed again. Errors are raised to the caller.
+    detail = event["detail"]
+    user_metadata = detail["userMetadata"]
+    assetID = user_metadata["AssetID"]
+    metrics.set_property('FinalJobStatus', detail["status"])
+
+    if detail["status"] == "COMPLETE":
+        dedup_index.open_index().complete(user_metadata["ContentKey"], user_metadata["Destination"])
+        print(f"{assetID}: final MediaConvert job {detail.get('jobId')} complete, output recorded for deduplication")
+    else:
+        dedup_index.open_index().release(user_metadata["ContentKey"], assetID)
+        print(f"{assetID}: final MediaConvert job {detail.get('jobId')} status: {detail['status']}, deduplication claim released")
+    return detail["status"]
+
+
+def process_event(event, metrics):
+    if event.get("detail", {}).get("userMetadata", {}).get("Stage") == FINAL_STAGE:
+        return complete_asset(event, metrics)
+    return process_transcription_event(event, metrics)
+
+
+def process_record(record):
+    # One SQS message carrying a Transcribe Job State Change (or deferred audio proxy or
+    # final MediaConvert Job State Change) event from EventBridge
+    event = json.loads(record["body"])
+    metrics = Metrics('processing', event_asset_id(event))
+    metrics.set_property('Batch', True)
+    try:
+        return process_event(event, metrics)
+    finally:
+        metrics.flush()
+
+
+def handle_batch(records):
+    # Process the assets of the batch concurrently. Failed messages are reported
+    # to the event source mapping, which retries them without the rest of the batch.
+    failures = []
+    with ThreadPoolExecutor(max_workers=max(1, min(BATCH_MAX_WORKERS, len(records)))) as executor:
+        futures = {executor.submit(process_record, record): record for record in records}
+        for future, record in futures.items():
+            try:
+                future.result()
+            except Exception as e:
+                print("Exception: {} (message {})".format(e, record["messageId"]))
+                if not (isinstance(e, transcribe_config.ConfigError) and DEAD_LETTER_QUEUE_URL and
+                        aws_clients.dead_letter(DEAD_LETTER_QUEUE_URL, record, e)):
+                    failures.append({"itemIdentifier": record["messageId"]})
+
+    print(f"Processed {len(records) - len(failures)}/{len(records)} transcription events")
+    resource_cache.flush_metrics('processing')
+    return {"batchItemFailures": failures}
+
+
+def handler(event, context):
+    #print( json.dumps(event,default=str) )
+
+    if event.get("Action") == fanout.SEGMENT_ACTION:
+        # Fan-out worker invocation, errors are returned to the coordinator
+        return fanout.redact_segment(aws_clients.client('s3'), event, load_tones(), max_workers=STREAM_MAX_WORKERS)
+
+    if "Records" in event:
+        # Batch of events delivered by the processing queue
+        return handle_batch(event["Records"])
+    
+    metrics = Metrics('processing', event_asset_id(event))
+    
+    try:
+        job_status = process_event(event, metrics)
     
     except Exception as e:
+       # Raised for the asynchronous invocation to be retried, from the last checkpoint
        print("Exception: {}".format(e))
-       return 0
+       raise
+
+    finally:
+        metrics.flush()
+        resource_cache.flush_metrics('processing')
     
     return {
         'statusCode': 200,
@@ -1,10 +1,22 @@
 # Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
 # SPDX-License-Identifier: MIT-0
 
+import hashlib
 import json
 import uuid
-import boto3
 import os
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+import aws_clients
+import dedup_index
+import output_profiles
+import pipeline_state
+import proxy_job
+import proxy_profiles
+import resource_cache
+import transcribe_jobs
+from metrics import Metrics
 
 
 # Environment Variables
@@ -12,33 +24,194 @@ MEDIACONVERT_EXECUTION_ROLE_ARN = os.environ['MEDIACONVERT_EXECUTION_ROLE_ARN']
 PROXY_BUCKET = os.environ['PROXY_BUCKET']
 WORKLOAD_STAGE = os.environ['WORKLOAD_STAGE']
 WORKLOAD_NAME = os.environ['WORKLOAD_NAME']
+PROXY_PROFILE = os.environ.get('PROXY_PROFILE', proxy_profiles.DEFAULT_PROFILE)
+OUTPUT_PROFILE = os.environ.get('OUTPUT_PROFILE', output_profiles.DEFAULT_PROFILE)
+# MediaConvert jobs submitted concurrently for the records of one notification
+INGEST_MAX_WORKERS = int(os.environ.get('INGEST_MAX_WORKERS', '8'))
+# Deduplication of re-uploaded media (see dedup_index): on a hit, "reference" returns
+# the output of the asset already processed, "copy" copies it under the new asset ID
+RESOURCES_BUCKET = os.environ.get('RESOURCES_BUCKET')
+DESTINATION_BUCKET = os.environ.get('DESTINATION_BUCKET')
+DEDUP_ON_HIT = os.environ.get('DEDUP_ON_HIT', 'reference')
+DEDUP_CONFIG_VERSION = os.environ.get('DEDUP_CONFIG_VERSION', '1')
+DEDUP_CONFIG_RESOURCES = ('Config/config.json', 'Audio/beep.wav')
+# Direct transcription: sources in a container supported by Transcribe are transcribed
+# without the audio proxy job, which is deferred until masked words are found (see transcribe_jobs)
+TRANSCRIBE_DIRECT = os.environ.get('TRANSCRIBE_DIRECT', 'false').lower() == 'true'
+TRANSCRIBE_ACCESS_ROLE_ARN = os.environ.get('TRANSCRIBE_ACCESS_ROLE_ARN')
+# Admission queue of the transcription jobs (see admission.py), direct jobs are queued there when set
+ADMISSION_QUEUE_URL = os.environ.get('ADMISSION_QUEUE_URL')
 
 
-# AWS services clients
-# AWS Elemental MediaConvert: 
-mediaconvert_client = boto3.client('mediaconvert')
-endpoints = mediaconvert_client.describe_endpoints()
-mediaconvert_client = boto3.client(
-    'mediaconvert',
-    endpoint_url=endpoints['Endpoints'][0]['Url'], 
-    verify=False
-)
+def config_fingerprint():
+    # Everything that changes the final asset of a given source: the Transcribe
+    # configuration, the local word lists, the beep tone, the proxy profile, direct transcription
+    # (clean assets keep the source audio), the output profile and a manual version tag
+    s3 = aws_clients.client('s3')
+    config = resource_cache.get(s3, RESOURCES_BUCKET, 'Config/config.json', json.loads)
+    word_lists = sorted(config.get('Local Filter Word Lists', {}).values())
 
+    digest = hashlib.sha256()
+    for key in DEDUP_CONFIG_RESOURCES + tuple(word_lists):
+        digest.update(resource_cache.get(s3, RESOURCES_BUCKET, key, _sha256))
+    digest.update(f'{PROXY_PROFILE}|{DEDUP_CONFIG_VERSION}'.encode('utf-8'))
+    if TRANSCRIBE_DIRECT:
+        digest.update(b'|direct')
+    if OUTPUT_PROFILE != output_profiles.DEFAULT_PROFILE:
+        digest.update(f'|output={OUTPUT_PROFILE}'.encode('utf-8'))
+    return digest.hexdigest()
 
-def handler(event, context):
-    #print( json.dumps(event,default=str) )
 
-    assetID = str(uuid.uuid4())
+def _sha256(data):
+    return hashlib.sha256(data).digest()
+
+
+def copy_asset(source_asset_id, asset_id):
+    # Copy the final HLS asset of a duplicate upload under the new asset ID
+    s3 = aws_clients.client('s3')
+    keys = [
+        item['Key']
+        for page in s3.get_paginator('list_objects_v2').paginate(Bucket=DESTINATION_BUCKET, Prefix=source_asset_id + '/')
+        for item in page.get('Contents', [])
+    ]
+
+    def copy_object(key):
+        s3.copy_object(
+            Bucket=DESTINATION_BUCKET,
+            Key=asset_id + key[len(source_asset_id):],
+            CopySource={'Bucket': DESTINATION_BUCKET, 'Key': key}
+        )
+
+    with ThreadPoolExecutor(max_workers=INGEST_MAX_WORKERS) as executor:
+        list(executor.map(copy_object, keys))
+    return len(keys)
+
+
+def short_circuit(existing, assetID, sourceS3URI, metrics):
+    # Duplicate upload: point to (or copy) the output of the asset already processed
+    result = {
+        "Source": sourceS3URI,
+        "AssetID": existing["AssetID"],
+        "Status": "DUPLICATE",
+        "DuplicateOf": existing["AssetID"],
+        "Destination": existing.get("Destination")
+    }
+
+    if existing["Status"] != dedup_index.COMPLETE:
+        # Reference mode only, its output will be the one of the asset in progress
+        print(f"{sourceS3URI}: duplicate of asset {existing['AssetID']}, still in progress")
+        return result
+
+    if DEDUP_ON_HIT == 'copy':
+        with metrics.stage('CopyAsset'):
+            copied = copy_asset(existing["AssetID"], assetID)
+        metrics.put('CopiedObjects', copied)
+        result["AssetID"] = assetID
+        result["Destination"] = existing["Destination"].replace('/' + existing["AssetID"] + '/', '/' + assetID + '/', 1)
+
+    print(f"{sourceS3URI}: duplicate of asset {existing['AssetID']}, output: {result['Destination']}")
+    return result
+
+
+def queue_transcription_job(assetID, sourceS3URI, mediaFormat):
+    # Leave the start of the direct transcription job to the admission controller,
+    # returns a response shaped like the start_transcription_job one
+    aws_clients.client('sqs').send_message(
+        QueueUrl=ADMISSION_QUEUE_URL,
+        MessageBody=json.dumps({
+            "Transcribe": {
+                "AssetID": assetID,
+                "MediaUri": sourceS3URI,
+                "MediaFormat": mediaFormat
+            }
+        })
+    )
+    return {
+        "TranscriptionJob": {
+            "TranscriptionJobName": transcribe_jobs.job_name(assetID),
+            "TranscriptionJobStatus": "QUEUED"
+        }
+    }
+
+
+def start_transcription_job(assetID, sourceS3URI, mediaFormat):
+    # The job name is derived from the asset, a job started by a previous attempt is kept
+    name = transcribe_jobs.job_name(assetID)
+    try:
+        return aws_clients.call_with_backoff(
+            transcribe_jobs.start,
+            name=name,
+            media_uri=sourceS3URI,
+            media_format=mediaFormat,
+            output_bucket=PROXY_BUCKET,
+            settings=transcribe_jobs.language_settings(RESOURCES_BUCKET),
+            data_access_role_arn=TRANSCRIBE_ACCESS_ROLE_ARN
+        )
+    except aws_clients.ClientError as e:
+        if aws_clients.error_code(e) != 'ConflictException':
+            raise
+        return {"TranscriptionJob": {"TranscriptionJobName": name, "TranscriptionJobStatus": "EXISTS"}}
+
+
+def asset_id(sourceS3URI, record):
+    # Derived from the upload (the sequencer orders the writes of a key), so that
+    # a retried notification resumes the same asset
+    sequencer = record['s3']['object'].get('sequencer')
+    if not sequencer:
+        return str(uuid.uuid4())
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, sourceS3URI + '#' + sequencer))
+
 
-    sourceS3Bucket = event['Records'][0]['s3']['bucket']['name']
-    sourceS3Key = event['Records'][0]['s3']['object']['key']
+def ingest_record(record):
+    # Submit the audio proxy job (or the direct transcription job) of one uploaded object,
+    # errors are raised to the caller
+    # Object keys are URL encoded in S3 event notifications
+    sourceS3Bucket = record['s3']['bucket']['name']
+    sourceS3Key = urllib.parse.unquote_plus(record['s3']['object']['key'])
     sourceS3URI = 's3://'+ sourceS3Bucket + '/' + sourceS3Key
+
+    assetID = asset_id(sourceS3URI, record)
+    metrics = Metrics('ingest', assetID)
+    metrics.put('SourceBytes', record['s3']['object'].get('size'), 'Bytes')
+
+    checkpoints = pipeline_state.checkpoints(assetID)
+    if checkpoints.completed(pipeline_state.PROXY_JOB) or checkpoints.completed(pipeline_state.TRANSCRIPTION_JOB):
+        # Retried notification, the first stage of the asset is already submitted
+        print(f"{sourceS3URI}: asset {assetID} already submitted")
+        return {
+            "Source": sourceS3URI,
+            "AssetID": assetID,
+            "JobId": checkpoints.get("ProxyJobId") or checkpoints.get("TranscriptionJobName"),
+            "Status": "EXISTS"
+        }
     
-    emcDestination = 's3://' + PROXY_BUCKET + '/audio_proxy/' + assetID + '/audio'
+    emcDestination = proxy_job.destination(PROXY_BUCKET, assetID)
+
+    index = dedup_index.open_index()
+    contentKey = None
     
     try:
-        EMC_JOB_SETTINGS["Inputs"][0]["FileInput"] = sourceS3URI
-        EMC_JOB_SETTINGS["OutputGroups"][0]["OutputGroupSettings"]["FileGroupSettings"]["Destination"] = emcDestination
+        if index and record['s3']['object'].get('eTag'):
+            # Skip the whole pipeline when the same content was already processed with the same configuration
+            with metrics.stage('Dedup'):
+                contentKey = dedup_index.content_key(record['s3']['object']['eTag'], record['s3']['object'].get('size'), config_fingerprint())
+                claimed, existing = index.claim(contentKey, assetID, sourceS3URI)
+            if existing is None:
+                # The claim of another upload was released (or expired) between the failed put and the read,
+                # the notification is retried to claim the content again
+                raise RuntimeError(f"Deduplication claim of {sourceS3URI} failed, content key {contentKey} has no entry")
+            metrics.put('DedupHit', 0 if claimed else 1)
+            metrics.put('DedupMiss', 1 if claimed else 0)
+            # A retried notification finds the claim of its own asset
+            if not claimed and existing["AssetID"] != assetID:
+                if existing["Status"] == dedup_index.COMPLETE or DEDUP_ON_HIT != 'copy':
+                    return short_circuit(existing, assetID, sourceS3URI, metrics)
+                # Nothing would produce the copy of an asset still in progress: this upload
+                # is processed on its own, without the claim of the other asset
+                print(f"{sourceS3URI}: duplicate of asset {existing['AssetID']}, still in progress, processed as a new asset")
+                contentKey = None
+
+        profile = proxy_profiles.get(PROXY_PROFILE)
         
         jobMetadata = {
             "AssetID": assetID,
@@ -46,76 +219,94 @@ def handler(event, context):
             "SourceBucket": sourceS3Bucket,
             "SourceKey": sourceS3Key,
             "Destination": emcDestination,
+            "ProxyProfile": PROXY_PROFILE,
             "Stage":WORKLOAD_STAGE,
             "Workload":WORKLOAD_NAME
         }
+        if contentKey:
+            jobMetadata["ContentKey"] = contentKey
 
-        # Push the job to MediaConvert service
-        job = mediaconvert_client.create_job(
-            Role=MEDIACONVERT_EXECUTION_ROLE_ARN,
-            UserMetadata=jobMetadata, 
-            Settings=EMC_JOB_SETTINGS
-        )
-        
-        job_status = job["Job"]["Status"]
-        print( f"MediaConvert job status: {job_status}" )
+        mediaFormat = None
+        if TRANSCRIBE_DIRECT:
+            mediaFormat = transcribe_jobs.direct_media_format(sourceS3Key, record['s3']['object'].get('size'))
+
+        try:
+            if mediaFormat:
+                # Transcribe the source directly, the asset manifest carries the job metadata to the processing function
+                jobMetadata.pop("Destination")
+                with metrics.stage('StartTranscriptionJob'):
+                    transcribe_jobs.put_manifest(PROXY_BUCKET, assetID, jobMetadata)
+                    if ADMISSION_QUEUE_URL:
+                        job = queue_transcription_job(assetID, sourceS3URI, mediaFormat)
+                    else:
+                        job = start_transcription_job(assetID, sourceS3URI, mediaFormat)
+                        checkpoints.record(pipeline_state.TRANSCRIPTION_JOB, TranscriptionJobName=transcribe_jobs.job_name(assetID))
+            else:
+                # Push the job to MediaConvert service, the request token makes a retry return the same job
+                with metrics.stage('CreateJob'):
+                    job = aws_clients.call_with_backoff(
+                        aws_clients.mediaconvert().create_job,
+                        Role=MEDIACONVERT_EXECUTION_ROLE_ARN,
+                        UserMetadata=jobMetadata, 
+                        Settings=proxy_job.build_job_settings(sourceS3URI, emcDestination, profile),
+                        ClientRequestToken=assetID + "-proxy"
+                    )
+                checkpoints.record(pipeline_state.PROXY_JOB, ProxyJobId=job["Job"]["Id"])
+        except Exception:
+            if contentKey:
+                index.release(contentKey, assetID)
+            raise
+        metrics.set_property('Direct', bool(mediaFormat))
+
+        if mediaFormat:
+            job_status = job["TranscriptionJob"]["TranscriptionJobStatus"]
+            print( f"{sourceS3URI}: Transcription job status: {job_status}" )
+        else:
+            job_status = job["Job"]["Status"]
+            print( f"{sourceS3URI}: MediaConvert job status: {job_status}" )
+
+    finally:
+        metrics.flush()
 
-    except Exception as e:
-       print("Exception: {}".format(e))
-       return 0
-    
     return {
-        'statusCode': 200,
-        'body': json.dumps(f'MediaConvert Job Created - Status: {job_status}')
+        "Source": sourceS3URI,
+        "AssetID": assetID,
+        "JobId": job["TranscriptionJob"]["TranscriptionJobName"] if mediaFormat else job["Job"]["Id"],
+        "Status": job_status
     }
 
 
-EMC_JOB_SETTINGS = json.loads("""
-  {
-    "TimecodeConfig": {
-      "Source": "ZEROBASED"
-    },
-    "OutputGroups": [
-      {
-        "Name": "File Group",
-        "Outputs": [
-          {
-            "ContainerSettings": {
-              "Container": "RAW"
-            },
-            "AudioDescriptions": [
-              {
-                "AudioSourceName": "Audio Selector 1",
-                "CodecSettings": {
-                  "Codec": "WAV",
-                  "WavSettings": {
-                    "Channels": 2
-                  }
-                }
-              }
-            ],
-            "Extension": "wav"
-          }
-        ],
-        "OutputGroupSettings": {
-          "Type": "FILE_GROUP_SETTINGS",
-          "FileGroupSettings": {
-            "Destination": ""
-          }
-        }
-      }
-    ],
-    "Inputs": [
-      {
-        "AudioSelectors": {
-          "Audio Selector 1": {
-            "DefaultSelection": "DEFAULT"
-          }
-        },
-        "VideoSelector": {},
-        "TimecodeSource": "ZEROBASED",
-        "FileInput": ""
-      }
-    ]
-  }
-""")
\ No newline at end of file
+def handler(event, context):
+    #print( json.dumps(event,default=str) )
+
+    # S3 test notifications carry no records
+    records = event.get('Records', [])
+
+    def submit(record):
+        try:
+            return ingest_record(record)
+        except Exception as e:
+            print("Exception: {}".format(e))
+            return {
+                "Source": 's3://' + record['s3']['bucket']['name'] + '/' + urllib.parse.unquote_plus(record['s3']['object']['key']),
+                "Status": "ERROR",
+                "Error": str(e)
+            }
+
+    with ThreadPoolExecutor(max_workers=max(1, min(INGEST_MAX_WORKERS, len(records)))) as executor:
+        results = list(executor.map(submit, records))
+    resource_cache.flush_metrics('ingest')
+
+    failed = sum(1 for result in results if result["Status"] == "ERROR")
+    print(f"{len(results) - failed}/{len(results)} jobs created")
+
+    if failed:
+        # Raised for the asynchronous invocation to be retried (a returned error would count as a success).
+        # The records already submitted are skipped from their checkpoint, or without the pipeline state
+        # store submitted again under the same asset ID, job request tokens and job names.
+        raise RuntimeError(f"{failed}/{len(results)} records failed: {json.dumps(results)}")
+    
+    return {
+        'statusCode': 200,
+        'body': json.dumps(results)
+    }
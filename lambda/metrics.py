@@ -0,0 +1,66 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import contextlib
+import json
+import os
+import time
+
+
+# Per-stage durations and counters printed as CloudWatch Embedded Metric Format
+# records. Metrics are aggregated per Function, and every record carries the
+# AssetID as a property to build per-asset latency breakdowns in Logs Insights.
+NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'VideoBleeping')
+
+
+class Metrics:
+
+    def __init__(self, function, asset_id=None):
+        self.function = function
+        self.asset_id = asset_id
+        self.metrics = {}
+        self.properties = {}
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        # Time the enclosed block as the <name>Time metric, in milliseconds
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.put(f'{name}Time', (time.perf_counter() - start) * 1000, 'Milliseconds')
+
+    def put(self, name, value, unit='Count'):
+        if value is not None:
+            self.metrics[name] = (value, unit)
+
+    def put_interval(self, name, start, end):
+        # Duration between two datetimes (or epoch milliseconds), in milliseconds
+        if start is None or end is None:
+            return
+        if hasattr(start, 'timestamp'):
+            start, end = start.timestamp() * 1000, end.timestamp() * 1000
+        self.put(f'{name}Time', end - start, 'Milliseconds')
+
+    def set_property(self, name, value):
+        self.properties[name] = value
+
+    def flush(self):
+        if not self.metrics:
+            return
+        record = {
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [{
+                    "Namespace": NAMESPACE,
+                    "Dimensions": [["Function"]],
+                    "Metrics": [{"Name": name, "Unit": unit} for name, (value, unit) in self.metrics.items()]
+                }]
+            },
+            "Function": self.function,
+            "AssetID": self.asset_id,
+        }
+        record.update(self.properties)
+        record.update({name: value for name, (value, unit) in self.metrics.items()})
+        print(json.dumps(record, default=str))
+        self.metrics = {}
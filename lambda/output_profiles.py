@@ -0,0 +1,100 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import copy
+
+
+# Output profiles of the final MediaConvert job, which packages the source video
+# with the redacted audio and captions in HLS. Filtering only changes the audio
+# and the captions, so the video does not have to be encoded again:
+# - "transcode": the original single H.264 960x540 QVBR rendition
+# - "passthrough": the source video stream is packaged as is, only the redacted
+#   audio is encoded. It keeps the source quality and skips the most expensive
+#   part of the job. It requires an H.264 or H.265 source, sources in other
+#   containers (MOV is often ProRes, MXF often MPEG-2) fall back to "transcode".
+# - "abr": an H.264 QVBR ladder sharing one audio rendition, for adaptive streaming
+DEFAULT_PROFILE = "transcode"
+
+# Source containers whose video stream can be packaged in HLS without encoding
+PASSTHROUGH_CONTAINERS = ("mp4", "m4v")
+
+# Audio group of the "abr" renditions
+AUDIO_GROUP_ID = "program_audio"
+
+OUTPUT_PROFILES = {
+    "transcode": {
+        "Video": "TRANSCODE",
+        "Renditions": None
+    },
+    "passthrough": {
+        "Video": "PASSTHROUGH",
+        "Renditions": None
+    },
+    "abr": {
+        "Video": "TRANSCODE",
+        # (width, height, max bitrate)
+        "Renditions": [
+            (1920, 1080, 6000000),
+            (1280, 720, 3500000),
+            (960, 540, 2000000),
+            (640, 360, 1000000)
+        ]
+    },
+}
+
+
+def get(name):
+    if not name:
+        name = DEFAULT_PROFILE
+    if name not in OUTPUT_PROFILES:
+        raise ValueError(f"Unknown output profile: {name}")
+    return OUTPUT_PROFILES[name]
+
+
+def for_source(name, source_s3_uri):
+    # Name of the profile applied to a source: passthrough needs a container MediaConvert can package as is
+    name = name or DEFAULT_PROFILE
+    if get(name)["Video"] == "PASSTHROUGH" and source_s3_uri.rsplit('.', 1)[-1].lower() not in PASSTHROUGH_CONTAINERS:
+        return DEFAULT_PROFILE
+    return name
+
+
+def hls_outputs(profile, av_output):
+    # Audio/video outputs of the HLS group, built from the audio/video output of the
+    # job template (its audio description already set for the redacted audio)
+    if profile["Video"] == "PASSTHROUGH":
+        output = copy.deepcopy(av_output)
+        output["VideoDescription"] = {"CodecSettings": {"Codec": "PASSTHROUGH"}}
+        return [output]
+
+    if not profile["Renditions"]:
+        return [av_output]
+
+    # The audio is encoded once, in an audio only rendition referenced by every video rendition
+    outputs = [{
+        "ContainerSettings": copy.deepcopy(av_output["ContainerSettings"]),
+        "AudioDescriptions": copy.deepcopy(av_output["AudioDescriptions"]),
+        "OutputSettings": {
+            "HlsSettings": {
+                "AudioGroupId": AUDIO_GROUP_ID,
+                "AudioTrackType": "ALTERNATE_AUDIO_AUTO_SELECT_DEFAULT"
+            }
+        },
+        "NameModifier": "_audio"
+    }]
+    for width, height, max_bitrate in profile["Renditions"]:
+        video = copy.deepcopy(av_output["VideoDescription"])
+        video["Width"] = width
+        video["Height"] = height
+        video["CodecSettings"]["H264Settings"]["MaxBitrate"] = max_bitrate
+        outputs.append({
+            "ContainerSettings": copy.deepcopy(av_output["ContainerSettings"]),
+            "VideoDescription": video,
+            "OutputSettings": {
+                "HlsSettings": {
+                    "AudioRenditionSets": AUDIO_GROUP_ID
+                }
+            },
+            "NameModifier": f"_{height}p"
+        })
+    return outputs
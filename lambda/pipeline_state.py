@@ -0,0 +1,145 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import os
+import sqlite3
+import threading
+import time
+
+import aws_clients
+import backends
+
+
+# Checkpoints of the pipeline, keyed by AssetID: the stages completed for the
+# asset and the artifacts they produced (job IDs, S3 keys). AssetIDs and job
+# names are derived from the upload, so a retried event finds the checkpoints of
+# the previous attempt and resumes at the first stage not completed.
+# Backends: "dynamodb" (PIPELINE_STATE_TABLE) or "sqlite" (PIPELINE_STATE_SQLITE_PATH,
+# ":memory:" by default) for local runs. Checkpoints are disabled when
+# PIPELINE_STATE_BACKEND is empty.
+PIPELINE_STATE_BACKEND = os.environ.get('PIPELINE_STATE_BACKEND', '')
+# Seconds the state of an asset is kept after its last update (DynamoDB TTL)
+STATE_TTL = int(os.environ.get('PIPELINE_STATE_TTL', str(30 * 24 * 3600)))
+
+# Stages, in pipeline order, and the artifacts they record
+PROXY_JOB = 'ProxyJob'                   # ProxyJobId
+TRANSCRIPTION_JOB = 'TranscriptionJob'   # TranscriptionJobName
+WORD_INDEX = 'WordIndex'
+DEFERRED_PROXY_JOB = 'DeferredProxyJob'  # DeferredProxyJobId
+REDACTED_AUDIO = 'RedactedAudio'         # RedactedAudioKey
+REDACTED_CAPTIONS = 'RedactedCaptions'   # CaptionsKey
+FINAL_JOB = 'FinalJob'                   # FinalJobId, Destination
+
+
+class Checkpoints:
+    # State of one asset, read once per event. Without a store nothing is completed
+    # and nothing is recorded; without resume (re-filtered assets) completed stages are
+    # redone but recorded again.
+
+    def __init__(self, asset_id, store, resume=True):
+        self.asset_id = asset_id
+        self.store = store
+        self.state = store.get(asset_id) if store and resume else None
+        self.skipped = 0
+
+    def completed(self, stage, **artifacts):
+        # True when the stage was completed with these artifacts and can be skipped
+        done = bool(self.state) and stage in self.state['Stages'] and all(
+            self.state.get(name) == value for name, value in artifacts.items())
+        self.skipped += done
+        return done
+
+    def get(self, name):
+        return (self.state or {}).get(name)
+
+    def record(self, stage, **artifacts):
+        if self.store:
+            self.store.record(self.asset_id, stage, artifacts)
+
+
+class DynamoDBStateStore:
+    # One item per asset: {AssetID, Stages: string set, <artifact>: string, UpdatedAt, ExpiresAt}
+
+    def __init__(self, table_name):
+        self.table_name = table_name
+
+    def record(self, asset_id, stage, artifacts=None):
+        # Mark the stage completed and store its artifacts
+        now = int(time.time())
+        assignments = ['UpdatedAt = :now', 'ExpiresAt = :expires']
+        names = {}
+        values = {
+            ':stage': {'SS': [stage]},
+            ':now': {'N': str(now)},
+            ':expires': {'N': str(now + STATE_TTL)}
+        }
+        for i, (name, value) in enumerate((artifacts or {}).items()):
+            assignments.append(f'#a{i} = :a{i}')
+            names[f'#a{i}'] = name
+            values[f':a{i}'] = {'S': str(value)}
+
+        kwargs = {'ExpressionAttributeNames': names} if names else {}
+        aws_clients.client('dynamodb').update_item(
+            TableName=self.table_name,
+            Key={'AssetID': {'S': asset_id}},
+            UpdateExpression='ADD Stages :stage SET ' + ', '.join(assignments),
+            ExpressionAttributeValues=values,
+            **kwargs
+        )
+
+    def get(self, asset_id):
+        response = aws_clients.client('dynamodb').get_item(
+            TableName=self.table_name,
+            Key={'AssetID': {'S': asset_id}},
+            ConsistentRead=True
+        )
+        item = response.get('Item')
+        if not item:
+            return None
+        state = {name: value['S'] for name, value in item.items() if 'S' in value}
+        state['Stages'] = set(item.get('Stages', {}).get('SS', []))
+        return state
+
+
+class SQLiteStateStore:
+    # Local stand-in for the DynamoDB store, with the same semantics
+
+    def __init__(self, path=':memory:'):
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS pipeline_state ('
+                'AssetID TEXT, Kind TEXT, Name TEXT, Value TEXT, PRIMARY KEY (AssetID, Kind, Name))'
+            )
+
+    def record(self, asset_id, stage, artifacts=None):
+        rows = [(asset_id, 'stage', stage, str(int(time.time())))]
+        rows += [(asset_id, 'artifact', name, str(value)) for name, value in (artifacts or {}).items()]
+        with self._lock, self._connection:
+            self._connection.executemany(
+                'INSERT OR REPLACE INTO pipeline_state (AssetID, Kind, Name, Value) VALUES (?, ?, ?, ?)', rows)
+
+    def get(self, asset_id):
+        with self._lock:
+            rows = self._connection.execute(
+                'SELECT Kind, Name, Value FROM pipeline_state WHERE AssetID = ?', (asset_id,)).fetchall()
+        if not rows:
+            return None
+        state = {name: value for kind, name, value in rows if kind == 'artifact'}
+        state['AssetID'] = asset_id
+        state['Stages'] = {name for kind, name, value in rows if kind == 'stage'}
+        return state
+
+
+_store = backends.Shared(
+    lambda: backends.select(PIPELINE_STATE_BACKEND, 'PIPELINE_STATE', 'pipeline state', DynamoDBStateStore, SQLiteStateStore))
+
+
+def open_store():
+    # Store configured by the environment, shared across warm invocations (None when disabled)
+    return _store.get()
+
+
+def checkpoints(asset_id, resume=True):
+    return Checkpoints(asset_id, open_store(), resume)
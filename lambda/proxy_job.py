@@ -0,0 +1,81 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import copy
+import json
+
+import proxy_profiles
+
+
+# MediaConvert job extracting the audio proxy transcribed and redacted by the
+# pipeline. It is submitted by the ingest function, or by the processing function
+# when the source was transcribed directly and masked words were found
+# (DEFERRED_PROXY_STAGE, see transcribe_jobs).
+DEFERRED_PROXY_STAGE = "DEFERRED_PROXY"
+
+
+def destination(proxy_bucket, asset_id):
+    return 's3://' + proxy_bucket + '/audio_proxy/' + asset_id + '/audio'
+
+
+def build_job_settings(source_s3_uri, emc_destination, profile):
+    # Settings of one audio proxy job, built from a private copy of the template
+    settings = copy.deepcopy(EMC_JOB_SETTINGS)
+    settings["Inputs"][0]["FileInput"] = source_s3_uri
+    settings["OutputGroups"][0]["OutputGroupSettings"]["FileGroupSettings"]["Destination"] = emc_destination
+
+    # Audio proxy format, mono and/or lower sample rate profiles reduce the bytes transferred
+    settings["OutputGroups"][0]["Outputs"][0]["AudioDescriptions"][0]["CodecSettings"] = proxy_profiles.codec_settings(profile)
+    settings["OutputGroups"][0]["Outputs"][0]["Extension"] = profile["Extension"]
+    return settings
+
+
+EMC_JOB_SETTINGS = json.loads("""
+  {
+    "TimecodeConfig": {
+      "Source": "ZEROBASED"
+    },
+    "OutputGroups": [
+      {
+        "Name": "File Group",
+        "Outputs": [
+          {
+            "ContainerSettings": {
+              "Container": "RAW"
+            },
+            "AudioDescriptions": [
+              {
+                "AudioSourceName": "Audio Selector 1",
+                "CodecSettings": {
+                  "Codec": "WAV",
+                  "WavSettings": {
+                    "Channels": 2
+                  }
+                }
+              }
+            ],
+            "Extension": "wav"
+          }
+        ],
+        "OutputGroupSettings": {
+          "Type": "FILE_GROUP_SETTINGS",
+          "FileGroupSettings": {
+            "Destination": ""
+          }
+        }
+      }
+    ],
+    "Inputs": [
+      {
+        "AudioSelectors": {
+          "Audio Selector 1": {
+            "DefaultSelection": "DEFAULT"
+          }
+        },
+        "VideoSelector": {},
+        "TimecodeSource": "ZEROBASED",
+        "FileInput": ""
+      }
+    ]
+  }
+""")
\ No newline at end of file
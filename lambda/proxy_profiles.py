@@ -0,0 +1,71 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+# Audio proxy profiles produced by the ingest MediaConvert job, transcribed by
+# Amazon Transcribe and redacted by the processing function.
+# "wav_stereo" is the original uncompressed stereo WAV proxy (192 kB/s at 48 kHz).
+# The compact profiles are mono 16 kHz WAV (32 kB/s) or mono FLAC, which is
+# lossless and usually about half the size of the same WAV again.
+DEFAULT_PROFILE = "wav_stereo"
+
+PROXY_PROFILES = {
+    "wav_stereo": {
+        "Codec": "WAV",
+        "Extension": "wav",
+        "Channels": 2,
+        "SampleRate": None
+    },
+    "wav_mono_16k": {
+        "Codec": "WAV",
+        "Extension": "wav",
+        "Channels": 1,
+        "SampleRate": 16000
+    },
+    "flac_mono_22k": {
+        "Codec": "FLAC",
+        "Extension": "flac",
+        "Channels": 1,
+        "SampleRate": 22050
+    },
+}
+
+
+def get(name):
+    if not name:
+        name = DEFAULT_PROFILE
+    if name not in PROXY_PROFILES:
+        raise ValueError(f"Unknown audio proxy profile: {name}")
+    return PROXY_PROFILES[name]
+
+
+def codec_settings(profile):
+    # MediaConvert CodecSettings of the audio proxy output
+    settings = {"Channels": profile["Channels"]}
+    if profile["SampleRate"]:
+        settings["SampleRate"] = profile["SampleRate"]
+
+    if profile["Codec"] == "FLAC":
+        settings["BitDepth"] = 16
+        return {"Codec": "FLAC", "FlacSettings": settings}
+    return {"Codec": "WAV", "WavSettings": settings}
+
+
+def media_format(profile):
+    # Amazon Transcribe MediaFormat of the audio proxy
+    return profile["Extension"]
+
+
+def remix_settings(profile):
+    # Mono proxies are remixed to the 2.0 AAC output of the final MediaConvert job
+    if profile["Channels"] != 1:
+        return None
+    return {
+        "ChannelsIn": 1,
+        "ChannelsOut": 2,
+        "ChannelMapping": {
+            "OutputChannels": [
+                {"InputChannels": [0]},
+                {"InputChannels": [0]}
+            ]
+        }
+    }
@@ -0,0 +1,91 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import json
+import os
+
+import aws_clients
+import transcript
+import word_index
+from metrics import Metrics
+
+
+# Applies words added to a vocabulary filter to the assets already processed.
+# The assets containing the words are looked up in the word index and sent back
+# to the processing function, which redacts them again from their stored
+# transcript and audio proxy; no Transcribe job is run.
+#
+# Invoke with {"Words": ["word", ...]}, the words newly added to the filter.
+# Events are sent to the processing queue when PROCESSING_QUEUE_URL is set,
+# otherwise the processing function is invoked asynchronously.
+PROCESSING_QUEUE_URL = os.environ.get('PROCESSING_QUEUE_URL')
+PROCESSING_FUNCTION_NAME = os.environ.get('PROCESSING_FUNCTION_NAME')
+
+
+def find_assets(index, words):
+    # Refilter events of the assets containing any of the words, by AssetID
+    assets = {}
+    for word in words:
+        for entry in index.lookup(word):
+            assets.setdefault(entry["AssetID"], {
+                "AssetID": entry["AssetID"],
+                "Source": entry["Source"],
+                "ProxyProfile": entry.get("ProxyProfile"),
+                "LanguageCode": entry.get("LanguageCode"),
+            })
+    return assets
+
+
+def send(events):
+    if PROCESSING_QUEUE_URL:
+        for i in range(0, len(events), 10):
+            response = aws_clients.client('sqs').send_message_batch(
+                QueueUrl=PROCESSING_QUEUE_URL,
+                Entries=[
+                    {'Id': str(n), 'MessageBody': json.dumps(event)}
+                    for n, event in enumerate(events[i:i + 10])
+                ]
+            )
+            if response.get('Failed'):
+                raise RuntimeError(f"Unable to queue refilter events: {response['Failed']}")
+    else:
+        for event in events:
+            aws_clients.client('lambda').invoke(
+                FunctionName=PROCESSING_FUNCTION_NAME,
+                InvocationType='Event',
+                Payload=json.dumps(event).encode('utf-8')
+            )
+
+
+def handler(event, context):
+    #print( json.dumps(event) )
+
+    metrics = Metrics('refilter')
+
+    try:
+        words = sorted({transcript.normalize_word(word) for word in event["Words"] if word.strip()})
+        index = word_index.open_index()
+        if index is None:
+            raise ValueError("The word index is disabled, set WORD_INDEX_BACKEND")
+
+        with metrics.stage('Lookup'):
+            assets = find_assets(index, words)
+        print(f"{len(assets)} assets contain the words {words}")
+
+        with metrics.stage('Send'):
+            send([{"Refilter": asset} for asset in assets.values()])
+        metrics.put('RefilterWords', len(words))
+        metrics.put('RefilterAssets', len(assets))
+
+    except Exception as e:
+       # Raised so that a manual invocation reports the failure
+       print("Exception: {}".format(e))
+       raise
+
+    finally:
+        metrics.flush()
+
+    return {
+        'statusCode': 200,
+        'body': json.dumps({"Words": words, "Assets": sorted(assets)})
+    }
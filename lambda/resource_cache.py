@@ -0,0 +1,141 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+import aws_clients
+from metrics import Metrics
+
+
+# Resources are kept in memory (and on /tmp) across warm invocations, and are
+# revalidated with a conditional GET on their ETag once their TTL expires.
+CACHE_DIR = os.environ.get('RESOURCE_CACHE_DIR', '/tmp/resource_cache')
+DEFAULT_TTL = int(os.environ.get('RESOURCE_CACHE_TTL', '300'))
+
+stats = {'hits': 0, 'misses': 0, 'revalidations': 0}
+_flushed = dict(stats)
+
+_entries = {}
+_key_locks = {}
+_lock = threading.Lock()
+
+
+def _cache_path(bucket, key):
+    return os.path.join(CACHE_DIR, hashlib.sha1(f'{bucket}/{key}'.encode('utf-8')).hexdigest())
+
+
+def _read_disk(bucket, key):
+    path = _cache_path(bucket, key)
+    try:
+        with open(path + '.json') as f:
+            etag = json.load(f)['ETag']
+        with open(path, 'rb') as f:
+            return etag, f.read()
+    except (OSError, ValueError, KeyError):
+        return None, None
+
+
+def _write_disk(bucket, key, etag, data):
+    path = _cache_path(bucket, key)
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+        with open(path + '.json', 'w') as f:
+            json.dump({'ETag': etag}, f)
+    except OSError as e:
+        print(f"Resource cache: unable to write s3://{bucket}/{key} to {CACHE_DIR}: {e}")
+
+
+def _not_modified(error):
+    return error.response.get('ResponseMetadata', {}).get('HTTPStatusCode') == 304 or \
+        aws_clients.error_code(error) in ('304', 'NotModified')
+
+
+def _count(name):
+    with _lock:
+        stats[name] += 1
+
+
+def get(s3_client, bucket, key, loader, ttl=DEFAULT_TTL):
+    # Return loader(bytes of s3://bucket/key), reusing the loaded value while it is
+    # fresh and revalidating it with If-None-Match once the TTL has expired.
+    # Only the entries dict is guarded by the module lock. The GET and the loader run
+    # under a lock of the entry, so that a miss or a revalidation never blocks the
+    # other resources, and concurrent callers of the same resource load it once.
+    cache_key = (bucket, key, loader)
+
+    with _lock:
+        entry = _entries.get(cache_key)
+        if entry and time.monotonic() - entry['checked_at'] < ttl:
+            stats['hits'] += 1
+            return entry['value']
+        key_lock = _key_locks.setdefault(cache_key, threading.Lock())
+
+    with key_lock:
+        with _lock:
+            entry = _entries.get(cache_key)
+        now = time.monotonic()
+
+        if entry and now - entry['checked_at'] < ttl:
+            # Loaded by a concurrent caller while this one was waiting
+            _count('hits')
+            return entry['value']
+
+        if entry:
+            etag, data = entry['etag'], None
+        else:
+            etag, data = _read_disk(bucket, key)
+
+        try:
+            if etag:
+                response = s3_client.get_object(Bucket=bucket, Key=key, IfNoneMatch=etag)
+            else:
+                response = s3_client.get_object(Bucket=bucket, Key=key)
+        except aws_clients.ClientError as e:
+            if not (etag and _not_modified(e)):
+                raise
+            # Unchanged since it was cached
+            _count('revalidations')
+            if entry:
+                entry['checked_at'] = now
+                _log('revalidated', bucket, key)
+                return entry['value']
+            value = loader(data)
+            with _lock:
+                _entries[cache_key] = {'etag': etag, 'value': value, 'checked_at': now}
+            _log('revalidated', bucket, key)
+            return value
+
+        _count('misses')
+        data = response['Body'].read()
+        etag = response['ETag']
+        value = loader(data)
+        with _lock:
+            _entries[cache_key] = {'etag': etag, 'value': value, 'checked_at': now}
+        _write_disk(bucket, key, etag, data)
+        _log('miss', bucket, key)
+        return value
+
+
+def _log(status, bucket, key):
+    # Misses and revalidations only, hits are reported by flush_metrics
+    print(f"Resource cache {status}: s3://{bucket}/{key} "
+          f"(hits: {stats['hits']}, misses: {stats['misses']}, revalidations: {stats['revalidations']})")
+
+
+def flush_metrics(function):
+    # Hits, misses and revalidations since the last flush (ResourceCacheHits, ...), as one
+    # metrics record per invocation of the function. Nothing is printed when the cache was not used.
+    metrics = Metrics(function)
+    with _lock:
+        counts = {name: stats[name] - _flushed[name] for name in stats}
+        _flushed.update(stats)
+    if any(counts.values()):
+        for name, count in counts.items():
+            metrics.put('ResourceCache' + name.capitalize(), count)
+        metrics.flush()
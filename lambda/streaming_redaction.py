@@ -0,0 +1,141 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import audio_redaction
+
+
+# S3 multipart upload limits
+MIN_PART_SIZE = 5 * 1024 * 1024
+MAX_PARTS = 10000
+
+# Bytes read in a single request when parsing the WAV header
+HEADER_PREFETCH_SIZE = 64 * 1024
+
+
+def s3_reader(s3_client, bucket, key, prefetch_size=HEADER_PREFETCH_SIZE):
+    # read_at(offset, size) over ranged GETs. The first bytes of the object are
+    # fetched once, so parsing the RIFF chunks does not cost a request per chunk.
+    prefix = b''
+
+    def read_range(offset, size):
+        if size <= 0:
+            return b''
+        response = s3_client.get_object(
+            Bucket=bucket,
+            Key=key,
+            Range=f'bytes={offset}-{offset + size - 1}'
+        )
+        return response['Body'].read()
+
+    def read_at(offset, size):
+        nonlocal prefix
+        if not prefix and prefetch_size:
+            prefix = read_range(0, prefetch_size)
+        if offset + size <= len(prefix):
+            return prefix[offset:offset + size]
+        return read_range(offset, size)
+
+    return read_at
+
+
+def part_size_for(object_size, chunk_size):
+    # Parts must be at least 5 MiB (but the last one) and there are at most 10,000 of them
+    part_size = max(chunk_size, MIN_PART_SIZE)
+    while object_size > part_size * MAX_PARTS:
+        part_size *= 2
+    return part_size
+
+
+def read_layout(s3_client, bucket, key, masked_windows):
+    # Size and PCM layout of the WAV object, and the masked byte ranges in it
+    object_size = s3_client.head_object(Bucket=bucket, Key=key)['ContentLength']
+    layout = audio_redaction.read_wav_layout(s3_reader(s3_client, bucket, key))
+    data_size = min(layout.data_size, object_size - layout.data_offset)
+    frame_size = layout.channels * layout.sample_width
+    byte_ranges = audio_redaction.masked_byte_ranges(
+        masked_windows, layout.sample_rate, frame_size, layout.data_offset, data_size
+    )
+    return object_size, layout, byte_ranges
+
+
+def upload_parts(s3_client, bucket, source_key, destination_key, upload_id, parts_offsets,
+                 part_size, object_size, byte_ranges, tone, sample_width, max_workers=4, copy_unmasked=False):
+    # Produce the (part number, offset) parts of the multipart upload from the
+    # source object. Returns their ETags and the bytes read and uploaded by the
+    # function. Up to max_workers parts are in flight.
+    read_at = s3_reader(s3_client, bucket, source_key, prefetch_size=0)
+
+    def process_part(part_number, offset):
+        size = min(part_size, object_size - offset)
+
+        if copy_unmasked and size > 0 and not audio_redaction.overlaps(byte_ranges, offset, offset + size):
+            response = s3_client.upload_part_copy(
+                Bucket=bucket,
+                Key=destination_key,
+                UploadId=upload_id,
+                PartNumber=part_number,
+                CopySource={'Bucket': bucket, 'Key': source_key},
+                CopySourceRange=f'bytes={offset}-{offset + size - 1}'
+            )
+            return {'PartNumber': part_number, 'ETag': response['CopyPartResult']['ETag']}, 0
+
+        chunk = bytearray(read_at(offset, size))
+        audio_redaction.patch(chunk, offset, byte_ranges, tone, sample_width)
+        response = s3_client.upload_part(
+            Bucket=bucket,
+            Key=destination_key,
+            UploadId=upload_id,
+            PartNumber=part_number,
+            Body=bytes(chunk)
+        )
+        return {'PartNumber': part_number, 'ETag': response['ETag']}, 2 * len(chunk)
+
+    results = []
+    in_flight = set()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for part_number, offset in parts_offsets:
+            if len(in_flight) >= max_workers:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                results.extend(future.result() for future in done)
+            in_flight.add(executor.submit(process_part, part_number, offset))
+        results.extend(future.result() for future in in_flight)
+
+    parts = sorted((part for part, transferred in results), key=lambda part: part['PartNumber'])
+    return parts, sum(transferred for part, transferred in results)
+
+
+def stream_redact(s3_client, bucket, source_key, destination_key, masked_windows, tones,
+                  chunk_size=8 * 1024 * 1024, max_workers=4, copy_unmasked=False):
+    # Read the source WAV in fixed size ranged GETs, patch the masked byte ranges
+    # of each chunk and upload it as a part of a multipart upload. Up to
+    # max_workers chunks are in flight, so reads, patching and part uploads
+    # overlap while memory stays bounded by max_workers * chunk_size.
+    # With copy_unmasked, parts without masked words are copied server side
+    # (UploadPartCopy), so only the parts with masked words go through the function.
+    # Returns the bytes read and uploaded by the function.
+    object_size, layout, byte_ranges = read_layout(s3_client, bucket, source_key, masked_windows)
+    tone = tones.get_for(layout)
+
+    part_size = part_size_for(object_size, chunk_size)
+    parts_offsets = enumerate(range(0, max(object_size, 1), part_size), start=1)
+
+    upload_id = s3_client.create_multipart_upload(Bucket=bucket, Key=destination_key)['UploadId']
+
+    try:
+        parts, transferred = upload_parts(s3_client, bucket, source_key, destination_key, upload_id, parts_offsets,
+            part_size, object_size, byte_ranges, tone, layout.sample_width, max_workers, copy_unmasked)
+
+        s3_client.complete_multipart_upload(
+            Bucket=bucket,
+            Key=destination_key,
+            UploadId=upload_id,
+            MultipartUpload={'Parts': parts}
+        )
+
+    except Exception:
+        s3_client.abort_multipart_upload(Bucket=bucket, Key=destination_key, UploadId=upload_id)
+        raise
+
+    return transferred
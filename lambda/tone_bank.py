@@ -0,0 +1,45 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import collections
+import io
+import threading
+
+from pydub import AudioSegment
+
+
+# Beep tones converted to the PCM layout of each audio proxy, memoized per
+# (sample rate, channels, sample width) with least recently used eviction
+MAX_ENTRIES = 8
+
+
+class ToneBank:
+
+    def __init__(self, beep, max_entries=MAX_ENTRIES):
+        self.beep = beep
+        self.max_entries = max_entries
+        self._tones = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_wav_bytes(cls, data):
+        return cls(AudioSegment.from_wav(io.BytesIO(data)))
+
+    def get(self, sample_rate, channels, sample_width):
+        # Raw PCM bytes of the beep resampled to the requested layout, converted once
+        key = (sample_rate, channels, sample_width)
+        with self._lock:
+            if key in self._tones:
+                self._tones.move_to_end(key)
+                return self._tones[key]
+
+        tone = self.beep.set_frame_rate(sample_rate).set_channels(channels).set_sample_width(sample_width).raw_data
+
+        with self._lock:
+            self._tones[key] = tone
+            while len(self._tones) > self.max_entries:
+                self._tones.popitem(last=False)
+        return tone
+
+    def get_for(self, layout):
+        return self.get(layout.sample_rate, layout.channels, layout.sample_width)
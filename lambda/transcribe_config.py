@@ -0,0 +1,133 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import json
+import re
+import sys
+
+
+# Compiler of Config/config.json into the language keyword arguments of
+# transcribe.start_transcription_job. The file is validated as a whole and every
+# problem is reported in a single ConfigError. Compiled configs are cached by
+# resource_cache and compiled again only when the ETag of the file changes.
+#
+# Validate a config file before deploying it:
+#   $ python lambda/transcribe_config.py resources/Config/config.json
+DEFAULT_LANGUAGE_CODE = "en-US"
+# "remove" is not supported: Transcribe drops the filtered words from the transcript,
+# which leaves nothing to bleep
+FILTER_METHODS = ("mask", "tag")
+LANGUAGE_SETTINGS = ("VocabularyFilterName", "VocabularyName", "LanguageModelName")
+KNOWN_KEYS = (
+    "Transcribe Language Codes",
+    "Transcribe Language Settings",
+    "Transcribe Vocabulary Filter Method",
+    "Local Filter Word Lists",
+)
+
+_language_code = re.compile(r'^[a-z]{2,3}-[A-Z]{2}$')
+
+
+class ConfigError(ValueError):
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__("Invalid config: " + "; ".join(errors))
+
+
+def _validate(config):
+    errors = []
+    if not isinstance(config, dict):
+        return ["the config must be a JSON object"]
+
+    for key in config:
+        if key not in KNOWN_KEYS:
+            errors.append(f"unknown key {key!r}")
+
+    codes = config.get("Transcribe Language Codes", [DEFAULT_LANGUAGE_CODE])
+    if not isinstance(codes, list) or not codes:
+        errors.append("'Transcribe Language Codes' must be a non-empty list")
+        codes = []
+    for code in codes:
+        if not isinstance(code, str) or not _language_code.match(code):
+            errors.append(f"invalid language code {code!r} in 'Transcribe Language Codes'")
+    if len(set(map(str, codes))) != len(codes):
+        errors.append("duplicate language codes in 'Transcribe Language Codes'")
+
+    settings = config.get("Transcribe Language Settings", {})
+    if not isinstance(settings, dict):
+        errors.append("'Transcribe Language Settings' must be an object")
+        settings = {}
+    for code, language_settings in settings.items():
+        if code not in codes:
+            errors.append(f"'Transcribe Language Settings' has settings for {code!r}, which is not in 'Transcribe Language Codes'")
+        if not isinstance(language_settings, dict):
+            errors.append(f"the settings of {code!r} must be an object")
+            continue
+        for name, value in language_settings.items():
+            if name not in LANGUAGE_SETTINGS:
+                errors.append(f"unknown setting {name!r} for {code!r}, expected one of {', '.join(LANGUAGE_SETTINGS)}")
+            elif not isinstance(value, str) or not value:
+                errors.append(f"{name} of {code!r} must be a non-empty string")
+
+    method = config.get("Transcribe Vocabulary Filter Method", "mask")
+    if method == "remove":
+        errors.append("'Transcribe Vocabulary Filter Method' \"remove\" drops the filtered words from the transcript, "
+            "so they cannot be bleeped; use \"mask\" or \"tag\"")
+    elif method not in FILTER_METHODS:
+        errors.append(f"'Transcribe Vocabulary Filter Method' must be one of {', '.join(FILTER_METHODS)}, not {method!r}")
+
+    word_lists = config.get("Local Filter Word Lists", {})
+    if not isinstance(word_lists, dict) or not all(
+        isinstance(prefix, str) and isinstance(key, str) and key for prefix, key in word_lists.items()
+    ):
+        errors.append("'Local Filter Word Lists' must map source key prefixes to word list keys")
+
+    return errors
+
+
+def compile_config(config):
+    # Language keyword arguments of start_transcription_job for a config dict
+    errors = _validate(config)
+    if errors:
+        raise ConfigError(errors)
+
+    codes = config.get("Transcribe Language Codes", [DEFAULT_LANGUAGE_CODE])
+    settings = config.get("Transcribe Language Settings", {})
+    kwargs = {
+        "Settings": {
+            "VocabularyFilterMethod": config.get("Transcribe Vocabulary Filter Method", "mask")
+        }
+    }
+
+    if len(codes) == 1:
+        # One language code is provided
+        language_settings = settings.get(codes[0], {})
+        kwargs["LanguageCode"] = codes[0]
+        for name in ("VocabularyFilterName", "VocabularyName"):
+            if name in language_settings:
+                kwargs["Settings"][name] = language_settings[name]
+        if "LanguageModelName" in language_settings:
+            kwargs["ModelSettings"] = {"LanguageModelName": language_settings["LanguageModelName"]}
+    else:
+        # 2 or more language codes provided, activate auto language detection in Transcribe
+        kwargs["IdentifyLanguage"] = True
+        kwargs["LanguageOptions"] = list(codes)
+        if settings:
+            kwargs["LanguageIdSettings"] = {code: dict(settings[code]) for code in settings}
+
+    return kwargs
+
+
+def loads(data):
+    # resource_cache loader: bytes of config.json to compiled keyword arguments
+    try:
+        config = json.loads(data)
+    except ValueError as e:
+        raise ConfigError([f"config.json is not valid JSON: {e}"])
+    return compile_config(config)
+
+
+if __name__ == '__main__':
+    with open(sys.argv[1], 'rb') as f:
+        print(json.dumps(loads(f.read()), indent=2))
@@ -0,0 +1,109 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import json
+import os
+
+import aws_clients
+import resource_cache
+import transcribe_config
+
+
+# Transcription jobs of the pipeline. Jobs are named <AssetID>___<MediaConvert job ID>
+# when they transcribe the audio proxy of the ingest MediaConvert job, and
+# <AssetID>___direct when they transcribe the source file directly (TRANSCRIBE_DIRECT).
+# The metadata of direct jobs, which have no MediaConvert job, is stored next to the
+# transcript in an asset manifest.
+DIRECT_JOB_ID = "direct"
+SEPARATOR = "___"
+
+# Containers accepted by Transcribe, by file extension, and its maximum media size
+NATIVE_MEDIA_FORMATS = {
+    "mp3": "mp3",
+    "mp4": "mp4",
+    "m4a": "m4a",
+    "wav": "wav",
+    "flac": "flac",
+    "ogg": "ogg",
+    "webm": "webm",
+    "amr": "amr",
+}
+MAX_MEDIA_SIZE = 2 * 1024 * 1024 * 1024
+
+
+def job_name(asset_id, emc_job_id=DIRECT_JOB_ID):
+    return asset_id + SEPARATOR + emc_job_id
+
+
+def parse_job_name(name):
+    # (AssetID, MediaConvert job ID or DIRECT_JOB_ID)
+    asset_id, emc_job_id = name.split(SEPARATOR)
+    return asset_id, emc_job_id
+
+
+def transcript_key(asset_id, extension="json"):
+    return "transcriptions/" + asset_id + "/transcription." + extension
+
+
+def word_timings_key(asset_id):
+    # Binary sidecar of the transcript (see word_timings.WordTimingsView)
+    return "transcriptions/" + asset_id + "/word_timings.bin"
+
+
+def manifest_key(asset_id):
+    return "transcriptions/" + asset_id + "/asset.json"
+
+
+def direct_media_format(key, size):
+    # Transcribe MediaFormat of a source file that can be transcribed directly, None otherwise
+    extension = os.path.splitext(key)[1].lower().lstrip('.')
+    if extension not in NATIVE_MEDIA_FORMATS or (size or 0) > MAX_MEDIA_SIZE:
+        return None
+    return NATIVE_MEDIA_FORMATS[extension]
+
+
+def put_manifest(bucket, asset_id, metadata):
+    aws_clients.client('s3').put_object(
+        Bucket=bucket,
+        Key=manifest_key(asset_id),
+        Body=json.dumps(metadata).encode('utf-8'),
+        ContentType='application/json'
+    )
+
+
+def get_manifest(bucket, asset_id):
+    response = aws_clients.client('s3').get_object(Bucket=bucket, Key=manifest_key(asset_id))
+    return json.loads(response['Body'].read())
+
+
+def language_settings(resources_bucket):
+    # Language settings compiled from the config file in S3, cached across warm
+    # invocations and compiled again when the file changes
+    return resource_cache.get(aws_clients.client('s3'), resources_bucket, 'Config/config.json',
+        transcribe_config.loads)
+
+
+def start(name, media_uri, media_format, output_bucket, settings, data_access_role_arn):
+    # Start a transcription job, settings being the compiled language settings
+    asset_id, emc_job_id = parse_job_name(name)
+
+    return aws_clients.client('transcribe').start_transcription_job(
+        TranscriptionJobName=name,
+        #MediaSampleRateHertz= 44100,
+        MediaFormat=media_format,
+        Media={
+            "MediaFileUri": media_uri
+        },
+        OutputBucketName=output_bucket,
+        OutputKey=transcript_key(asset_id),
+        JobExecutionSettings={
+            'AllowDeferredExecution': True,
+            'DataAccessRoleArn': data_access_role_arn
+        },
+        Subtitles={
+            'Formats': [
+                'vtt'
+            ]
+        },
+        **settings
+    )
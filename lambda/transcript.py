@@ -0,0 +1,158 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import codecs
+import json
+import re
+
+
+# Incremental reader of Amazon Transcribe results. Only the results.items array
+# is decoded, one item at a time, so a long transcript never becomes a full
+# JSON object graph in memory.
+READ_SIZE = 1024 * 1024
+MASK = "***"
+
+_decoder = json.JSONDecoder()
+_structural = re.compile(r'["{}\[\]:,]')
+_separators = re.compile(r'[\s,]*')
+
+
+class _Reader:
+
+    def __init__(self, body, read_size):
+        self.body = body
+        self.read_size = read_size
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        # Drop the consumed text and append the next chunk, False once the body is exhausted
+        if self.eof:
+            return False
+        data = self.body.read(self.read_size)
+        if not data:
+            self.eof = True
+        text = self.decoder.decode(data or b'', final=not data)
+        self.buffer = self.buffer[self.pos:] + text
+        self.pos = 0
+        return bool(data)
+
+
+def _string_end(buffer, start):
+    # Index of the quote closing the string that starts at start, -1 if not buffered yet
+    end = buffer.find('"', start)
+    while end >= 0:
+        backslashes = 0
+        while end - backslashes - 1 >= start and buffer[end - backslashes - 1] == '\\':
+            backslashes += 1
+        if backslashes % 2 == 0:
+            return end
+        end = buffer.find('"', end + 1)
+    return -1
+
+
+def _iter_array(reader):
+    while True:
+        buffer = reader.buffer
+        pos = _separators.match(buffer, reader.pos).end()
+        if pos >= len(buffer):
+            reader.pos = pos
+            if not reader.fill():
+                raise ValueError("Transcript ended inside results.items")
+            continue
+        if buffer[pos] == ']':
+            reader.pos = pos + 1
+            return
+
+        try:
+            item, end = _decoder.raw_decode(buffer, pos)
+        except ValueError:
+            # The item is not fully buffered yet
+            reader.pos = pos
+            if not reader.fill():
+                raise
+            continue
+
+        reader.pos = end
+        yield item
+
+
+def iter_items(body, read_size=READ_SIZE):
+    # Yield the results.items of a Transcribe output read from a binary file-like body
+    reader = _Reader(body, read_size)
+    stack = []  # [is_object, current_key] of every open container
+    expect_key = False
+
+    while True:
+        buffer = reader.buffer
+        match = _structural.search(buffer, reader.pos)
+        if match is None:
+            reader.pos = len(buffer)
+            if not reader.fill():
+                return
+            continue
+
+        i = match.start()
+        char = buffer[i]
+
+        if char == '"':
+            end = _string_end(buffer, i + 1)
+            if end < 0:
+                reader.pos = i
+                if not reader.fill():
+                    raise ValueError("Transcript ended inside a string")
+                continue
+            if expect_key:
+                stack[-1][1] = buffer[i + 1:end]
+                expect_key = False
+            reader.pos = end + 1
+
+        elif char == '[':
+            reader.pos = i + 1
+            if len(stack) == 2 and stack[0][1] == 'results' and stack[1][1] == 'items':
+                yield from _iter_array(reader)
+                return
+            stack.append([False, None])
+
+        elif char == '{':
+            reader.pos = i + 1
+            stack.append([True, None])
+            expect_key = True
+
+        elif char in '}]':
+            reader.pos = i + 1
+            stack.pop()
+            expect_key = False
+
+        elif char == ',':
+            reader.pos = i + 1
+            expect_key = bool(stack) and stack[-1][0]
+
+        else:
+            reader.pos = i + 1
+
+
+def normalize_word(content):
+    # Vocabulary filters match words regardless of case
+    return content.strip().lower()
+
+
+def is_masked(item):
+    # Items masked ("mask" filter method) or flagged ("tag" filter method) by Transcribe
+    return item["alternatives"][0]["content"] == MASK or bool(item.get("vocabulary_filter_match"))
+
+
+def iter_pronunciations(body, read_size=READ_SIZE):
+    # Yield (start_time, end_time, content, masked) of every pronunciation item
+    for item in iter_items(body, read_size):
+        if item.get("type") == "pronunciation":
+            yield float(item["start_time"]), float(item["end_time"]), item["alternatives"][0]["content"], is_masked(item)
+
+
+def iter_masked_windows(body, read_size=READ_SIZE):
+    # Yield (start_time, end_time) in seconds of every pronunciation item masked by Transcribe
+    for start, end, content, masked in iter_pronunciations(body, read_size):
+        if masked:
+            yield start, end
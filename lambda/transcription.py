@@ -2,95 +2,171 @@
 # SPDX-License-Identifier: MIT-0
 
 import json
-import boto3
 import os
 
+import admission
+import aws_clients
+import pipeline_state
+import proxy_profiles
+import resource_cache
+import transcribe_config
+import transcribe_jobs
+from metrics import Metrics
+
 
 # Environment Variables
 PROXY_BUCKET = os.environ['PROXY_BUCKET']
 RESOURCES_BUCKET = os.environ['RESOURCES_BUCKET']
 TRANSCRIBE_ACCESS_ROLE_ARN = os.environ['TRANSCRIBE_ACCESS_ROLE_ARN']
-    
+# Admission queue of the transcription jobs (see admission.py), whose messages are
+# completed audio proxy job events and direct transcription requests of the ingest function
+ADMISSION_QUEUE_URL = os.environ.get('ADMISSION_QUEUE_URL')
+# Its dead-letter queue, configuration errors are sent there without retries
+DEAD_LETTER_QUEUE_URL = os.environ.get('DEAD_LETTER_QUEUE_URL')
+
+
+def job_request(event):
+    # (AssetID, job name, media URI, media format) of a completed audio proxy job event,
+    # or of a direct transcription request ({"Transcribe": {...}}) of the ingest function
+    direct = event.get("Transcribe")
+    if direct:
+        return direct["AssetID"], transcribe_jobs.job_name(direct["AssetID"]), direct["MediaUri"], direct["MediaFormat"]
+
+    assetId = event["detail"]["userMetadata"]["AssetID"]
+    proxyURI = event["detail"]["outputGroupDetails"][0]["outputDetails"][0]["outputFilePaths"][0]
+    profile = proxy_profiles.get(event["detail"]["userMetadata"].get("ProxyProfile"))
+    return assetId, transcribe_jobs.job_name(assetId, event["detail"]["jobId"]), proxyURI, proxy_profiles.media_format(profile)
+
+
+def put_proxy_metrics(event, metrics):
+    # Time spent in the audio proxy MediaConvert job
+    if "detail" not in event:
+        return
+    timing = event["detail"].get("timing", {})
+    metrics.put_interval('ProxyQueue', timing.get("submitTime"), timing.get("startTime"))
+    metrics.put_interval('ProxyTranscode', timing.get("startTime"), timing.get("finishTime"))
+    metrics.put('AssetDuration', event["detail"]["outputGroupDetails"][0]["outputDetails"][0].get("durationInMs"), 'Milliseconds')
+
+
+def start_job(request, metrics):
+    assetId, name, mediaURI, mediaFormat = request
+    print("Media file: {}".format(mediaURI))
+
+    with metrics.stage('LoadConfig'):
+        language_settings = transcribe_jobs.language_settings(RESOURCES_BUCKET)
+
+    with metrics.stage('StartTranscriptionJob'):
+        return transcribe_jobs.start(name, mediaURI, mediaFormat, PROXY_BUCKET, language_settings, TRANSCRIBE_ACCESS_ROLE_ARN)
+
+
+def admit_record(record, controller):
+    # One message of the admission queue, returns the outcome of AdmissionController.admit
+    event = json.loads(record["body"])
+    request = job_request(event)
+    metrics = Metrics('transcription', request[0])
+    metrics.set_property('Batch', True)
+
+    try:
+        if record["attributes"].get("ApproximateReceiveCount") == "1":
+            put_proxy_metrics(event, metrics)
+        checkpoints = pipeline_state.checkpoints(request[0])
+        if checkpoints.completed(pipeline_state.TRANSCRIPTION_JOB, TranscriptionJobName=request[1]):
+            outcome = admission.EXISTS
+        else:
+            with metrics.stage('Admission'):
+                outcome = controller.admit(request[1], lambda: start_job(request, metrics), metrics)
+            if outcome in (admission.STARTED, admission.EXISTS):
+                checkpoints.record(pipeline_state.TRANSCRIPTION_JOB, TranscriptionJobName=request[1])
+        metrics.put('AdmissionDeferred', 1 if outcome in (admission.FULL, admission.THROTTLED) else 0)
+        print(f"{request[1]}: {outcome}")
+    finally:
+        metrics.flush()
+
+    return outcome
 
-# AWS services clients 
-# Amazon Transcribe:
-transcribe_client = boto3.client('transcribe')
 
-# Amazon S3:
-s3 = boto3.resource('s3')
+def handle_batch(records):
+    # Start the jobs of the batch in order while the controller admits them. Once one is
+    # not admitted, it and the rest of the batch are returned to the queue with a jittered delay.
+    controller = admission.open_controller(aws_clients.client)
+    failures = []
+    deferred = False
+
+    for record in records:
+        if not deferred:
+            try:
+                outcome = admit_record(record, controller)
+            except Exception as e:
+                print("Exception: {} (message {})".format(e, record["messageId"]))
+                if not (isinstance(e, transcribe_config.ConfigError) and DEAD_LETTER_QUEUE_URL and
+                        aws_clients.dead_letter(DEAD_LETTER_QUEUE_URL, record, e)):
+                    failures.append({"itemIdentifier": record["messageId"]})
+                continue
+            if outcome not in (admission.FULL, admission.THROTTLED):
+                continue
+            deferred = True
+
+        aws_clients.client('sqs').change_message_visibility(
+            QueueUrl=ADMISSION_QUEUE_URL,
+            ReceiptHandle=record["receiptHandle"],
+            VisibilityTimeout=admission.requeue_delay(int(record["attributes"].get("ApproximateReceiveCount", "1")))
+        )
+        failures.append({"itemIdentifier": record["messageId"]})
+
+    print(f"Admitted {len(records) - len(failures)}/{len(records)} transcription jobs")
+    resource_cache.flush_metrics('transcription')
+    return {"batchItemFailures": failures}
+
+
+def release_slot(event):
+    # Transcribe Job State Change: the job is done, its slot is given to the next queued job
+    name = event["detail"]["TranscriptionJobName"]
+    admission.open_controller(aws_clients.client).slots.release(name)
+    print(f"{name}: {event['detail'].get('TranscriptionJobStatus')}, slot released")
+    return 0
 
 
 def handler(event, context):
     #print( json.dumps(event) )
 
-    
+    if "Records" in event:
+        # Batch of the admission queue
+        return handle_batch(event["Records"])
+
+    if event.get("source") == "aws.transcribe":
+        return release_slot(event)
+
+    metrics = Metrics('transcription', event["detail"].get("userMetadata", {}).get("AssetID"))
+
     try:
-        # Load the language configs from S3
-        config_s3_object = s3.Object(RESOURCES_BUCKET, 'Config/config.json')
-        config = json.loads( config_s3_object.get()['Body'].read().decode('utf-8') )
-
-        # By default, detect English US language without filtering
-        language_settings = {
-            "LanguageCode" : "en-US",
-            "Settings":{
-                "VocabularyFilterMethod":"mask"
-            }
-        }
-
-        if 'Transcribe Language Codes' in config: 
-            if len(config['Transcribe Language Codes']) == 1:
-                # One language code is provided 
-                lc = config['Transcribe Language Codes'][0]
-                language_settings['LanguageCode'] = lc
-                if 'Transcribe Language Settings' in config and lc in config['Transcribe Language Settings']:
-                    # Vocabulary filter is provided
-                    language_settings['Settings']['VocabularyFilterName'] = config['Transcribe Language Settings'][lc]['VocabularyFilterName']
-            if len(config['Transcribe Language Codes']) > 1:
-                # 2 or more language codes provided, activate auto language detection in Transcribe
-                language_settings.pop('LanguageCode')
-                language_settings["IdentifyLanguage"] = True
-                language_settings["LanguageOptions"]= config['Transcribe Language Codes']
-                if 'Transcribe Language Settings' in config:
-                    language_settings["LanguageIdSettings"] = {}
-                    for lc in config['Transcribe Language Settings']:
-                        language_settings["LanguageIdSettings"][lc] = config['Transcribe Language Settings'][lc]
-                
-        
-        proxyURI = event["detail"]["outputGroupDetails"][0]["outputDetails"][0]["outputFilePaths"][0] 
-        print("Audio proxy file: {}".format(proxyURI))
-        
-        assetId = event["detail"]["userMetadata"]["AssetID"]
-        transcription_s3_key = "transcriptions/" + assetId + "/transcription.json"
-        emc_job_id = event["detail"]["jobId"]
-        
-        job = transcribe_client.start_transcription_job(
-            TranscriptionJobName= assetId + "___" + emc_job_id,
-            #MediaSampleRateHertz= 44100,
-            MediaFormat= "wav",
-            Media= {
-                "MediaFileUri": proxyURI
-            },
-            OutputBucketName= PROXY_BUCKET,
-            OutputKey= transcription_s3_key,
-            JobExecutionSettings={
-                'AllowDeferredExecution': True,
-                'DataAccessRoleArn': TRANSCRIBE_ACCESS_ROLE_ARN
-            },
-            Subtitles={
-                'Formats': [
-                    'vtt'
-                ]
-            },
-            **language_settings
-        )
+        put_proxy_metrics(event, metrics)
+        request = job_request(event)
+
+        # Job names are derived from the asset, a retried event finds the job started by the previous attempt
+        checkpoints = pipeline_state.checkpoints(request[0])
+        if checkpoints.completed(pipeline_state.TRANSCRIPTION_JOB, TranscriptionJobName=request[1]):
+            transcription_job_status = admission.EXISTS
+        else:
+            try:
+                job = start_job(request, metrics)
+                transcription_job_status = job["TranscriptionJob"]["TranscriptionJobStatus"]
+            except Exception as e:
+                if aws_clients.error_code(e) != 'ConflictException':
+                    raise
+                transcription_job_status = admission.EXISTS
+            checkpoints.record(pipeline_state.TRANSCRIPTION_JOB, TranscriptionJobName=request[1])
 
-        transcription_job_status = job["TranscriptionJob"]["TranscriptionJobStatus"]
         print(f"Transcription job status: {transcription_job_status}")
-        
+
     except Exception as e:
+       # Raised for the asynchronous invocation to be retried
        print("Exception: {}".format(e))
-       return 0
-    
+       raise
+
+    finally:
+        metrics.flush()
+        resource_cache.flush_metrics('transcription')
+
     return {
         'statusCode': 200,
         'body': json.dumps(f'Transcribe job created - Status: {transcription_job_status}')
@@ -0,0 +1,44 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import threading
+import time
+import urllib.request
+
+import aws_clients
+import resource_cache
+import transcript
+
+
+# Current word lists of the Transcribe vocabulary filters, used to redact stored
+# transcripts again after words were added to a filter. Lists are downloaded
+# once per container and refreshed after the resource cache TTL.
+TTL = resource_cache.DEFAULT_TTL
+
+_filters = {}
+_lock = threading.Lock()
+
+
+def words(name):
+    # Normalized words of the vocabulary filter
+    with _lock:
+        entry = _filters.get(name)
+        if entry and time.monotonic() - entry['loaded_at'] < TTL:
+            return entry['words']
+
+    uri = aws_clients.client('transcribe').get_vocabulary_filter(VocabularyFilterName=name)['DownloadUri']
+    with urllib.request.urlopen(uri, timeout=30) as response:
+        text = response.read().decode('utf-8')
+    filter_words = frozenset(transcript.normalize_word(line) for line in text.splitlines() if line.strip())
+
+    with _lock:
+        _filters[name] = {'words': filter_words, 'loaded_at': time.monotonic()}
+    return filter_words
+
+
+def words_for_language(config, language_code):
+    # Words of the filter configured for the language in config.json, empty when there is none
+    name = config.get('Transcribe Language Settings', {}).get(language_code, {}).get('VocabularyFilterName')
+    if not name:
+        return frozenset()
+    return words(name)
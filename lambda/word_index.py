@@ -0,0 +1,117 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import aws_clients
+import backends
+
+
+# Inverted index of the transcribed words: one entry per (word, asset) with the
+# times of the word in the asset and what is needed to redact the asset again
+# without MediaConvert or Transcribe job records (Source, ProxyProfile, LanguageCode).
+# Backends: "dynamodb" (WORD_INDEX_TABLE) or "sqlite" (WORD_INDEX_SQLITE_PATH,
+# ":memory:" by default) for local runs. The index is disabled when WORD_INDEX_BACKEND is empty.
+WORD_INDEX_BACKEND = os.environ.get('WORD_INDEX_BACKEND', '')
+# Occurrences stored per entry, the total count is always kept
+MAX_TIMES = 1000
+
+ASSET_ATTRIBUTES = ('Source', 'ProxyProfile', 'LanguageCode')
+
+
+def _times(times):
+    return json.dumps([[round(start, 3), round(end, 3)] for start, end in times[:MAX_TIMES]], separators=(',', ':'))
+
+
+class DynamoDBWordIndex:
+
+    def __init__(self, table_name):
+        self.table_name = table_name
+
+    def put_asset(self, asset_id, asset, word_times):
+        # Index the words of an asset, asset holds the ASSET_ATTRIBUTES
+        now = int(time.time())
+        requests = [
+            {'PutRequest': {'Item': {
+                'Word': {'S': word},
+                'AssetID': {'S': asset_id},
+                'Count': {'N': str(len(times))},
+                'Times': {'S': _times(times)},
+                'UpdatedAt': {'N': str(now)},
+                **{name: {'S': asset[name]} for name in ASSET_ATTRIBUTES if asset.get(name)}
+            }}}
+            for word, times in word_times.items()
+        ]
+
+        for i in range(0, len(requests), 25):
+            batch = {self.table_name: requests[i:i + 25]}
+            for attempt in range(aws_clients.BACKOFF_MAX_ATTEMPTS):
+                unprocessed = aws_clients.client('dynamodb').batch_write_item(RequestItems=batch).get('UnprocessedItems')
+                if not unprocessed:
+                    break
+                batch = unprocessed
+                time.sleep(aws_clients.backoff_delay(attempt))
+            else:
+                raise RuntimeError(f"Unable to index the words of asset {asset_id}")
+
+    def lookup(self, word):
+        # Entries of the assets containing the word
+        entries = []
+        paginator = aws_clients.client('dynamodb').get_paginator('query')
+        for page in paginator.paginate(
+            TableName=self.table_name,
+            KeyConditionExpression='Word = :word',
+            ExpressionAttributeValues={':word': {'S': word}}
+        ):
+            for item in page['Items']:
+                entries.append({
+                    name: int(value['N']) if 'N' in value else value['S']
+                    for name, value in item.items()
+                })
+        return entries
+
+
+class SQLiteWordIndex:
+    # Local stand-in for the DynamoDB index
+
+    def __init__(self, path=':memory:'):
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS words ('
+                'Word TEXT, AssetID TEXT, Count INTEGER, Times TEXT, UpdatedAt INTEGER, '
+                'Source TEXT, ProxyProfile TEXT, LanguageCode TEXT, PRIMARY KEY (Word, AssetID))'
+            )
+
+    def put_asset(self, asset_id, asset, word_times):
+        now = int(time.time())
+        with self._lock, self._connection:
+            self._connection.executemany(
+                'INSERT OR REPLACE INTO words VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                [
+                    (word, asset_id, len(times), _times(times), now) + tuple(asset.get(name) for name in ASSET_ATTRIBUTES)
+                    for word, times in word_times.items()
+                ]
+            )
+
+    def lookup(self, word):
+        names = ('Word', 'AssetID', 'Count', 'Times', 'UpdatedAt') + ASSET_ATTRIBUTES
+        with self._lock:
+            rows = self._connection.execute(
+                'SELECT ' + ', '.join(names) + ' FROM words WHERE Word = ?', (word,)
+            ).fetchall()
+        return [{name: value for name, value in zip(names, row) if value is not None} for row in rows]
+
+
+_index = backends.Shared(
+    lambda: backends.select(WORD_INDEX_BACKEND, 'WORD_INDEX', 'word index', DynamoDBWordIndex, SQLiteWordIndex))
+
+
+def open_index():
+    # Index configured by the environment, shared across warm invocations (None when disabled)
+    return _index.get()
@@ -0,0 +1,140 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import collections
+
+import transcript
+
+
+# In-process matcher of word lists over the pronunciation items of a transcript,
+# an alternative (or a complement) to the Transcribe vocabulary filters.
+# A list has one pattern per line: one or more words, matched case insensitively
+# on consecutive pronunciation items. A word ending with "*" matches any word
+# starting with the same prefix ("freak*" matches "freaky" and "freaked"), and
+# "*" alone matches any word ("son of a *").
+# Blank lines and lines starting with "#" are ignored.
+#
+# Patterns are compiled into a trie of words. The transcript is scanned once,
+# advancing the partial matches started on the previous items, so the cost per
+# item is bounded by the number of words of the longest pattern and does not
+# depend on the number of patterns.
+WILDCARD = "*"
+
+
+class _Node:
+    __slots__ = ('words', 'prefixes', 'prefix_lengths', 'terminal', 'leaf')
+
+    def __init__(self):
+        self.words = {}
+        self.prefixes = {}
+        self.prefix_lengths = ()
+        self.terminal = False
+        self.leaf = True
+
+
+def _advance(node, word, first, matches, advanced):
+    # Follow the word from node, collecting the first index of completed matches
+    # and the partial matches to extend with the next word
+    child = node.words.get(word)
+    if child is not None:
+        if child.terminal:
+            matches.append(first)
+        if not child.leaf:
+            advanced.append((child, first))
+    for length in node.prefix_lengths:
+        if length > len(word):
+            # word[:length] would be the whole word, looked up again with its own length
+            continue
+        child = node.prefixes.get(word[:length])
+        if child is not None:
+            if child.terminal:
+                matches.append(first)
+            if not child.leaf:
+                advanced.append((child, first))
+
+
+class WordMatcher:
+
+    def __init__(self, patterns=()):
+        self.root = _Node()
+        self.patterns = 0
+        self.depth = 0
+        for pattern in patterns:
+            self.add(pattern)
+
+    @classmethod
+    def from_bytes(cls, data):
+        # Compile a word list file, used as resource_cache loader
+        return cls(data.decode('utf-8').splitlines())
+
+    def add(self, pattern):
+        pattern = pattern.strip()
+        if not pattern or pattern.startswith('#'):
+            return
+        words = [transcript.normalize_word(word) for word in pattern.split()]
+
+        node = self.root
+        for word in words:
+            node.leaf = False
+            if word.endswith(WILDCARD):
+                prefix = word[:-1]
+                if prefix not in node.prefixes:
+                    node.prefixes[prefix] = _Node()
+                    node.prefix_lengths = tuple(sorted({len(key) for key in node.prefixes}, reverse=True))
+                node = node.prefixes[prefix]
+            else:
+                node = node.words.setdefault(word, _Node())
+        node.terminal = True
+        self.patterns += 1
+        self.depth = max(self.depth, len(words))
+
+    def iter_matches(self, words):
+        # Yield (first, last) indexes of the words of every match, words being normalized
+        active = []  # (node, index of the first word) of the partial matches
+        for index, word in enumerate(words):
+            matches = []
+            advanced = []
+            for node, first in active:
+                _advance(node, word, first, matches, advanced)
+            _advance(self.root, word, index, matches, advanced)
+            for first in matches:
+                yield first, index
+            active = advanced
+
+    def scan(self, pronunciations):
+        # Mark the items matched by a pattern as masked in a stream of
+        # (start_time, end_time, content, masked) items from transcript.iter_pronunciations.
+        # Items are yielded in order once no partial match can include them anymore.
+        root = self.root
+        normalize_word = transcript.normalize_word
+        pending = collections.deque()  # [start_time, end_time, content, masked] not yielded yet
+        offset = 0  # index of pending[0] in the stream
+        active = []
+
+        for index, item in enumerate(pronunciations):
+            word = normalize_word(item[2])
+            matches = []
+            advanced = []
+            for node, first in active:
+                _advance(node, word, first, matches, advanced)
+            _advance(root, word, index, matches, advanced)
+            active = advanced
+
+            if not pending and not advanced:
+                # Nothing is left open, the item is final
+                offset = index + 1
+                yield (item[0], item[1], item[2], True) if matches else item
+                continue
+
+            pending.append(list(item))
+            if matches:
+                for i in range(min(matches) - offset, index - offset + 1):
+                    pending[i][3] = True
+
+            oldest = min(first for node, first in active) if active else index + 1
+            while offset < oldest:
+                yield tuple(pending.popleft())
+                offset += 1
+
+        while pending:
+            yield tuple(pending.popleft())
@@ -0,0 +1,215 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import bisect
+import mmap
+import struct
+import sys
+from array import array
+
+import transcript
+
+
+# Times, words and masked flags of the pronunciation items of a transcript,
+# parsed once and shared by the audio redaction, the caption rewriter and the
+# word index so that they all agree on what is masked. Words are normalized and
+# dictionary encoded, item i being words[word_ids[i]].
+#
+# The word timings of a transcript are also stored as a binary sidecar of its
+# JSON results, read back without parsing (WordTimingsView). All integers are
+# little-endian uint32, each section following the previous one:
+# - header: magic, version, timebase (ticks per second), items, words
+# - start and end times of the items, in ticks
+# - word ids of the items
+# - offsets of the words in the token table, plus its end
+# - masked flags of the items, one bit per item, padded to 4 bytes
+# - token table: the UTF-8 encoded words
+MAGIC = b'WTIM'
+VERSION = 1
+# Transcribe times have a millisecond resolution
+TIMEBASE = 1000
+_header = struct.Struct('<4sIIII')
+
+
+class WordTimings:
+
+    def __init__(self):
+        self.starts = array('d')
+        self.ends = array('d')
+        self.word_ids = array('I')
+        self.masked = bytearray()
+        self.words = []
+        self._ids = {}
+
+    def append(self, start, end, content, masked):
+        word = transcript.normalize_word(content)
+        word_id = self._ids.get(word)
+        if word_id is None:
+            word_id = self._ids[word] = len(self.words)
+            self.words.append(word)
+        self.starts.append(start)
+        self.ends.append(end)
+        self.word_ids.append(word_id)
+        self.masked.append(1 if masked else 0)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def iter_pronunciations(self):
+        # (start_time, end_time, word, masked) of every item, like transcript.iter_pronunciations
+        words = self.words
+        for i in range(len(self)):
+            yield self.starts[i], self.ends[i], words[self.word_ids[i]], bool(self.masked[i])
+
+    def to_bytes(self, timebase=TIMEBASE):
+        # Binary sidecar of the word timings, see WordTimingsView
+        tokens = [word.encode('utf-8') for word in self.words]
+        offsets = array('I', [0])
+        for token in tokens:
+            offsets.append(offsets[-1] + len(token))
+        bitmap = bytearray((len(self) + 31) // 32 * 4)
+        for i in range(len(self)):
+            if self.masked[i]:
+                bitmap[i >> 3] |= 1 << (i & 7)
+
+        sections = [
+            array('I', [round(start * timebase) for start in self.starts]),
+            array('I', [round(end * timebase) for end in self.ends]),
+            array('I', self.word_ids),
+            offsets
+        ]
+        if sys.byteorder != 'little':
+            for section in sections:
+                section.byteswap()
+        return b''.join([_header.pack(MAGIC, VERSION, timebase, len(self), len(tokens))]
+            + [section.tobytes() for section in sections] + [bytes(bitmap)] + tokens)
+
+    def word(self, i):
+        return self.words[self.word_ids[i]]
+
+    def masked_count(self):
+        return self.masked.count(1)
+
+    def masked_windows(self):
+        # (start_time, end_time) of the masked items, in transcript order
+        return [(self.starts[i], self.ends[i]) for i in range(len(self)) if self.masked[i]]
+
+    def masked_words(self):
+        # Words masked at least once, except the Transcribe mask itself
+        return {self.words[self.word_ids[i]] for i in range(len(self)) if self.masked[i]} - {transcript.MASK}
+
+    def word_times(self):
+        # {word: [(start_time, end_time), ...]} of every word, except the Transcribe mask
+        times = {}
+        for i in range(len(self)):
+            word = self.words[self.word_ids[i]]
+            if word != transcript.MASK:
+                times.setdefault(word, []).append((self.starts[i], self.ends[i]))
+        return times
+
+    def index_at(self, time):
+        # Index of the first item starting at or after time
+        return bisect.bisect_left(self.starts, time)
+
+
+class WordTimingsView:
+    # Read only view of a binary sidecar written by WordTimings.to_bytes, over bytes
+    # or a memory map. The times, word ids and masked flags are read in place;
+    # only the token table is decoded.
+
+    def __init__(self, buffer):
+        self._buffer = memoryview(buffer)
+        if len(self._buffer) < _header.size:
+            raise ValueError("Truncated word timings")
+        magic, version, self.timebase, count, word_count = _header.unpack_from(self._buffer)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Unsupported word timings: {magic!r} version {version}")
+
+        sizes = (4 * count, 4 * count, 4 * count, 4 * (word_count + 1))
+        bitmap_size = (count + 31) // 32 * 4
+        if len(self._buffer) < _header.size + sum(sizes) + bitmap_size:
+            raise ValueError("Truncated word timings")
+        sections = []
+        position = _header.size
+        for size in sizes:
+            sections.append(self._section(position, size))
+            position += size
+        self.start_ticks, self.end_ticks, self.word_ids, offsets = sections
+        self.bitmap = self._buffer[position:position + bitmap_size]
+        position += bitmap_size
+
+        tokens = bytes(self._buffer[position:position + offsets[word_count]])
+        if len(tokens) != offsets[word_count]:
+            raise ValueError("Truncated word timings")
+        self.words = [tokens[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(word_count)]
+        self._mmap = None
+
+    def _section(self, position, size):
+        view = self._buffer[position:position + size].cast('I')
+        if sys.byteorder != 'little':
+            view = array('I', view)
+            view.byteswap()
+        return view
+
+    @classmethod
+    def open(cls, path):
+        # Memory map a sidecar file, to be closed once read
+        with open(path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            view = cls(mapped)
+        except Exception:
+            mapped.close()
+            raise
+        view._mmap = mapped
+        return view
+
+    def close(self):
+        # The views of the map are released before the map itself
+        if self._mmap is not None:
+            for section in (self.start_ticks, self.end_ticks, self.word_ids, self.bitmap, self._buffer):
+                if isinstance(section, memoryview):
+                    section.release()
+            self._mmap.close()
+            self._mmap = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return len(self.start_ticks)
+
+    def start(self, i):
+        return self.start_ticks[i] / self.timebase
+
+    def end(self, i):
+        return self.end_ticks[i] / self.timebase
+
+    def word(self, i):
+        return self.words[self.word_ids[i]]
+
+    def is_masked(self, i):
+        return bool(self.bitmap[i >> 3] >> (i & 7) & 1)
+
+    def iter_pronunciations(self):
+        # (start_time, end_time, word, masked) of every item, like transcript.iter_pronunciations
+        timebase = self.timebase
+        words = self.words
+        bitmap = self.bitmap
+        for i, (start, end, word_id) in enumerate(zip(self.start_ticks, self.end_ticks, self.word_ids)):
+            yield start / timebase, end / timebase, words[word_id], bool(bitmap[i >> 3] >> (i & 7) & 1)
+
+    def to_word_timings(self):
+        # Mutable copy of the items, with the masked flags of the sidecar
+        timings = WordTimings()
+        timebase = self.timebase
+        timings.starts = array('d', [start / timebase for start in self.start_ticks])
+        timings.ends = array('d', [end / timebase for end in self.end_ticks])
+        timings.word_ids = array('I', self.word_ids)
+        timings.masked = bytearray(self.is_masked(i) for i in range(len(self)))
+        timings.words = list(self.words)
+        timings._ids = {word: word_id for word_id, word in enumerate(timings.words)}
+        return timings
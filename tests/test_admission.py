@@ -0,0 +1,52 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import os
+import sys
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path[:0] = [os.path.join(ROOT, 'lambda'), os.path.join(ROOT, 'benchmarks')]
+
+import admission
+
+from fake_transcribe import FakeTranscribe
+
+
+# Redelivered admission queue messages, whose job was started by an earlier delivery
+class RedeliveryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.slots = admission.SQLiteSlots()
+        self.transcribe = FakeTranscribe(tps=100, max_concurrent=10, duration=3600)
+        self.controller = admission.AdmissionController(
+            self.slots,
+            admission.TokenBucket(100, 100),
+            max_in_flight=2,
+            job_status=admission.transcription_job_status(lambda service_name: self.transcribe)
+        )
+
+    def tearDown(self):
+        self.transcribe.stop()
+
+    def admit(self, job_name):
+        return self.controller.admit(job_name, lambda: self.transcribe.start_transcription_job(TranscriptionJobName=job_name))
+
+    def test_running_job_keeps_its_slot(self):
+        self.assertEqual(self.admit('a___direct'), admission.STARTED)
+        self.assertEqual(self.admit('a___direct'), admission.EXISTS)
+        self.assertEqual(self.slots.in_flight(), 1)
+        self.assertEqual(self.admit('b___direct'), admission.STARTED)
+        self.assertEqual(self.admit('c___direct'), admission.FULL)
+
+    def test_finished_job_releases_its_slot(self):
+        self.assertEqual(self.admit('a___direct'), admission.STARTED)
+        with self.transcribe._lock:
+            del self.transcribe.running['a___direct']
+        self.slots.release('a___direct')
+        self.assertEqual(self.admit('a___direct'), admission.EXISTS)
+        self.assertEqual(self.slots.in_flight(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
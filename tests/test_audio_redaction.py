@@ -0,0 +1,126 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import os
+import sys
+import tempfile
+import unittest
+import wave
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path[:0] = [os.path.join(ROOT, 'lambda'), os.path.join(ROOT, 'benchmarks')]
+
+import audio_redaction
+
+import synthetic
+
+
+class NoTones:
+    # Tone bank without a beep, masked samples are silenced
+
+    def get(self, sample_rate, channels, sample_width):
+        return b''
+
+    def get_for(self, layout):
+        return b''
+
+
+def reference_redact(frames, frame_size, sample_rate, windows, tone, silence):
+    # Frame by frame reference: the masked frames are replaced by the tone, restarted
+    # at the first frame of every window. Overlapping windows are merged, adjacent
+    # windows each start their own tone.
+    nframes = len(frames) // frame_size
+    runs = []
+    for start_time, end_time in sorted(windows):
+        start = min(max(round(start_time * sample_rate), 0), nframes)
+        end = min(max(round(end_time * sample_rate), 0), nframes)
+        if end <= start:
+            continue
+        if runs and start < runs[-1][1]:
+            runs[-1][1] = max(runs[-1][1], end)
+        else:
+            runs.append([start, end])
+
+    output = bytearray(frames)
+    for start, end in runs:
+        for n in range(start, end):
+            offset = (n - start) * frame_size
+            if tone:
+                output[n * frame_size:(n + 1) * frame_size] = bytes(
+                    tone[(offset + i) % len(tone)] for i in range(frame_size)
+                )
+            else:
+                output[n * frame_size:(n + 1) * frame_size] = silence * frame_size
+    return bytes(output)
+
+
+def read_frames(path):
+    with wave.open(path, 'rb') as f:
+        return f.getparams(), f.readframes(f.getnframes())
+
+
+class RedactWavTest(unittest.TestCase):
+
+    # Adjacent, overlapping, out of order, past the end and empty windows
+    WINDOWS = [(0.1, 0.35), (0.3, 0.5), (1.9, 2.5), (0.7, 0.7), (1.2, 1.3), (0.5, 0.6)]
+
+    LAYOUTS = [
+        (8000, 1, 1),
+        (16000, 1, 2),
+        (8000, 2, 2),
+        (11025, 2, 4),
+    ]
+
+    def setUp(self):
+        self.workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.workdir.cleanup)
+
+    def generate(self, sample_rate, channels, sample_width):
+        source = os.path.join(self.workdir.name, f'audio_{sample_rate}_{channels}_{sample_width}.wav')
+        synthetic.generate_wav(source, 2, sample_rate, channels, sample_width)
+        return source
+
+    def expected(self, source, tones):
+        params, frames = read_frames(source)
+        frame_size = params.nchannels * params.sampwidth
+        tone = tones.get(params.framerate, params.nchannels, params.sampwidth)
+        silence = audio_redaction.silence_byte(params.sampwidth)
+        return params, reference_redact(frames, frame_size, params.framerate, self.WINDOWS, tone, silence)
+
+    def test_memory(self):
+        for layout in self.LAYOUTS:
+            for tones in (synthetic.SineTones(duration=0.01), NoTones()):
+                with self.subTest(layout=layout, tones=type(tones).__name__):
+                    source = self.generate(*layout)
+                    output = os.path.join(self.workdir.name, 'redacted.wav')
+                    count = audio_redaction.redact_wav(source, output, self.WINDOWS, tones)
+                    self.assertEqual(count, 4)
+                    params, frames = read_frames(output)
+                    expected_params, expected = self.expected(source, tones)
+                    self.assertEqual(params, expected_params)
+                    self.assertEqual(frames, expected)
+
+    def test_in_place(self):
+        # The memory mapped redaction leaves the same file as the in-memory one
+        for layout in self.LAYOUTS:
+            for tones in (synthetic.SineTones(duration=0.01), NoTones()):
+                with self.subTest(layout=layout, tones=type(tones).__name__):
+                    source = self.generate(*layout)
+                    output = os.path.join(self.workdir.name, 'redacted.wav')
+                    audio_redaction.redact_wav(source, output, self.WINDOWS, tones)
+                    count = audio_redaction.redact_wav_in_place(source, self.WINDOWS, tones)
+                    self.assertEqual(count, 4)
+                    with open(source, 'rb') as f, open(output, 'rb') as g:
+                        self.assertEqual(f.read(), g.read())
+
+    def test_in_place_unmasked(self):
+        source = self.generate(8000, 1, 2)
+        with open(source, 'rb') as f:
+            original = f.read()
+        self.assertEqual(audio_redaction.redact_wav_in_place(source, [(3.0, 4.0)], synthetic.SineTones()), 0)
+        with open(source, 'rb') as f:
+            self.assertEqual(f.read(), original)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import os
+import sys
+import threading
+import unittest
+from unittest import mock
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path[:0] = [os.path.join(ROOT, 'lambda'), os.path.join(ROOT, 'benchmarks')]
+
+import admission
+import backends
+import dedup_index
+import pipeline_state
+import word_index
+
+
+class SelectTest(unittest.TestCase):
+
+    def select(self, backend):
+        return backends.select(backend, 'TEST', 'test', lambda table_name: ('dynamodb', table_name), lambda path: ('sqlite', path))
+
+    def test_disabled(self):
+        self.assertIsNone(self.select(''))
+
+    def test_dynamodb(self):
+        with mock.patch.dict(os.environ, {'TEST_TABLE': 'table'}):
+            self.assertEqual(self.select('dynamodb'), ('dynamodb', 'table'))
+
+    def test_dynamodb_without_table(self):
+        with mock.patch.dict(os.environ, {'TEST_TABLE': ''}):
+            with self.assertRaisesRegex(ValueError, 'TEST_TABLE'):
+                self.select('dynamodb')
+
+    def test_sqlite(self):
+        with mock.patch.dict(os.environ):
+            os.environ.pop('TEST_SQLITE_PATH', None)
+            self.assertEqual(self.select('sqlite'), ('sqlite', ':memory:'))
+            os.environ['TEST_SQLITE_PATH'] = '/tmp/test.db'
+            self.assertEqual(self.select('sqlite'), ('sqlite', '/tmp/test.db'))
+
+    def test_unknown(self):
+        with self.assertRaisesRegex(ValueError, 'Unknown test backend: redis'):
+            self.select('redis')
+
+
+class SharedTest(unittest.TestCase):
+
+    def test_opened_once(self):
+        opened = []
+        shared = backends.Shared(lambda: opened.append(1) or object())
+        threads = [threading.Thread(target=shared.get) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertIs(shared.get(), shared.get())
+        self.assertEqual(len(opened), 1)
+
+    def test_disabled_and_errors_are_not_kept(self):
+        results = [None, ValueError('down'), 'instance']
+
+        def open():
+            result = results.pop(0)
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        shared = backends.Shared(open)
+        self.assertIsNone(shared.get())
+        with self.assertRaises(ValueError):
+            shared.get()
+        self.assertEqual(shared.get(), 'instance')
+        self.assertEqual(shared.get(), 'instance')
+
+
+# The open functions of the modules built on the shared backends
+class OpenTest(unittest.TestCase):
+
+    CASES = [
+        (dedup_index, 'DEDUP_BACKEND', '_index', dedup_index.open_index, dedup_index.SQLiteIndex),
+        (word_index, 'WORD_INDEX_BACKEND', '_index', word_index.open_index, word_index.SQLiteWordIndex),
+        (pipeline_state, 'PIPELINE_STATE_BACKEND', '_store', pipeline_state.open_store, pipeline_state.SQLiteStateStore),
+    ]
+
+    def setUp(self):
+        for module, _, shared, _, _ in self.CASES:
+            self.addCleanup(getattr(module, shared).reset)
+        self.addCleanup(admission._controller.reset)
+
+    def test_sqlite(self):
+        for module, setting, _, open_backend, sqlite_class in self.CASES:
+            with mock.patch.object(module, setting, 'sqlite'):
+                instance = open_backend()
+                self.assertIsInstance(instance, sqlite_class)
+                self.assertIs(open_backend(), instance)
+
+    def test_disabled(self):
+        for module, setting, _, open_backend, _ in self.CASES:
+            with mock.patch.object(module, setting, ''):
+                self.assertIsNone(open_backend())
+
+    def test_unknown(self):
+        for module, setting, _, open_backend, _ in self.CASES:
+            with mock.patch.object(module, setting, 'redis'):
+                with self.assertRaises(ValueError):
+                    open_backend()
+
+    def test_admission(self):
+        with mock.patch.object(admission, 'ADMISSION_BACKEND', ''):
+            self.assertIsNone(admission.open_controller(None))
+        with mock.patch.object(admission, 'ADMISSION_BACKEND', 'sqlite'):
+            controller = admission.open_controller(None)
+            self.assertIsInstance(controller.slots, admission.SQLiteSlots)
+            self.assertIs(admission.open_controller(None), controller)
+
+
+if __name__ == '__main__':
+    unittest.main()
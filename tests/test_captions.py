@@ -0,0 +1,80 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import io
+import os
+import sys
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path[:0] = [os.path.join(ROOT, 'lambda'), os.path.join(ROOT, 'benchmarks')]
+
+import captions
+import word_timings
+
+
+def timings(items):
+    result = word_timings.WordTimings()
+    for start, end, content, masked in items:
+        result.append(start, end, content, masked)
+    return result
+
+
+class RedactVttTest(unittest.TestCase):
+
+    def redact(self, vtt, items):
+        return '\n'.join(captions.redact_vtt(vtt.split('\n'), timings(items)))
+
+    def test_only_the_masked_occurrence(self):
+        vtt = (
+            "WEBVTT\n"
+            "\n"
+            "1\n"
+            "00:00:00.000 --> 00:00:02.000\n"
+            "Darn, that was close.\n"
+            "\n"
+            "2\n"
+            "00:00:02.500 --> 00:00:04.000\n"
+            "That darn cat!\n"
+        )
+        items = [
+            (0.1, 0.4, "Darn", False), (0.5, 0.8, "that", False), (0.9, 1.1, "was", False), (1.2, 1.6, "close", False),
+            (2.6, 2.9, "That", False), (3.0, 3.3, "darn", True), (3.4, 3.8, "cat", False),
+        ]
+        self.assertEqual(self.redact(vtt, items), vtt.replace("That darn cat!", "That *** cat!"))
+
+    def test_cue_alignment_from_the_cue_time(self):
+        # The cue starts in the middle of the transcript, its words align from there
+        vtt = "WEBVTT\n\n00:01:00.000 --> 00:01:02.000\n- word word\n"
+        items = [(float(i), i + 0.5, "word", i == 61) for i in range(65)]
+        self.assertEqual(self.redact(vtt, items), "WEBVTT\n\n00:01:00.000 --> 00:01:02.000\n- word ***\n")
+
+    def test_unaligned_words(self):
+        # Words missing from the transcript around the cue are masked when masked elsewhere
+        vtt = "WEBVTT\n\n00:00:10.000 --> 00:00:12.000\nheck heck\n"
+        items = [(1.0, 1.5, "heck", True), (10.0, 10.5, "other", False)]
+        self.assertEqual(self.redact(vtt, items), "WEBVTT\n\n00:00:10.000 --> 00:00:12.000\n*** ***\n")
+
+    def test_header_and_timings_are_kept(self):
+        vtt = "WEBVTT\n\nNOTE darn\n\ndarn\n00:00:00.000 --> 00:00:01.000 align:start\ndarn\n"
+        items = [(0.1, 0.5, "darn", True)]
+        self.assertEqual(self.redact(vtt, items),
+                         "WEBVTT\n\nNOTE darn\n\ndarn\n00:00:00.000 --> 00:00:01.000 align:start\n***\n")
+
+
+class IterLinesTest(unittest.TestCase):
+
+    def test_every_read_size(self):
+        text = "WEBVTT\r\n\r\n00:00:00.000 --> 00:00:01.000\r\nété \U0001f600\r\nlast"
+        data = text.encode('utf-8')
+        for read_size in range(1, len(data) + 1):
+            with self.subTest(read_size=read_size):
+                self.assertEqual(list(captions.iter_lines(io.BytesIO(data), read_size)), text.split('\r\n'))
+
+    def test_timestamps(self):
+        self.assertEqual(captions.parse_timestamp("01:02:03.004"), 3723.004)
+        self.assertEqual(captions.parse_timestamp(" 02:03.500 "), 123.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import os
+import sys
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path[:0] = [os.path.join(ROOT, 'lambda'), os.path.join(ROOT, 'benchmarks')]
+
+import dedup_index
+
+
+class SQLiteIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.index = dedup_index.SQLiteIndex()
+        self.key = dedup_index.content_key('"etag"', 1024, 'fingerprint')
+
+    def test_content_key(self):
+        self.assertEqual(self.key, dedup_index.content_key('etag', 1024, 'fingerprint'))
+        self.assertNotEqual(self.key, dedup_index.content_key('etag', 1025, 'fingerprint'))
+        self.assertNotEqual(self.key, dedup_index.content_key('etag', 1024, 'other'))
+
+    def test_claim_complete(self):
+        claimed, item = self.index.claim(self.key, 'asset-1', 's3://input/a.mp4')
+        self.assertTrue(claimed)
+        self.assertEqual(item['Status'], dedup_index.PENDING)
+        self.assertEqual(self.index.get(self.key), item)
+
+        # Duplicates see the pending claim of the first upload
+        claimed, item = self.index.claim(self.key, 'asset-2', 's3://input/b.mp4')
+        self.assertFalse(claimed)
+        self.assertEqual((item['AssetID'], item['Status']), ('asset-1', dedup_index.PENDING))
+        self.assertNotIn('Destination', item)
+
+        self.index.complete(self.key, 's3://output/asset-1/')
+        claimed, item = self.index.claim(self.key, 'asset-3', 's3://input/c.mp4')
+        self.assertFalse(claimed)
+        self.assertEqual(item['Status'], dedup_index.COMPLETE)
+        self.assertEqual(item['Destination'], 's3://output/asset-1/')
+
+    def test_release(self):
+        self.index.claim(self.key, 'asset-1', 's3://input/a.mp4')
+        # Only the owner of the claim releases it
+        self.index.release(self.key, 'asset-2')
+        self.assertEqual(self.index.get(self.key)['AssetID'], 'asset-1')
+        self.index.release(self.key, 'asset-1')
+        self.assertIsNone(self.index.get(self.key))
+        self.assertTrue(self.index.claim(self.key, 'asset-2', 's3://input/b.mp4')[0])
+
+    def test_release_complete(self):
+        self.index.claim(self.key, 'asset-1', 's3://input/a.mp4')
+        self.index.complete(self.key, 's3://output/asset-1/')
+        self.index.release(self.key, 'asset-1')
+        self.assertEqual(self.index.get(self.key)['Status'], dedup_index.COMPLETE)
+
+    def test_stale_reclaim(self):
+        self.index.claim(self.key, 'asset-1', 's3://input/a.mp4')
+        # A fresh claim is not taken over, a stale one is
+        self.assertFalse(self.index.claim(self.key, 'asset-2', 's3://input/b.mp4')[0])
+        with mock.patch.object(dedup_index, 'PENDING_TTL', -1):
+            claimed, item = self.index.claim(self.key, 'asset-2', 's3://input/b.mp4')
+        self.assertTrue(claimed)
+        self.assertEqual(self.index.get(self.key), item)
+        self.assertEqual(item['AssetID'], 'asset-2')
+
+    def test_complete_not_reclaimed(self):
+        self.index.claim(self.key, 'asset-1', 's3://input/a.mp4')
+        self.index.complete(self.key, 's3://output/asset-1/')
+        with mock.patch.object(dedup_index, 'PENDING_TTL', -1):
+            claimed, item = self.index.claim(self.key, 'asset-2', 's3://input/b.mp4')
+        self.assertFalse(claimed)
+        self.assertEqual((item['AssetID'], item['Destination']), ('asset-1', 's3://output/asset-1/'))
+
+    def test_concurrent_claims(self):
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(
+                lambda i: self.index.claim(self.key, f'asset-{i}', f's3://input/{i}.mp4'), range(32)))
+        winners = [item['AssetID'] for claimed, item in results if claimed]
+        self.assertEqual(len(winners), 1)
+        self.assertTrue(all(item['AssetID'] == winners[0] for claimed, item in results))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import os
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path[:0] = [os.path.join(ROOT, 'lambda'), os.path.join(ROOT, 'benchmarks')]
+
+import audio_redaction
+import fanout
+
+import synthetic
+from fake_s3 import FakeS3
+
+
+# Fan-out redaction with in-process workers, compared to the redaction of the
+# whole file in memory
+class FanOutRedactTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.workdir = tempfile.TemporaryDirectory()
+        source = os.path.join(cls.workdir.name, 'audio.wav')
+        # 60 s of 48 kHz stereo: 3 parts of 5 MiB, one masked window across the first two
+        synthetic.generate_wav(source, 60)
+        cls.windows = [(1.0, 1.5), (27.0, 28.0), (59.0, 59.5)]
+        cls.tones = synthetic.SineTones()
+        expected = os.path.join(cls.workdir.name, 'expected.wav')
+        audio_redaction.redact_wav(source, expected, cls.windows, cls.tones)
+        with open(source, 'rb') as f:
+            cls.source = f.read()
+        with open(expected, 'rb') as f:
+            cls.expected = f.read()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.workdir.cleanup()
+
+    def setUp(self):
+        self.s3 = FakeS3()
+        self.s3.put('proxy', 'audio.wav', self.source)
+        self.payloads = []
+
+    def redact_segment(self, event, context):
+        self.payloads.append(event)
+        return fanout.redact_segment(self.s3, event, self.tones, max_workers=1)
+
+    def redact(self, parts_per_segment, handler=None):
+        invoker = fanout.LocalInvoker(handler or self.redact_segment)
+        return fanout.fan_out_redact(invoker, self.s3, 'proxy', 'audio.wav', 'audio_redacted.wav',
+            self.windows, chunk_size=0, parts_per_segment=parts_per_segment, max_invocations=2)
+
+    def test_fan_out(self):
+        for parts_per_segment, segments in ((1, 3), (2, 2), (16, 1)):
+            with self.subTest(parts_per_segment=parts_per_segment):
+                self.setUp()
+                transferred = self.redact(parts_per_segment)
+                self.assertEqual(self.s3.objects[('proxy', 'audio_redacted.wav')], self.expected)
+                # Every part holds a masked range, so every part is read and uploaded
+                self.assertEqual(transferred, 2 * len(self.source))
+                self.assertEqual(len(self.payloads), segments)
+
+    def test_payload_byte_ranges(self):
+        # Every segment only receives the masked ranges it overlaps
+        self.redact(1)
+        ranges = sorted((event["Parts"][0][0], len(event["ByteRanges"])) for event in self.payloads)
+        self.assertEqual(ranges, [(1, 2), (2, 1), (3, 1)])
+
+    def test_worker_failure(self):
+        def failing(event, context):
+            if event["Parts"][0][0] == 2:
+                raise RuntimeError("Segment worker failed")
+            return self.redact_segment(event, context)
+
+        with self.assertRaises(RuntimeError):
+            self.redact(1, failing)
+        self.assertNotIn(('proxy', 'audio_redacted.wav'), self.s3.objects)
+        self.assertEqual(self.s3._uploads, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
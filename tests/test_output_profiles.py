@@ -0,0 +1,89 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import copy
+import os
+import sys
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path[:0] = [os.path.join(ROOT, 'lambda'), os.path.join(ROOT, 'benchmarks')]
+
+import output_profiles
+
+
+# Audio/video output of the final job template
+AV_OUTPUT = {
+    "ContainerSettings": {"Container": "M3U8", "M3u8Settings": {}},
+    "VideoDescription": {
+        "Width": 960,
+        "Height": 540,
+        "CodecSettings": {
+            "Codec": "H_264",
+            "H264Settings": {"MaxBitrate": 2000000, "RateControlMode": "QVBR"}
+        }
+    },
+    "AudioDescriptions": [
+        {"CodecSettings": {"Codec": "AAC", "AacSettings": {"Bitrate": 96000}}}
+    ],
+    "OutputSettings": {"HlsSettings": {}},
+    "NameModifier": "_av"
+}
+
+
+class OutputProfilesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.av_output = copy.deepcopy(AV_OUTPUT)
+
+    def test_get(self):
+        self.assertIs(output_profiles.get(None), output_profiles.OUTPUT_PROFILES[output_profiles.DEFAULT_PROFILE])
+        self.assertIs(output_profiles.get(''), output_profiles.get('transcode'))
+        with self.assertRaises(ValueError):
+            output_profiles.get('unknown')
+
+    def test_for_source(self):
+        self.assertEqual(output_profiles.for_source('passthrough', 's3://input/video.MP4'), 'passthrough')
+        self.assertEqual(output_profiles.for_source('passthrough', 's3://input/video.m4v'), 'passthrough')
+        # Containers that may hold codecs HLS cannot package fall back to encoding
+        for uri in ('s3://input/video.mov', 's3://input/video.mxf', 's3://input/video'):
+            self.assertEqual(output_profiles.for_source('passthrough', uri), output_profiles.DEFAULT_PROFILE)
+        self.assertEqual(output_profiles.for_source('abr', 's3://input/video.mov'), 'abr')
+        self.assertEqual(output_profiles.for_source(None, 's3://input/video.mp4'), output_profiles.DEFAULT_PROFILE)
+        with self.assertRaises(ValueError):
+            output_profiles.for_source('unknown', 's3://input/video.mp4')
+
+    def test_transcode(self):
+        self.assertEqual(output_profiles.hls_outputs(output_profiles.get('transcode'), self.av_output), [AV_OUTPUT])
+
+    def test_passthrough(self):
+        outputs = output_profiles.hls_outputs(output_profiles.get('passthrough'), self.av_output)
+        self.assertEqual(len(outputs), 1)
+        self.assertEqual(outputs[0]["VideoDescription"], {"CodecSettings": {"Codec": "PASSTHROUGH"}})
+        self.assertEqual(outputs[0]["AudioDescriptions"], AV_OUTPUT["AudioDescriptions"])
+        self.assertEqual(self.av_output, AV_OUTPUT)
+
+    def test_abr(self):
+        profile = output_profiles.get('abr')
+        outputs = output_profiles.hls_outputs(profile, self.av_output)
+        self.assertEqual(self.av_output, AV_OUTPUT)
+
+        # One audio only rendition, referenced by every video rendition
+        audio, videos = outputs[0], outputs[1:]
+        self.assertNotIn("VideoDescription", audio)
+        self.assertEqual(audio["AudioDescriptions"], AV_OUTPUT["AudioDescriptions"])
+        self.assertEqual(audio["OutputSettings"]["HlsSettings"]["AudioGroupId"], output_profiles.AUDIO_GROUP_ID)
+
+        self.assertEqual(len(videos), len(profile["Renditions"]))
+        for video, (width, height, max_bitrate) in zip(videos, profile["Renditions"]):
+            self.assertNotIn("AudioDescriptions", video)
+            self.assertEqual(video["OutputSettings"]["HlsSettings"]["AudioRenditionSets"], output_profiles.AUDIO_GROUP_ID)
+            description = video["VideoDescription"]
+            self.assertEqual((description["Width"], description["Height"]), (width, height))
+            self.assertEqual(description["CodecSettings"]["H264Settings"]["MaxBitrate"], max_bitrate)
+            self.assertEqual(description["CodecSettings"]["H264Settings"]["RateControlMode"], "QVBR")
+        self.assertEqual(len({output["NameModifier"] for output in outputs}), len(outputs))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path[:0] = [os.path.join(ROOT, 'lambda'), os.path.join(ROOT, 'benchmarks')]
+
+import resource_cache
+
+from fake_s3 import FakeS3
+
+
+class ConcurrentLoadTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+        resource_cache.CACHE_DIR = self.cache_dir.name
+        self.s3 = FakeS3()
+        self.s3.put('r', 'slow', b'slow')
+        self.s3.put('r', 'fast', b'fast')
+
+    def tearDown(self):
+        self.cache_dir.cleanup()
+
+    def test_slow_loader_does_not_block_other_resources(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow_loader(data):
+            started.set()
+            release.wait(2)
+            return data
+
+        thread = threading.Thread(target=resource_cache.get, args=(self.s3, 'r', 'slow', slow_loader))
+        thread.start()
+        try:
+            self.assertTrue(started.wait(5))
+            # Loaded while the slow resource is still being loaded
+            self.assertEqual(resource_cache.get(self.s3, 'r', 'fast', bytes.upper), b'FAST')
+            self.assertTrue(thread.is_alive())
+        finally:
+            release.set()
+            thread.join()
+
+    def test_concurrent_callers_load_once(self):
+        calls = []
+        barrier = threading.Barrier(4)
+
+        def loader(data):
+            calls.append(data)
+            return data
+
+        def get():
+            barrier.wait()
+            resource_cache.get(self.s3, 'r', 'slow', loader)
+
+        threads = [threading.Thread(target=get) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(calls, [b'slow'])
+
+
+class MetricsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+        resource_cache.CACHE_DIR = self.cache_dir.name
+        self.s3 = FakeS3()
+        self.s3.put('r', 'config', b'{}')
+        resource_cache.flush_metrics('test')
+
+    def tearDown(self):
+        self.cache_dir.cleanup()
+
+    def test_hits_are_counted_not_logged(self):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            for i in range(3):
+                resource_cache.get(self.s3, 'r', 'config', json.loads)
+        self.assertEqual(len(output.getvalue().splitlines()), 1)
+        self.assertIn('Resource cache miss', output.getvalue())
+
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            resource_cache.flush_metrics('test')
+            resource_cache.flush_metrics('test')
+        records = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual(len(records), 1)
+        self.assertEqual((records[0]['ResourceCacheHits'], records[0]['ResourceCacheMisses']), (2, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
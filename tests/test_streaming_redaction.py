@@ -0,0 +1,61 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import os
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path[:0] = [os.path.join(ROOT, 'lambda'), os.path.join(ROOT, 'benchmarks')]
+
+import audio_redaction
+import streaming_redaction
+
+import synthetic
+from fake_s3 import FakeS3
+
+
+# Streamed redaction of a proxy spanning more parts than the parts in flight,
+# compared to the redaction of the whole file in memory
+class StreamRedactTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.workdir = tempfile.TemporaryDirectory()
+        source = os.path.join(cls.workdir.name, 'audio.wav')
+        # 60 s of 48 kHz stereo: 3 parts of 5 MiB, the second one without masked words
+        synthetic.generate_wav(source, 60)
+        cls.windows = [(1.0, 1.5), (2.0, 2.2), (59.0, 59.5)]
+        cls.tones = synthetic.SineTones()
+        expected = os.path.join(cls.workdir.name, 'expected.wav')
+        audio_redaction.redact_wav(source, expected, cls.windows, cls.tones)
+        with open(source, 'rb') as f:
+            cls.source = f.read()
+        with open(expected, 'rb') as f:
+            cls.expected = f.read()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.workdir.cleanup()
+
+    def redact(self, copy_unmasked):
+        s3 = FakeS3()
+        s3.put('proxy', 'audio.wav', self.source)
+        transferred = streaming_redaction.stream_redact(s3, 'proxy', 'audio.wav', 'audio_redacted.wav',
+            self.windows, self.tones, chunk_size=0, max_workers=1, copy_unmasked=copy_unmasked)
+        return s3.objects[('proxy', 'audio_redacted.wav')], transferred
+
+    def test_stream(self):
+        redacted, transferred = self.redact(False)
+        self.assertEqual(redacted, self.expected)
+        self.assertEqual(transferred, 2 * len(self.source))
+
+    def test_sparse(self):
+        redacted, transferred = self.redact(True)
+        self.assertEqual(redacted, self.expected)
+        self.assertLess(transferred, 2 * len(self.source))
+
+
+if __name__ == '__main__':
+    unittest.main()
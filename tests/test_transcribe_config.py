@@ -0,0 +1,32 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import os
+import sys
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'lambda'))
+
+import transcribe_config
+
+
+class FilterMethodTest(unittest.TestCase):
+
+    def test_supported_methods(self):
+        for method in ("mask", "tag"):
+            kwargs = transcribe_config.compile_config({"Transcribe Vocabulary Filter Method": method})
+            self.assertEqual(kwargs["Settings"]["VocabularyFilterMethod"], method)
+
+    def test_remove_is_rejected(self):
+        # Removed words leave nothing to bleep in the audio
+        with self.assertRaises(transcribe_config.ConfigError):
+            transcribe_config.compile_config({"Transcribe Vocabulary Filter Method": "remove"})
+
+    def test_provided_config(self):
+        with open(os.path.join(ROOT, 'resources', 'Config', 'config.json'), 'rb') as f:
+            transcribe_config.loads(f.read())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import io
+import json
+import os
+import sys
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path[:0] = [os.path.join(ROOT, 'lambda'), os.path.join(ROOT, 'benchmarks')]
+
+import transcript
+
+import synthetic
+
+
+def pronunciation(start, end, content, **extra):
+    return dict({
+        "start_time": str(start),
+        "end_time": str(end),
+        "alternatives": [{"confidence": "0.9", "content": content}],
+        "type": "pronunciation"
+    }, **extra)
+
+
+# Results whose strings hold the characters the parser looks for: escaped quotes
+# and backslashes, brackets, an "items" key outside results, multi-byte characters
+RESULTS = {
+    "jobName": "say \"results\" [items] {",
+    "results": {
+        "transcripts": [{"transcript": "a \\\"quoted\\\" \\\\ ] } word été \U0001f600"}],
+        "speaker_labels": {"segments": [{"items": [{"start_time": "9.0"}]}]},
+        "items": [
+            pronunciation(0.1, 0.3, "café \"x\""),
+            {"alternatives": [{"confidence": "0.0", "content": ","}], "type": "punctuation"},
+            pronunciation(0.5, 0.9, "***"),
+            pronunciation(1.0, 1.2, "flagged\\", vocabulary_filter_match=True),
+            pronunciation(1.5, 1.7, "\U0001f600]"),
+        ]
+    },
+    "status": "COMPLETED"
+}
+
+
+class IterItemsTest(unittest.TestCase):
+
+    def test_every_read_size(self):
+        data = json.dumps(RESULTS, ensure_ascii=False).encode('utf-8')
+        for read_size in list(range(1, 64)) + [len(data)]:
+            with self.subTest(read_size=read_size):
+                items = list(transcript.iter_items(io.BytesIO(data), read_size))
+                self.assertEqual(items, RESULTS["results"]["items"])
+
+    def test_masked_windows(self):
+        data = json.dumps(RESULTS).encode('utf-8')
+        self.assertEqual(list(transcript.iter_masked_windows(io.BytesIO(data), 7)), [(0.5, 0.9), (1.0, 1.2)])
+
+    def test_synthetic_transcript(self):
+        results = synthetic.generate_transcript(120, masked_words=20)
+        data = json.dumps(results, indent=2).encode('utf-8')
+        self.assertEqual(list(transcript.iter_items(io.BytesIO(data), 4096)), results["results"]["items"])
+
+    def test_truncated(self):
+        data = json.dumps(RESULTS).encode('utf-8')
+        end = data.index(b'"flagged')
+        with self.assertRaises(ValueError):
+            list(transcript.iter_items(io.BytesIO(data[:end]), 16))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import os
+import random
+import sys
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path[:0] = [os.path.join(ROOT, 'lambda'), os.path.join(ROOT, 'benchmarks')]
+
+import word_matcher
+
+VOCABULARY = ["a", "ab", "abc", "b", "ba", "c"]
+PATTERN_WORDS = VOCABULARY + ["a*", "ab*", "abc*", "b*", "*"]
+
+
+def word_matches(pattern_word, word):
+    if pattern_word.endswith(word_matcher.WILDCARD):
+        return word.startswith(pattern_word[:-1])
+    return word == pattern_word
+
+
+def brute_force(patterns, words):
+    # (first, last) of every match of every distinct pattern
+    matches = []
+    for pattern in set(tuple(pattern.lower().split()) for pattern in patterns):
+        for first in range(len(words) - len(pattern) + 1):
+            if all(word_matches(p, w) for p, w in zip(pattern, words[first:])):
+                matches.append((first, first + len(pattern) - 1))
+    return sorted(matches)
+
+
+class WordMatcherTest(unittest.TestCase):
+
+    def test_against_brute_force(self):
+        rng = random.Random(0)
+        for case in range(300):
+            patterns = [
+                ' '.join(rng.choice(PATTERN_WORDS) for i in range(rng.randint(1, 3)))
+                for j in range(rng.randint(1, 6))
+            ]
+            words = [rng.choice(VOCABULARY) for i in range(rng.randint(0, 30))]
+            matcher = word_matcher.WordMatcher(patterns)
+            with self.subTest(case=case, patterns=patterns, words=words):
+                self.assertEqual(sorted(matcher.iter_matches(words)), brute_force(patterns, words))
+
+    def test_scan_masks_the_matched_items(self):
+        rng = random.Random(1)
+        for case in range(200):
+            patterns = [' '.join(rng.choice(PATTERN_WORDS[:-1]) for i in range(rng.randint(1, 3))) for j in range(3)]
+            words = [rng.choice(VOCABULARY) for i in range(rng.randint(0, 30))]
+            items = [(float(i), i + 0.5, word.upper() if i % 2 else word, i % 7 == 0) for i, word in enumerate(words)]
+
+            expected = [item[3] for item in items]
+            for first, last in brute_force(patterns, words):
+                for i in range(first, last + 1):
+                    expected[i] = True
+
+            scanned = list(word_matcher.WordMatcher(patterns).scan(iter(items)))
+            with self.subTest(case=case, patterns=patterns, words=words):
+                self.assertEqual([item[:3] for item in scanned], [item[:3] for item in items])
+                self.assertEqual([item[3] for item in scanned], expected)
+
+    def test_list_file(self):
+        matcher = word_matcher.WordMatcher.from_bytes(b"# comment\n\nFreak*\nson of a *\n")
+        self.assertEqual(matcher.patterns, 2)
+        words = ["you", "freaked", "son", "of", "a", "gun", "fre"]
+        self.assertEqual(list(matcher.iter_matches(words)), [(1, 1), (2, 5)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path[:0] = [os.path.join(ROOT, 'lambda'), os.path.join(ROOT, 'benchmarks')]
+
+import transcript
+import word_timings
+
+import synthetic
+
+
+def from_transcript(results):
+    timings = word_timings.WordTimings()
+    for start, end, content, masked in transcript.iter_pronunciations(io.BytesIO(json.dumps(results).encode('utf-8'))):
+        timings.append(start, end, content, masked)
+    return timings
+
+
+class SidecarTest(unittest.TestCase):
+
+    def setUp(self):
+        # 33 items, so that the masked bitmap spans more than one 4 byte word
+        self.timings = word_timings.WordTimings()
+        for i in range(33):
+            self.timings.append(i * 0.5, i * 0.5 + 0.123, ["Été", "word", "***", "\U0001f600"][i % 4], i % 3 == 0)
+
+    def assertSameItems(self, loaded, timings):
+        self.assertEqual(list(loaded.iter_pronunciations()), list(timings.iter_pronunciations()))
+
+    def test_round_trip(self):
+        view = word_timings.WordTimingsView(self.timings.to_bytes())
+        self.assertEqual(len(view), 33)
+        self.assertSameItems(view, self.timings)
+        self.assertEqual([view.is_masked(i) for i in range(33)], [i % 3 == 0 for i in range(33)])
+
+        copy = view.to_word_timings()
+        self.assertSameItems(copy, self.timings)
+        self.assertEqual(copy.masked_windows(), self.timings.masked_windows())
+        self.assertEqual(copy.masked_words(), {"été", "word", "\U0001f600"})
+        # The copy is mutable and keeps the dictionary encoding
+        copy.append(20.0, 20.5, "WORD", True)
+        self.assertEqual(copy.word_ids[-1], copy.word_ids[1])
+
+    def test_memory_mapped(self):
+        with tempfile.TemporaryDirectory() as workdir:
+            path = os.path.join(workdir, 'word_timings.bin')
+            with open(path, 'wb') as f:
+                f.write(self.timings.to_bytes())
+            with word_timings.WordTimingsView.open(path) as view:
+                self.assertSameItems(view, self.timings)
+
+    def test_synthetic_transcript(self):
+        results = synthetic.generate_transcript(600, masked_words=50)
+        timings = from_transcript(results)
+        view = word_timings.WordTimingsView(timings.to_bytes())
+        self.assertSameItems(view, timings)
+        self.assertEqual(view.to_word_timings().masked_count(), 50)
+
+    def test_empty(self):
+        view = word_timings.WordTimingsView(word_timings.WordTimings().to_bytes())
+        self.assertEqual(len(view), 0)
+        self.assertEqual(view.to_word_timings().masked_windows(), [])
+
+    def test_invalid(self):
+        data = self.timings.to_bytes()
+        for invalid in (b'', data[:10], data[:-1], b'XXXX' + data[4:]):
+            with self.assertRaises(ValueError):
+                word_timings.WordTimingsView(invalid)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -13,6 +13,8 @@ from aws_cdk import (
     aws_iam as iam,
     aws_events as events,
     aws_events_targets as targets,
+    aws_sqs as sqs,
+    aws_dynamodb as dynamodb,
     aws_cloudfront as cloudfront,
     aws_cloudfront_origins as origins,
     aws_s3_deployment as s3deploy,
@@ -44,9 +46,63 @@ class VideoBleepingStack(Stack):
 
         deploy_demo_cloudfront_distribution=True
 
+        # Account MediaConvert endpoint, when empty the Lambda functions resolve it
+        # once per container with mediaconvert:DescribeEndpoints
+        mediaconvert_endpoint = ""
+
+        # Audio proxy profile of the ingest job: "wav_stereo", "wav_mono_16k" or "flac_mono_22k".
+        # The FLAC profile requires an ffmpeg binary in the processing function.
+        proxy_profile = "wav_stereo"
+
+        # Output profile of the final MediaConvert job: "transcode" (H.264 960x540), "passthrough"
+        # (source video packaged as is, only the redacted audio is encoded) or "abr" (H.264 ladder)
+        output_profile = "transcode"
+
+        # Audio redaction mode of the processing function: "memory", "mmap", "stream", "sparse" or "fanout".
+        # The "stream", "sparse" and "fanout" modes do not stage WAV audio proxies in /tmp,
+        # FLAC proxies are always downloaded and decoded there.
+        # The "fanout" mode splits very long proxies across parallel invocations of the function.
+        processing_redaction_mode = "sparse"
+        # Deliver the Transcribe completion events to the processing function through an SQS queue,
+        # in batches of up to processing_batch_size events with assets processed concurrently
+        processing_batch_mode = True
+        processing_batch_size = 10
+        processing_batch_max_workers = 4
+
+        # Deduplication of re-uploaded media, keyed by the source ETag and the active configuration:
+        # "dynamodb" or "" to disable. On a hit, "reference" points to the existing output,
+        # "copy" copies it under the new asset ID in the destination bucket.
+        dedup_backend = "dynamodb"
+        dedup_on_hit = "reference"
+
+        # Inverted index of the transcribed words, used to redact processed assets again when
+        # words are added to a vocabulary filter: "dynamodb" or "" to disable.
+        # Audio proxies and transcripts are not expired from the proxy bucket while it is enabled.
+        word_index_backend = "dynamodb"
+
+        # Checkpoints of the stages completed for each asset, so that retried events resume
+        # at the first incomplete stage: "dynamodb" or "" to disable
+        pipeline_state_backend = "dynamodb"
+
+        # Transcribe sources in a container supported by Transcribe (mp4, m4a, mp3, wav, flac,
+        # ogg, webm, amr, up to 2 GB) directly from the ingest bucket. The audio proxy job is
+        # only run when masked words are found, clean assets keep their source audio.
+        transcribe_direct = True
+
+        # Admission control of the transcription jobs: jobs wait in an SQS queue and are started
+        # while fewer than transcription_max_in_flight jobs are running, at up to
+        # transcription_start_rate starts per second for each of the transcription_max_concurrency
+        # concurrent invocations of the transcription function. Keep both below the account quotas.
+        transcription_admission = True
+        transcription_max_in_flight = 100
+        transcription_start_rate = 4
+        transcription_max_concurrency = 2
+
         # Used to filter EventBridge events
         workload_name = "VideoBleeping"
         workload_ingest_stage_name = "INGEST"
+        workload_deferred_proxy_stage_name = "DEFERRED_PROXY"
+        workload_final_stage_name = "FINAL"
 
 
         # Create required S3 buckets
@@ -74,8 +130,31 @@ class VideoBleepingStack(Stack):
         proxy_bucket.add_lifecycle_rule(
             abort_incomplete_multipart_upload_after=Duration.days(3),
             enabled=True,
+        )
+        # Audio proxies expire, re-filtering extracts the proxy of an asset again when it is missing
+        proxy_bucket.add_lifecycle_rule(
+            prefix="audio_proxy/",
+            enabled=True,
             expiration=Duration.days(30),
         )
+        # Transcripts and their word timings are kept while the word index refers to them
+        if word_index_backend:
+            proxy_bucket.add_lifecycle_rule(
+                prefix="transcriptions/",
+                enabled=True,
+                transitions=[
+                    s3.Transition(
+                        storage_class=s3.StorageClass.INFREQUENT_ACCESS,
+                        transition_after=Duration.days(30)
+                    )
+                ],
+            )
+        else:
+            proxy_bucket.add_lifecycle_rule(
+                prefix="transcriptions/",
+                enabled=True,
+                expiration=Duration.days(30),
+            )
 
         destination_bucket = s3.Bucket(
             self, "destination_bucket",
@@ -108,6 +187,38 @@ class VideoBleepingStack(Stack):
         )
 
 
+        # Deduplication index of the processed assets
+
+        if dedup_backend == "dynamodb":
+            dedup_table = dynamodb.Table(
+                self, 'dedup_table',
+                partition_key=dynamodb.Attribute(name="ContentKey", type=dynamodb.AttributeType.STRING),
+                billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+                point_in_time_recovery=True,
+                removal_policy=RemovalPolicy.DESTROY,
+            )
+
+        if pipeline_state_backend == "dynamodb":
+            pipeline_state_table = dynamodb.Table(
+                self, 'pipeline_state_table',
+                partition_key=dynamodb.Attribute(name="AssetID", type=dynamodb.AttributeType.STRING),
+                billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+                time_to_live_attribute="ExpiresAt",
+                point_in_time_recovery=True,
+                removal_policy=RemovalPolicy.DESTROY,
+            )
+
+        if word_index_backend == "dynamodb":
+            word_index_table = dynamodb.Table(
+                self, 'word_index_table',
+                partition_key=dynamodb.Attribute(name="Word", type=dynamodb.AttributeType.STRING),
+                sort_key=dynamodb.Attribute(name="AssetID", type=dynamodb.AttributeType.STRING),
+                billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+                point_in_time_recovery=True,
+                removal_policy=RemovalPolicy.DESTROY,
+            )
+
+
         # Ingest Lambda function and MediaConvert Execution Role
 
         emc_role = iam.Role(
@@ -129,11 +240,33 @@ class VideoBleepingStack(Stack):
                 'MEDIACONVERT_EXECUTION_ROLE_ARN': emc_role.role_arn,
                 'WORKLOAD_NAME': workload_name,
                 'WORKLOAD_STAGE': workload_ingest_stage_name,
+                'PROXY_PROFILE': proxy_profile,
+                'OUTPUT_PROFILE': output_profile,
             },
-            timeout=Duration.seconds(30),
+            # Leaves room for the throttling backoff of bulk uploads
+            timeout=Duration.seconds(120),
         )
 
         emc_role.grant_pass_role(ingest_function)
+
+        if dedup_backend:
+            ingest_function.add_environment('DEDUP_BACKEND', dedup_backend)
+            ingest_function.add_environment('DEDUP_ON_HIT', dedup_on_hit)
+            ingest_function.add_environment('DEDUP_TABLE', dedup_table.table_name)
+            ingest_function.add_environment('RESOURCES_BUCKET', resources_bucket.bucket_name)
+            ingest_function.add_environment('DESTINATION_BUCKET', destination_bucket.bucket_name)
+            dedup_table.grant_read_write_data(ingest_function)
+            resources_bucket.grant_read(ingest_function)
+            if dedup_on_hit == "copy":
+                destination_bucket.grant_read_write(ingest_function)
+
+        if mediaconvert_endpoint:
+            ingest_function.add_environment('MEDIACONVERT_ENDPOINT', mediaconvert_endpoint)
+
+        if pipeline_state_backend:
+            ingest_function.add_environment('PIPELINE_STATE_BACKEND', pipeline_state_backend)
+            ingest_function.add_environment('PIPELINE_STATE_TABLE', pipeline_state_table.table_name)
+            pipeline_state_table.grant_read_write_data(ingest_function)
         
         ingest_function.add_to_role_policy(
             iam.PolicyStatement.from_json({
@@ -174,18 +307,106 @@ class VideoBleepingStack(Stack):
                 'RESOURCES_BUCKET': resources_bucket.bucket_name,
                 'TRANSCRIBE_ACCESS_ROLE_ARN':transcribe_role.role_arn,
             },
-            timeout=Duration.seconds(30),
+            # Leaves room for the token bucket and the throttling backoff of a batch
+            timeout=Duration.seconds(120),
         )
 
         transcribe_role.grant_pass_role(transcribe_function)
 
         resources_bucket.grant_read(transcribe_function)
+
+        if pipeline_state_backend:
+            transcribe_function.add_environment('PIPELINE_STATE_BACKEND', pipeline_state_backend)
+            transcribe_function.add_environment('PIPELINE_STATE_TABLE', pipeline_state_table.table_name)
+            pipeline_state_table.grant_read_write_data(transcribe_function)
+
+        if transcription_admission:
+            admission_table = dynamodb.Table(
+                self, 'admission_table',
+                partition_key=dynamodb.Attribute(name="Pool", type=dynamodb.AttributeType.STRING),
+                billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+                point_in_time_recovery=True,
+                removal_policy=RemovalPolicy.DESTROY,
+            )
+
+            admission_dead_letter_queue = sqs.Queue(
+                self, 'admission_dead_letter_queue',
+                enforce_ssl=True,
+                retention_period=Duration.days(14),
+            )
+
+            admission_queue = sqs.Queue(
+                self, 'admission_queue',
+                enforce_ssl=True,
+                # Six times the function timeout. Jobs waiting for a slot are received again every
+                # 2 minutes at most, the receive count allows them to wait for several hours.
+                visibility_timeout=Duration.seconds(720),
+                retention_period=Duration.days(4),
+                dead_letter_queue=sqs.DeadLetterQueue(
+                    max_receive_count=500,
+                    queue=admission_dead_letter_queue
+                ),
+            )
+
+            transcribe_function.add_environment('ADMISSION_BACKEND', 'dynamodb')
+            transcribe_function.add_environment('ADMISSION_TABLE', admission_table.table_name)
+            transcribe_function.add_environment('ADMISSION_QUEUE_URL', admission_queue.queue_url)
+            transcribe_function.add_environment('DEAD_LETTER_QUEUE_URL', admission_dead_letter_queue.queue_url)
+            admission_dead_letter_queue.grant_send_messages(transcribe_function)
+            transcribe_function.add_environment('ADMISSION_MAX_IN_FLIGHT', str(transcription_max_in_flight))
+            transcribe_function.add_environment('ADMISSION_START_RATE', str(transcription_start_rate))
+            admission_table.grant_read_write_data(transcribe_function)
+
+            transcribe_function.add_event_source(
+                eventsources.SqsEventSource(
+                    admission_queue,
+                    batch_size=10,
+                    max_concurrency=transcription_max_concurrency,
+                    report_batch_item_failures=True,
+                )
+            )
+
+            # Finished transcription jobs free their slot
+            events.Rule(
+                self, "Transcribe_Job_Finished_Rule",
+                event_pattern= events.EventPattern(
+                    source=["aws.transcribe"],
+                    detail_type=["Transcribe Job State Change"],
+                    detail= {"TranscriptionJobStatus": ["COMPLETED", "FAILED"]}
+                ),
+                targets=[targets.LambdaFunction(transcribe_function)]
+            )
+
+        if transcribe_direct:
+            # The ingest function starts the transcription jobs of the sources Transcribe can read
+            ingest_bucket.grant_read(transcribe_role)
+            ingest_function.add_environment('TRANSCRIBE_DIRECT', 'true')
+            proxy_bucket.grant_write(ingest_function)
+            if transcription_admission:
+                ingest_function.add_environment('ADMISSION_QUEUE_URL', admission_queue.queue_url)
+                admission_queue.grant_send_messages(ingest_function)
+            else:
+                ingest_function.add_environment('TRANSCRIBE_ACCESS_ROLE_ARN', transcribe_role.role_arn)
+                ingest_function.add_environment('RESOURCES_BUCKET', resources_bucket.bucket_name)
+                transcribe_role.grant_pass_role(ingest_function)
+                resources_bucket.grant_read(ingest_function)
+                ingest_function.add_to_role_policy(
+                    iam.PolicyStatement.from_json({
+                        "Effect": "Allow",
+                        "Action": [
+                            "transcribe:StartTranscriptionJob",
+                        ],
+                        "Resource": "*"
+                    })
+                )
         
         transcribe_function.add_to_role_policy(
             iam.PolicyStatement.from_json({
                 "Effect": "Allow",
                 "Action": [
                     "transcribe:StartTranscriptionJob",
+                    # Status of the jobs started by an earlier delivery of an admission queue message
+                    "transcribe:GetTranscriptionJob",
                 ],
                 "Resource": "*"
             })
@@ -204,9 +425,13 @@ class VideoBleepingStack(Stack):
                     }
                 }
             ),
-            targets=[targets.LambdaFunction(transcribe_function)]
         )
 
+        if transcription_admission:
+            emc_job_completed_rule.add_target(targets.SqsQueue(admission_queue))
+        else:
+            emc_job_completed_rule.add_target(targets.LambdaFunction(transcribe_function))
+
         
         # Audio Processing Lambda
 
@@ -226,6 +451,10 @@ class VideoBleepingStack(Stack):
         destination_bucket.grant_read_write(processing_emc_role)
         proxy_bucket.grant_read(processing_emc_role)
         
+        # The proxy is staged in /tmp unless a WAV proxy is redacted in a streaming mode
+        processing_stages_proxy = processing_redaction_mode not in ("stream", "sparse", "fanout") \
+            or not proxy_profile.startswith("wav")
+
         processing_function = _lambda.Function(
             self, 'processing_function',
             runtime=lambda_runtime,
@@ -236,29 +465,72 @@ class VideoBleepingStack(Stack):
                 'DESTINATION_BUCKET': destination_bucket.bucket_name,
                 'RESOURCES_BUCKET': resources_bucket.bucket_name,
                 'MEDIACONVERT_EXECUTION_ROLE_ARN':processing_emc_role.role_arn,
+                'REDACTION_MODE': processing_redaction_mode,
+                'BATCH_MAX_WORKERS': str(processing_batch_max_workers),
+                'OUTPUT_PROFILE': output_profile,
             },
             timeout=Duration.seconds(300),
             layers=[pydub_layer],
             memory_size=4096,
-            ephemeral_storage_size=Size.mebibytes(4096),
+            ephemeral_storage_size=Size.mebibytes(4096) if processing_stages_proxy else None,
         )
 
         processing_emc_role.grant_pass_role(processing_function)
+
+        if mediaconvert_endpoint:
+            processing_function.add_environment('MEDIACONVERT_ENDPOINT', mediaconvert_endpoint)
         proxy_bucket.grant_read_write(processing_function)
         resources_bucket.grant_read(processing_function)
 
+        if dedup_backend:
+            processing_function.add_environment('DEDUP_BACKEND', dedup_backend)
+            processing_function.add_environment('DEDUP_TABLE', dedup_table.table_name)
+            dedup_table.grant_read_write_data(processing_function)
+
+        if pipeline_state_backend:
+            processing_function.add_environment('PIPELINE_STATE_BACKEND', pipeline_state_backend)
+            processing_function.add_environment('PIPELINE_STATE_TABLE', pipeline_state_table.table_name)
+            pipeline_state_table.grant_read_write_data(processing_function)
+
+        if word_index_backend:
+            processing_function.add_environment('WORD_INDEX_BACKEND', word_index_backend)
+            processing_function.add_environment('WORD_INDEX_TABLE', word_index_table.table_name)
+            word_index_table.grant_read_write_data(processing_function)
+
+        # Deferred audio proxy jobs of the sources transcribed directly, submitted by the processing function.
+        # Also used to extract the proxy again when an asset is re-filtered after its proxy expired.
+        processing_function.add_environment('PROXY_EXECUTION_ROLE_ARN', emc_role.role_arn)
+        processing_function.add_environment('WORKLOAD_NAME', workload_name)
+        emc_role.grant_pass_role(processing_function)
+
         processing_function.add_to_role_policy(
             iam.PolicyStatement.from_json({
                 "Effect": "Allow",
                 "Action": [
                     "mediaconvert:DescribeEndpoints",
                     "mediaconvert:CreateJob",
-                    "mediaconvert:GetJob"
+                    "mediaconvert:GetJob",
+                    "transcribe:GetTranscriptionJob",
+                    "transcribe:GetVocabularyFilter"
                 ],
                 "Resource": "*"
             })
         )
 
+        if processing_redaction_mode == "fanout":
+            # The function invokes itself for each segment. A standalone policy avoids a
+            # dependency cycle between the function and its role's default policy.
+            iam.Policy(
+                self, 'processing_fanout_policy',
+                roles=[processing_function.role],
+                statements=[
+                    iam.PolicyStatement(
+                        actions=["lambda:InvokeFunction"],
+                        resources=[processing_function.function_arn],
+                    )
+                ],
+            )
+
         transcribe_job_completed_rule = events.Rule(
             self, "Transcribe_Job_Completed_Rule",
             event_pattern= events.EventPattern(
@@ -266,9 +538,102 @@ class VideoBleepingStack(Stack):
                 detail_type=["Transcribe Job State Change"],
                 detail= {"TranscriptionJobStatus": ["COMPLETED"]}
             ),
-            targets=[targets.LambdaFunction(processing_function)]
         )
 
+        # Completed deferred audio proxy jobs go back to the processing function for redaction
+        deferred_proxy_completed_rule = events.Rule(
+            self, "Deferred_Proxy_Completed_Rule",
+            event_pattern= events.EventPattern(
+                source=["aws.mediaconvert"],
+                detail_type=["MediaConvert Job State Change"],
+                detail= {
+                    "status" : ["COMPLETE"],
+                    "userMetadata" : {
+                        "Stage" : [workload_deferred_proxy_stage_name],
+                        "Workload" : [workload_name]
+                    }
+                }
+            ),
+        )
+        processing_rules = [transcribe_job_completed_rule, deferred_proxy_completed_rule]
+
+        if dedup_backend:
+            # Final jobs of deduplicated assets complete (or release) their deduplication entry
+            processing_rules.append(events.Rule(
+                self, "Final_Job_State_Change_Rule",
+                event_pattern= events.EventPattern(
+                    source=["aws.mediaconvert"],
+                    detail_type=["MediaConvert Job State Change"],
+                    detail= {
+                        "status" : ["COMPLETE", "ERROR"],
+                        "userMetadata" : {
+                            "Stage" : [workload_final_stage_name],
+                            "Workload" : [workload_name]
+                        }
+                    }
+                ),
+            ))
+
+        if processing_batch_mode:
+            processing_dead_letter_queue = sqs.Queue(
+                self, 'processing_dead_letter_queue',
+                enforce_ssl=True,
+                retention_period=Duration.days(14),
+            )
+
+            processing_queue = sqs.Queue(
+                self, 'processing_queue',
+                enforce_ssl=True,
+                # At least six times the function timeout, as recommended for Lambda event sources
+                visibility_timeout=Duration.seconds(1800),
+                dead_letter_queue=sqs.DeadLetterQueue(
+                    max_receive_count=3,
+                    queue=processing_dead_letter_queue
+                ),
+            )
+
+            for rule in processing_rules:
+                rule.add_target(targets.SqsQueue(processing_queue))
+
+            processing_function.add_environment('DEAD_LETTER_QUEUE_URL', processing_dead_letter_queue.queue_url)
+            processing_dead_letter_queue.grant_send_messages(processing_function)
+
+            processing_function.add_event_source(
+                eventsources.SqsEventSource(
+                    processing_queue,
+                    batch_size=processing_batch_size,
+                    max_batching_window=Duration.seconds(5),
+                    report_batch_item_failures=True,
+                )
+            )
+        else:
+            for rule in processing_rules:
+                rule.add_target(targets.LambdaFunction(processing_function))
+
+        # Refilter Lambda, redacts the processed assets containing words added to a vocabulary filter
+
+        if word_index_backend:
+            refilter_function = _lambda.Function(
+                self, 'refilter_function',
+                runtime=lambda_runtime,
+                code=_lambda.Code.from_asset('lambda'),
+                handler='refilter.handler',
+                environment={
+                    'WORD_INDEX_BACKEND': word_index_backend,
+                    'WORD_INDEX_TABLE': word_index_table.table_name,
+                },
+                timeout=Duration.seconds(300),
+            )
+
+            word_index_table.grant_read_data(refilter_function)
+
+            if processing_batch_mode:
+                refilter_function.add_environment('PROCESSING_QUEUE_URL', processing_queue.queue_url)
+                processing_queue.grant_send_messages(refilter_function)
+            else:
+                refilter_function.add_environment('PROCESSING_FUNCTION_NAME', processing_function.function_name)
+                processing_function.grant_invoke(refilter_function)
+
         
         # CloudFront distribution to playback generated HLS asset
         if deploy_demo_cloudfront_distribution:
@@ -289,6 +654,13 @@ class VideoBleepingStack(Stack):
             value=ingest_bucket.bucket_name
         )
         
+        if word_index_backend:
+            cdk.CfnOutput(
+                self, "Refilter_Function_Name",
+                export_name="RefilterFunctionName",
+                value=refilter_function.function_name
+            )
+
         if deploy_demo_cloudfront_distribution:
             cdk.CfnOutput(
                 self, "CloudFront_Dirtribution_Domain_Name",